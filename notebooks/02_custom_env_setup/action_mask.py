@@ -0,0 +1,116 @@
+import numpy as np
+
+from occupancy import GHOST
+
+# Masks an env can add to info['action_mask']: moves that stay on the grid, or that also don't step
+# onto a ghost
+ACTION_MASKS = ('boundary', 'hazard')
+
+# Boundary tables shared by every env in the process, keyed by grid size and direction table
+_cached_tables = {}
+
+##########################################################################
+# Boundary Masks
+##########################################################################
+
+def boundary_mask_table(size: int, directions):
+    '''
+    Description:
+        Valid actions of every cell: an action is valid if its move stays on the grid (the envs clip
+        the others, which wastes the step). Built once per grid size and shared, read-only.
+
+    Inputs:
+        size: int
+            The grid size.
+
+        directions: array
+            (no actions, 2) move of each action.
+
+    Outputs:
+        table: array
+            Boolean array of shape (size, size, no actions), indexed like the locations (table[x, y]).
+    '''
+    directions = np.asarray(directions, dtype=np.int64)
+    key = (size, directions.tobytes())
+    table = _cached_tables.get(key)
+
+    if table is None:
+        cells = np.arange(size)
+        new_x = cells[:, None, None] + directions[:, 0]
+        new_y = cells[None, :, None] + directions[:, 1]
+        table = (new_x >= 0) & (new_x < size) & (new_y >= 0) & (new_y < size)
+        table.flags.writeable = False
+        _cached_tables[key] = table
+
+    return table
+
+##########################################################################
+# Hazard Masks
+##########################################################################
+
+def ghost_free_mask(mask, agent, directions, occupancy):
+    '''
+    Description:
+        Removes the moves onto a ghost from the boundary mask of one agent, by looking up the (at most 4)
+        neighbouring cells in the occupancy grid. If every move would hit a ghost the boundary mask is
+        returned unchanged, so at least one action always stays valid.
+
+    Inputs:
+        mask: array
+            Boundary mask of the agent's cell, shape (no actions,).
+
+        agent: array
+            Agent location, shape (2,).
+
+        directions: array
+            (no actions, 2) move of each action.
+
+        occupancy: array
+            Occupancy grid (see occupancy.py).
+    '''
+    # Scalar lookups of the few neighbours are much cheaper than fancy indexing on arrays this small,
+    # and with no ghost next to the agent (the usual case) the mask is returned without a copy
+    x, y = agent.tolist()
+    hits = [a for a, (dx, dy) in enumerate(directions.tolist()) if mask[a] and occupancy[x + dx, y + dy] & GHOST]
+    if not hits:
+        return mask
+
+    safe = mask.copy()
+    safe[hits] = False
+
+    return safe if safe.any() else mask
+
+def batched_action_masks(table, agent, directions, ghosts=None):
+    '''
+    Description:
+        Action masks of a batch of agents (for the vector envs): one fancy index into the boundary
+        table, and with `ghosts` the moves onto a ghost of the same sub-environment are removed
+        (unless that leaves no valid action, see ghost_free_mask()).
+
+    Inputs:
+        table: array
+            Boundary table from boundary_mask_table().
+
+        agent: array
+            Agent locations, shape (no envs, 2).
+
+        directions: array
+            (no actions, 2) move of each action.
+
+        ghosts: array
+            Ghost locations, shape (no envs, no ghosts, 2), None for boundary masks only.
+
+    Outputs:
+        masks: array
+            Boolean array of shape (no envs, no actions).
+    '''
+    masks = table[agent[:, 0], agent[:, 1]]
+    if ghosts is None or not ghosts.shape[1]:
+        return masks
+
+    # Neighbouring cell of every action, compared against every ghost of the same env
+    cells = agent[:, None, :] + directions
+    hit = (cells[:, :, None, :] == ghosts[:, None, :, :]).all(axis=3).any(axis=2)
+    safe = masks & ~hit
+
+    return np.where(safe.any(axis=1, keepdims=True), safe, masks)
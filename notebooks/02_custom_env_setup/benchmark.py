@@ -0,0 +1,357 @@
+'''
+Benchmarks step, reset and render throughput (and peak memory, import and construction time) of the
+Haunted Mansion environments.
+
+Runs offline and headless (rendering uses the 'rgb_array' mode), e.g.
+
+    python benchmark.py --output results.json
+    python benchmark.py --save-baseline baseline.json
+    python benchmark.py --baseline baseline.json --threshold 0.2
+
+With --baseline the exit code is 1 if any metric regressed by more than the threshold.
+'''
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import action_mask
+import distance_field
+from simple_env import Simple_Haunted_Mansion
+from intermediate_env import Intm_Haunted_Mansion
+from final_env import Final_Haunted_Mansion
+from vector_env import VectorHauntedMansion
+
+# Metrics where higher is better (the rest, peak memory, is better lower)
+RATE_METRICS = ('steps_per_sec', 'resets_per_sec', 'render_fps')
+
+# Grids larger than this are not rendered (cells would be smaller than a pixel)
+MAX_RENDER_SIZE = 100
+
+# Peak memory changes smaller than this are noise (allocator/caching), never reported as regressions
+MEMORY_SLACK_BYTES = 1 << 20
+
+# Startup metrics (better lower), in milliseconds, and the change below which they are noise
+TIME_METRICS = ('import_ms', 'construct_ms')
+TIME_SLACK_MS = 1.0
+
+# Folder of the env modules, the import time is measured in a fresh interpreter started there
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+##########################################################################
+# Benchmark Cases
+##########################################################################
+
+def benchmark_cases():
+    '''
+    Description:
+        Returns the cases to benchmark as a dict of name -> (factory, num_envs), where factory builds
+        the environment (given a render_mode) and num_envs is how many env-steps one step() call makes.
+    '''
+    cases = {}
+    for size in (5, 10, 50):
+        cases[f'simple/size={size}'] = (lambda render_mode, size=size: Simple_Haunted_Mansion(size=size, render_mode=render_mode), 1)
+        cases[f'intermediate/size={size}'] = (lambda render_mode, size=size: Intm_Haunted_Mansion(size=size, render_mode=render_mode), 1)
+        cases[f'final/size={size}'] = (lambda render_mode, size=size: Final_Haunted_Mansion(size=size, render_mode=render_mode), 1)
+
+    # Large grids and many entities, step/reset cost should stay close to flat
+    for size, num_ghosts, num_candies in ((1000, 3, 2), (200, 50, 50), (1000, 100, 100)):
+        name = f'size={size}/ghosts={num_ghosts}/candies={num_candies}'
+        layout = {'size': size, 'num_ghosts': num_ghosts, 'num_candies': num_candies}
+        cases[f'intermediate/{name}'] = (lambda render_mode, layout=layout: Intm_Haunted_Mansion(render_mode=render_mode, **layout), 1)
+        cases[f'final/{name}'] = (lambda render_mode, layout=layout: Final_Haunted_Mansion(render_mode=render_mode, **layout), 1)
+
+    for num_envs in (64, 1024):
+        for variant in ('intermediate', 'final'):
+            cases[f'vector-{variant}/num_envs={num_envs}'] = (
+                lambda render_mode, variant=variant, num_envs=num_envs: VectorHauntedMansion(num_envs, variant=variant), num_envs
+            )
+
+    return cases
+
+##########################################################################
+# Measuring
+##########################################################################
+
+def _random_actions(env, count: int, rng):
+    # Actions are drawn up front so sampling them is not part of the timings
+    shape = (count, env.num_envs) if getattr(env, 'is_vector_env', False) else (count,)
+    return rng.integers(0, 4, size=shape)
+
+def measure_steps(env, num_steps: int, rng):
+    '''
+    Description:
+        Env-steps per second under random actions, resetting scalar envs when an episode ends (vector
+        envs autoreset themselves).
+    '''
+    is_vector = getattr(env, 'is_vector_env', False)
+    actions = _random_actions(env, num_steps, rng)
+    env.reset(seed=0)
+
+    start = time.perf_counter()
+    if is_vector:
+        for action in actions:
+            env.step(action)
+    else:
+        for action in actions.tolist():
+            terminated = env.step(action)[2]
+            if terminated:
+                env.reset()
+    elapsed = time.perf_counter() - start
+
+    return num_steps * (env.num_envs if is_vector else 1) / elapsed
+
+def measure_resets(env, num_resets: int):
+    '''
+    Description:
+        Resets per second (for vector envs, sub-environment resets per second).
+    '''
+    env.reset(seed=0)
+    start = time.perf_counter()
+    for _ in range(num_resets):
+        env.reset()
+    elapsed = time.perf_counter() - start
+
+    return num_resets * getattr(env, 'num_envs', 1) / elapsed
+
+def measure_render(factory, num_frames: int, rng):
+    '''
+    Description:
+        Frames per second of the headless 'rgb_array' mode, None if pygame isn't installed (large grids
+        are not rendered, see MAX_RENDER_SIZE).
+    '''
+    try:
+        import pygame  # noqa: F401
+    except ImportError:
+        return None
+
+    env = factory('rgb_array')
+    env.reset(seed=0)
+    # First frame loads pygame and the sprites, it is not timed
+    env.render()
+    actions = rng.integers(0, 4, size=num_frames).tolist()
+
+    start = time.perf_counter()
+    for action in actions:
+        if env.step(action)[2]:
+            env.reset()
+        env.render()
+    elapsed = time.perf_counter() - start
+    env.close()
+
+    return num_frames / elapsed
+
+def measure_import_time(module: str, repeats: int = 3):
+    '''
+    Description:
+        Time (ms) to import an env module in a fresh interpreter, on top of NumPy and gymnasium (which any
+        env needs anyway), the best of `repeats` runs. Raises a RuntimeError if the import pulls in pygame,
+        which must only be imported by the first render() call.
+    '''
+    code = (
+        'import sys, time, numpy, gymnasium\n'
+        'start = time.perf_counter()\n'
+        f'import {module}\n'
+        'print(time.perf_counter() - start, "pygame" in sys.modules)'
+    )
+
+    best = float('inf')
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', code], cwd=MODULE_DIR, capture_output=True, text=True, check=True).stdout
+        elapsed, imports_pygame = output.split()
+        if imports_pygame == 'True':
+            raise RuntimeError(f'Importing {module} imports pygame')
+        best = min(best, float(elapsed) * 1e3)
+
+    return best
+
+def measure_construction(factory, repeats: int = 20, budget: float = 0.5):
+    '''
+    Description:
+        Median time (ms) to build a non-rendering env, over `repeats` builds or as many as fit in `budget`
+        seconds. The module-level caches are emptied before every build, like in a new worker process.
+    '''
+    timings = []
+    deadline = time.perf_counter() + budget
+
+    while len(timings) < repeats and (not timings or time.perf_counter() < deadline):
+        distance_field._cached_fields.clear()
+        action_mask._cached_tables.clear()
+
+        start = time.perf_counter()
+        env = factory(None)
+        timings.append((time.perf_counter() - start) * 1e3)
+        env.close()
+
+    return float(np.median(timings))
+
+def measure_peak_memory(factory, num_steps: int, rng):
+    '''
+    Description:
+        Peak memory (bytes) allocated while building the env, resetting it and taking `num_steps` steps.
+
+        The module-level caches (distance fields, boundary mask tables) are emptied first, so the tables
+        are always built (and counted) here, whatever case ran before.
+    '''
+    distance_field._cached_fields.clear()
+    action_mask._cached_tables.clear()
+
+    tracemalloc.start()
+    env = factory(None)
+    measure_steps(env, num_steps, rng)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    env.close()
+
+    return peak
+
+def run_benchmarks(num_steps: int = 5000, num_resets: int = 500, num_frames: int = 100, cases=None):
+    '''
+    Description:
+        Runs every case and returns the results (metadata plus one dict of metrics per case).
+
+    Inputs:
+        num_steps: int
+            step() calls per case (each is num_envs env-steps for vector envs).
+
+        num_resets: int
+            reset() calls per case.
+
+        num_frames: int
+            Rendered frames per scalar case.
+
+        cases: list
+            Names of the cases to run, all of them by default.
+    '''
+    all_cases = benchmark_cases()
+    names = cases or list(all_cases)
+    results = {}
+
+    # Module -> import time, each module is only measured once
+    import_times = {}
+
+    for name in names:
+        factory, num_envs = all_cases[name]
+        rng = np.random.default_rng(0)
+        is_vector = num_envs > 1
+
+        # Vector cases do num_envs env-steps per call, so fewer calls are needed
+        calls = max(num_steps // num_envs, 20) if is_vector else num_steps
+
+        env = factory(None)
+        module = type(env).__module__
+        if module not in import_times:
+            import_times[module] = measure_import_time(module)
+
+        renders = not is_vector and env.size <= MAX_RENDER_SIZE
+        results[name] = {
+            'import_ms': import_times[module],
+            'construct_ms': measure_construction(factory),
+            'steps_per_sec': measure_steps(env, calls, rng),
+            'resets_per_sec': measure_resets(env, max(num_resets // num_envs, 2) if is_vector else num_resets),
+            'render_fps': measure_render(factory, num_frames, rng) if renders else None,
+            'peak_memory_bytes': measure_peak_memory(factory, min(calls, 200), rng),
+        }
+        env.close()
+
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'num_steps': num_steps,
+            'num_resets': num_resets,
+            'num_frames': num_frames,
+        },
+        'results': results,
+    }
+
+##########################################################################
+# Comparing Against a Baseline
+##########################################################################
+
+def compare_to_baseline(results: dict, baseline: dict, threshold: float = 0.2):
+    '''
+    Description:
+        Compares results to a baseline, a rate metric regresses if it dropped by more than `threshold`
+        (as a fraction), import/construction time if it grew by more than `threshold` and by more than
+        TIME_SLACK_MS, peak memory if it grew by more than `threshold` and by more than 1 MiB.
+
+    Outputs:
+        regressions: list
+            (case, metric, baseline value, new value) for every regression.
+    '''
+    regressions = []
+    for name, metrics in results['results'].items():
+        baseline_metrics = baseline.get('results', {}).get(name)
+        if baseline_metrics is None:
+            continue
+
+        for metric, value in metrics.items():
+            old = baseline_metrics.get(metric)
+            if value is None or old is None:
+                continue
+            if metric in RATE_METRICS:
+                regressed = value < old * (1 - threshold)
+            elif metric in TIME_METRICS:
+                regressed = value > old * (1 + threshold) and value - old > TIME_SLACK_MS
+            else:
+                regressed = value > old * (1 + threshold) and value - old > MEMORY_SLACK_BYTES
+            if regressed:
+                regressions.append((name, metric, old, value))
+
+    return regressions
+
+def _print_results(results: dict):
+    print(f"{'case':48s} {'steps/s':>12s} {'resets/s':>12s} {'render fps':>11s} {'peak MB':>9s} {'import ms':>10s} {'build ms':>9s}")
+    for name, metrics in results['results'].items():
+        render_fps = metrics['render_fps']
+        print(f"{name:48s} {metrics['steps_per_sec']:12.0f} {metrics['resets_per_sec']:12.0f} "
+              f"{'-' if render_fps is None else f'{render_fps:.0f}':>11s} {metrics['peak_memory_bytes'] / 2**20:9.2f} "
+              f"{metrics['import_ms']:10.2f} {metrics['construct_ms']:9.2f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Haunted Mansion environments.')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='Compare against this JSON file (exit code 1 on regression)')
+    parser.add_argument('--save-baseline', help='Write the results to this JSON file as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed relative regression (default 0.2)')
+    parser.add_argument('--steps', type=int, default=5000, help='step() calls per case')
+    parser.add_argument('--resets', type=int, default=500, help='reset() calls per case')
+    parser.add_argument('--frames', type=int, default=100, help='Rendered frames per case')
+    parser.add_argument('--case', action='append', help='Only run this case (can be repeated)')
+    parser.add_argument('--list', action='store_true', help='List the cases and exit')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print('\n'.join(benchmark_cases()))
+        return 0
+
+    results = run_benchmarks(args.steps, args.resets, args.frames, args.case)
+    _print_results(results)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        for name, metric, old, new in regressions:
+            print(f'REGRESSION {name} {metric}: {old:.4g} -> {new:.4g}')
+        if regressions:
+            return 1
+        print('No regressions against the baseline')
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
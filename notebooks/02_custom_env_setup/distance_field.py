@@ -0,0 +1,119 @@
+import hashlib
+
+import numpy as np
+
+# Distance of the cells that can't be reached from any source
+UNREACHABLE = -1
+
+# Most distance fields kept in the cache (the oldest is dropped first)
+MAX_CACHED_FIELDS = 64
+
+# Distance fields shared by every env in the process, keyed by layout hash (see layout_key())
+_cached_fields = {}
+
+##########################################################################
+# Breadth-First Search
+##########################################################################
+
+def bfs_distance_field(size: int, sources, blocked=None):
+    '''
+    Description:
+        Shortest path length (in agent moves: right, down, left, up) from the nearest source to every
+        cell of a `size x size` grid, with a breadth-first search. The search expands a whole frontier
+        per NumPy call, so the work is one pass over the cells plus a few calls per distance level
+        (a 1000x1000 grid takes well under a second, and it is only done once per layout).
+
+    Inputs:
+        size: int
+            The grid size.
+
+        sources: array
+            Cells the distances are measured from, shape (no sources, 2), indexed like the entity
+            locations (grid[x, y]).
+
+        blocked: array
+            Optional boolean (size, size) grid of cells that can't be entered (walls). Without one the
+            field is the Manhattan distance to the nearest source.
+
+    Outputs:
+        field: array
+            int32 array of shape (size, size), UNREACHABLE where no source can be reached.
+    '''
+    field = np.full(size * size, UNREACHABLE, dtype=np.int32)
+    sources = np.asarray(sources, dtype=np.int64).reshape(-1, 2)
+
+    # Cells are handled as flat indices x * size + y
+    frontier = np.unique(sources[:, 0] * size + sources[:, 1])
+    field[frontier] = 0
+    open_cells = None if blocked is None else ~np.asarray(blocked, dtype=bool).reshape(-1)
+
+    distance = 0
+    while len(frontier):
+        distance += 1
+        x, y = np.divmod(frontier, size)
+
+        # Neighbours of the frontier that stay on the grid
+        neighbours = np.concatenate((
+            frontier[x < size - 1] + size,
+            frontier[x > 0] - size,
+            frontier[y < size - 1] + 1,
+            frontier[y > 0] - 1,
+        ))
+
+        # Keeping the cells reached for the first time (and not blocked), each once
+        new = neighbours[field[neighbours] == UNREACHABLE]
+        if open_cells is not None:
+            new = new[open_cells[new]]
+        frontier = np.unique(new)
+        field[frontier] = distance
+
+    return field.reshape(size, size)
+
+##########################################################################
+# Cached Fields
+##########################################################################
+
+def layout_key(size: int, sources, blocked=None):
+    '''
+    Description:
+        Hash identifying a distance field: the grid size, the source cells and the blocked cells.
+    '''
+    digest = hashlib.blake2b(np.asarray(sources, dtype=np.int64).tobytes(), digest_size=16)
+    if blocked is not None:
+        digest.update(np.packbits(np.asarray(blocked, dtype=bool)).tobytes())
+
+    return size, digest.hexdigest()
+
+def distance_field(size: int, sources, blocked=None):
+    '''
+    Description:
+        Returns the distance field of bfs_distance_field(), computed once per layout: envs (and vector
+        env sub-environments) built with the same layout share one read-only array.
+    '''
+    key = layout_key(size, sources, blocked)
+    field = _cached_fields.get(key)
+
+    if field is None:
+        field = bfs_distance_field(size, sources, blocked)
+        field.flags.writeable = False
+
+        if len(_cached_fields) >= MAX_CACHED_FIELDS:
+            del _cached_fields[next(iter(_cached_fields))]
+        _cached_fields[key] = field
+
+    return field
+
+def candy_distance_fields(size: int, candies, blocked=None):
+    '''
+    Description:
+        One distance field per candy, stacked.
+
+    Outputs:
+        fields: array
+            int32 array of shape (no candies, size, size).
+    '''
+    candies = np.asarray(candies, dtype=np.int64).reshape(-1, 2)
+    if not len(candies):
+        return np.zeros((0, size, size), dtype=np.int32)
+
+    return np.stack([distance_field(size, candy[None], blocked) for candy in candies])
@@ -0,0 +1,547 @@
+import argparse
+import asyncio
+import json
+import numbers
+import socket
+import struct
+import sys
+import threading
+import traceback
+
+import numpy as np
+import gymnasium as gym
+
+from vector_env import VectorHauntedMansion
+from action_mask import batched_action_masks
+
+# Every message is a frame: payload length (uint32) and opcode (uint8), little-endian, then the payload.
+# Replies use the opcode of the request, or ERROR with a traceback as payload
+HEADER = struct.Struct('<IB')
+HELLO, RESET, STEP, CLOSE, ERROR = 0, 1, 2, 3, 255
+
+# HELLO reply: number of environments, grid size, number of ghosts and candies
+HELLO_REPLY = struct.Struct('<IIII')
+
+# Batches up to this many envs are stepped on the event loop itself: they take tens of microseconds,
+# less than handing them to a pool thread, larger ones run in the loop's thread pool
+INLINE_MAX_ENVS = 256
+
+##########################################################################
+# Wire Format
+##########################################################################
+
+def coord_dtype(size: int):
+    '''
+    Description:
+        Dtype of the locations sent over the wire: int16 (half the bytes of int32) unless the grid is too
+        large for it. Collected candies are sent as -1 like in the envs.
+    '''
+    return np.dtype('<i2') if size <= np.iinfo(np.int16).max else np.dtype('<i4')
+
+def pack_states(agent, ghosts, candies, dtype):
+    '''
+    Description:
+        Packs the locations of a batch of environments as one row per env:
+        [agent x, agent y, ghosts..., candies...].
+
+    Outputs:
+        rows: array
+            (no envs, 2 + 2 * no ghosts + 2 * no candies) array of `dtype`.
+    '''
+    num_envs = len(agent)
+    return np.concatenate((agent, ghosts.reshape(num_envs, -1), candies.reshape(num_envs, -1)), axis=1).astype(dtype)
+
+def unpack_states(rows, num_ghosts: int, num_candies: int):
+    '''
+    Description:
+        Inverse of pack_states(), returns int64 (agent, ghosts, candies) arrays.
+    '''
+    rows = rows.astype(np.int64)
+    num_envs = len(rows)
+    agent = rows[:, 0:2]
+    ghosts = rows[:, 2:2 + 2 * num_ghosts].reshape(num_envs, num_ghosts, 2)
+    candies = rows[:, 2 + 2 * num_ghosts:].reshape(num_envs, num_candies, 2)
+
+    return agent, ghosts, candies
+
+##########################################################################
+# Server
+##########################################################################
+
+class _Session:
+
+    def __init__(self, payload: bytes):
+        '''
+        Description:
+            The environments of one connection, a VectorHauntedMansion built from the client's HELLO
+            (a JSON object with num_envs, variant and env_kwargs, the only message that isn't binary).
+        '''
+        config = json.loads(payload)
+        variant = config.get('variant', 'final')
+        env_kwargs = dict(config.get('env_kwargs', {}))
+
+        # The client builds the observations, the server only needs the locations
+        if variant != 'simple':
+            env_kwargs['obs_mode'] = 'dict'
+
+        self.env = VectorHauntedMansion(int(config['num_envs']), variant, copy=False, **env_kwargs)
+        self.dtype = coord_dtype(self.env.size)
+        self.inline = self.env.num_envs <= INLINE_MAX_ENVS
+
+    def hello(self):
+        # Layout of the batch, for the client to check against its own template env
+        env = self.env
+        return HELLO_REPLY.pack(env.num_envs, env.size, env.ghosts_location.shape[1], env.candies_location.shape[1])
+
+    def reset(self, payload: bytes):
+        # Payload: no bytes (no seeds) or one int64 seed per env. Reply: [target, state] rows
+        env = self.env
+        seeds = np.frombuffer(payload, dtype='<i8').tolist() if payload else None
+        env.reset(seed=seeds)
+
+        states = pack_states(env.agent_location, env.ghosts_location, env.candies_location, self.dtype)
+        return np.concatenate((env.target_location.astype(self.dtype), states), axis=1).tobytes()
+
+    def step(self, payload: bytes):
+        # Payload: one uint8 action per env. Reply: rewards (float64), state rows, final state rows of the
+        # envs that terminated (before their autoreset) and terminated flags (uint8)
+        env = self.env
+        _, reward, terminated, _, infos = env.step(np.frombuffer(payload, dtype=np.uint8))
+
+        parts = [reward.astype('<f8').tobytes()]
+        parts.append(pack_states(env.agent_location, env.ghosts_location, env.candies_location, self.dtype).tobytes())
+
+        done = np.flatnonzero(terminated)
+        if len(done):
+            final = [infos['final_observation'][i] for i in done]
+            empty = np.zeros((0, 2), dtype=np.int64)
+            parts.append(pack_states(
+                np.stack([obs['agent'] for obs in final]),
+                np.stack([obs.get('ghosts', empty) for obs in final]),
+                np.stack([obs.get('candies', empty) for obs in final]),
+                self.dtype,
+            ).tobytes())
+
+        parts.append(terminated.astype(np.uint8).tobytes())
+        return b''.join(parts)
+
+    def close(self):
+        self.env.close()
+
+class EnvServer:
+
+    ##########################################################################
+    # Init
+    ##########################################################################
+
+    def __init__(self, address):
+        '''
+        Description:
+            asyncio server hosting Haunted Mansions for remote learners (see EnvClient). Every connection
+            gets its own batch of environments, a VectorHauntedMansion configured by the client's HELLO,
+            and then sends batched reset/step requests as binary frames (packed int arrays, no pickle or
+            JSON). Connections are served concurrently: resets and steps of large batches run in the
+            loop's thread pool (see INLINE_MAX_ENVS), so a connection stepping a big batch doesn't hold up
+            the others (NumPy releases the GIL in its large array operations).
+
+        Inputs:
+            address: str or tuple
+                Path of a Unix-domain socket, or (host, port) for TCP (port 0 picks a free port).
+
+        Outputs:
+            address: str or tuple
+                The address the server listens on, with the actual port for TCP (after start()).
+        '''
+        self.address = address
+        self.server = None
+        self.loop = None
+        self.thread = None
+
+    ##########################################################################
+    # Serving Connections
+    ##########################################################################
+
+    async def _handle(self, reader, writer):
+        # One connection: read a frame, run it, write the reply, until CLOSE or disconnect
+        # A connection waits for each reply before sending its next frame, so its session is never run
+        # by two pool threads at once
+        loop = asyncio.get_running_loop()
+        session = None
+        try:
+            while True:
+                length, opcode = HEADER.unpack(await reader.readexactly(HEADER.size))
+                payload = await reader.readexactly(length) if length else b''
+
+                if opcode == CLOSE:
+                    break
+
+                try:
+                    if opcode == HELLO:
+                        if session is not None:
+                            session.close()
+                        session = await loop.run_in_executor(None, _Session, payload)
+                        reply = session.hello()
+                    elif session is None:
+                        raise RuntimeError('The first message of a connection must be HELLO')
+                    elif opcode in (RESET, STEP):
+                        run = session.reset if opcode == RESET else session.step
+                        reply = run(payload) if session.inline else await loop.run_in_executor(None, run, payload)
+                    else:
+                        raise ValueError(f'Unknown opcode {opcode}')
+
+                except Exception:
+                    reply, opcode = traceback.format_exc().encode(), ERROR
+
+                writer.write(HEADER.pack(len(reply), opcode))
+                writer.write(reply)
+                await writer.drain()
+
+        # The client went away
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+        finally:
+            if session is not None:
+                session.close()
+            writer.close()
+
+    async def start(self):
+        '''
+        Description:
+            Starts listening on the address (on the running event loop).
+        '''
+        if isinstance(self.address, str):
+            self.server = await asyncio.start_unix_server(self._handle, path=self.address)
+        else:
+            host, port = self.address
+            self.server = await asyncio.start_server(self._handle, host, port)
+            self.address = self.server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self):
+        '''
+        Description:
+            Starts the server and serves connections until cancelled.
+        '''
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    ##########################################################################
+    # Running in a Background Thread
+    ##########################################################################
+
+    def start_in_thread(self):
+        '''
+        Description:
+            Runs the server on its own event loop in a daemon thread and returns once it is listening,
+            e.g. to serve envs from a notebook (which already runs a loop) or in a test on localhost.
+        '''
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self.start())
+            started.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name='mansion-env-server', daemon=True)
+        self.thread.start()
+        started.wait()
+
+        return self
+
+    def close(self):
+        '''
+        Description:
+            Stops a server started with start_in_thread().
+        '''
+        if self.loop is None:
+            return
+
+        async def shutdown():
+            self.server.close()
+            await self.server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+
+##########################################################################
+# Client
+##########################################################################
+
+class EnvClient(gym.vector.VectorEnv):
+
+    # Defining metadata (no rendering, sub-environments autoreset on the server)
+    metadata = {'render_modes' : [], 'autoreset': True}
+
+    ##########################################################################
+    # Init
+    ##########################################################################
+
+    def __init__(self, address, num_envs: int = 64, variant: str = 'final', **env_kwargs):
+        '''
+        Description:
+            Vector env whose Haunted Mansions run in an EnvServer, possibly in another process. Behaves
+            like VectorHauntedMansion built with the same arguments (same observations, rewards and
+            autoreset, sub-environment i reset with seed s matches `env_class().reset(seed=s)`).
+
+            step_async() only sends the actions, so the learner can work while the server steps.
+
+        Inputs:
+            address: str or tuple
+                Path of the server's Unix-domain socket, or (host, port) for TCP.
+
+            num_envs: int
+                Number of environments hosted for this client, 64 for default.
+
+            variant: str
+                'simple', 'intermediate' or 'final' (default).
+
+            env_kwargs: dict
+                Passed to the scalar environment class on both sides (must be JSON serialisable).
+        '''
+        if variant not in VectorHauntedMansion.variants:
+            raise ValueError(f'Unknown variant {variant!r}, expected one of {list(VectorHauntedMansion.variants)}')
+
+        if variant == 'simple' and env_kwargs.get('obs_mode', 'dict') != 'dict':
+            raise ValueError(f"The simple variant only has 'dict' observations, got obs_mode={env_kwargs['obs_mode']!r}")
+
+        # Template scalar env, only used to read the spaces and the number of ghosts/candies
+        env_kwargs['render_mode'] = None
+        template = VectorHauntedMansion.variants[variant](**env_kwargs)
+        super().__init__(num_envs, template.observation_space, template.action_space)
+
+        self.variant = variant
+        self.obs_mode = getattr(template, 'obs_mode', 'dict')
+        self.state_encoder = getattr(template, 'state_encoder', None)
+        self.door_distance = template.door_distance
+        self.directions = np.array([template.action_to_direction[a] for a in range(4)], dtype=np.int64)
+        self.boundary_masks = template.boundary_masks
+        self.action_mask = template.action_mask
+        self.num_ghosts = len(getattr(template, 'ghosts_location', ()))
+        self.num_candies = len(getattr(template, 'candies_location', ()))
+        self.dtype = coord_dtype(template.size)
+        self.row_size = 2 + 2 * self.num_ghosts + 2 * self.num_candies
+        template.close()
+
+        if isinstance(address, str):
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.socket.connect(address)
+
+        # Receive buffer, grown to the largest reply and reused
+        self.buffer = bytearray(1 << 16)
+        self.header = bytearray(HEADER.size)
+
+        kwargs = {key: value for key, value in env_kwargs.items() if key != 'render_mode'}
+        self._send(HELLO, json.dumps({'num_envs': num_envs, 'variant': variant, 'env_kwargs': kwargs}).encode())
+        layout = HELLO_REPLY.unpack(self._recv())
+        if layout != (num_envs, template.size, self.num_ghosts, self.num_candies):
+            raise RuntimeError(f'Server layout {layout} does not match the client {(num_envs, template.size, self.num_ghosts, self.num_candies)}')
+
+        # Latest locations received from the server (for action_masks())
+        self.target_location = None
+        self.agent_location = None
+        self.ghosts_location = None
+
+    ##########################################################################
+    # Framing
+    ##########################################################################
+
+    def _send(self, opcode: int, payload: bytes = b''):
+        self.socket.sendall(HEADER.pack(len(payload), opcode) + payload)
+
+    def _recv_into(self, view):
+        # Fills the whole memoryview from the socket
+        while len(view):
+            n = self.socket.recv_into(view)
+            if n == 0:
+                raise ConnectionError('The env server closed the connection')
+            view = view[n:]
+
+    def _recv(self):
+        '''
+        Description:
+            Returns the payload of the next reply (a view of the reused buffer, valid until the next
+            call), raising the server's error if the request failed.
+        '''
+        self._recv_into(memoryview(self.header))
+        length, opcode = HEADER.unpack(self.header)
+
+        if length > len(self.buffer):
+            self.buffer = bytearray(length)
+        payload = memoryview(self.buffer)[:length]
+        self._recv_into(payload)
+
+        if opcode == ERROR:
+            raise RuntimeError('Env server failed:\n' + bytes(payload).decode())
+
+        return payload
+
+    ##########################################################################
+    # Returning Observations and Info
+    ##########################################################################
+
+    def _observation(self, agent, target, ghosts, candies):
+        # Batched observation, in the same format as VectorHauntedMansion
+        if self.obs_mode == 'discrete':
+            return self.state_encoder.encode(agent, ghosts, candies)
+
+        if self.obs_mode == 'flat':
+            num_envs = len(agent)
+            return np.concatenate((agent, target, ghosts.reshape(num_envs, -1), candies.reshape(num_envs, -1)), axis=1)
+
+        observation = {'agent': agent, 'target': target}
+        if self.variant != 'simple':
+            observation['ghosts'] = ghosts
+            observation['candies'] = candies
+
+        return observation
+
+    def _info(self, agent, ghosts):
+        # Distance between each agent and its door (BFS distance field), and the valid actions
+        distance = self.door_distance[agent[:, 0], agent[:, 1]].astype(np.float64)
+        info = {'distance': distance, '_distance': np.ones(len(agent), dtype=bool)}
+
+        if self.action_mask is not None:
+            info['action_mask'] = self.action_masks(agent, ghosts)
+            info['_action_mask'] = info['_distance']
+
+        return info
+
+    def action_masks(self, agent=None, ghosts=None):
+        '''
+        Description:
+            Returns the valid actions of every sub-environment (or of the given agent/ghost locations),
+            computed locally from the latest locations, see VectorHauntedMansion.action_masks().
+        '''
+        if agent is None:
+            agent, ghosts = self.agent_location, self.ghosts_location
+        return batched_action_masks(self.boundary_masks, agent, self.directions, ghosts if self.action_mask == 'hazard' else None)
+
+    ##########################################################################
+    # Reset and Step
+    ##########################################################################
+
+    def reset_wait(self, seed=None, options: dict = None):
+        '''
+        Description:
+            Resets all sub-environments.
+
+        Inputs:
+            seed: int or list
+                An int seeds sub-environment i with `seed + i`, a list gives one seed per sub-environment.
+        '''
+        if seed is None:
+            payload = b''
+        else:
+            seeds = [int(seed) + i for i in range(self.num_envs)] if isinstance(seed, numbers.Integral) else list(seed)
+            if len(seeds) != self.num_envs:
+                raise ValueError(f'Expected {self.num_envs} seeds, got {len(seeds)}')
+            payload = np.asarray(seeds, dtype='<i8').tobytes()
+
+        self._send(RESET, payload)
+        rows = np.frombuffer(self._recv(), dtype=self.dtype).reshape(self.num_envs, 2 + self.row_size)
+
+        self.target_location = rows[:, 0:2].astype(np.int64)
+        agent, ghosts, candies = unpack_states(rows[:, 2:], self.num_ghosts, self.num_candies)
+
+        self.agent_location, self.ghosts_location = agent, ghosts
+
+        return self._observation(agent, self.target_location, ghosts, candies), self._info(agent, ghosts)
+
+    def step_async(self, actions):
+        '''
+        Description:
+            Sends the batch of actions, the server starts stepping straight away.
+        '''
+        self._send(STEP, np.asarray(actions, dtype=np.uint8).reshape(self.num_envs).tobytes())
+
+    def step_wait(self):
+        '''
+        Description:
+            Receives the stepped batch, see VectorHauntedMansion.step_wait().
+        '''
+        num_envs, row_size = self.num_envs, self.row_size
+        payload = self._recv()
+
+        # Layout of the reply: rewards, state rows, final state rows (one per terminated env), flags
+        terminated = np.frombuffer(payload[len(payload) - num_envs:], dtype=np.uint8).astype(bool)
+        reward = np.frombuffer(payload[:8 * num_envs], dtype='<f8').copy()
+        rows = np.frombuffer(payload[8 * num_envs:len(payload) - num_envs], dtype=self.dtype).reshape(-1, row_size)
+
+        agent, ghosts, candies = unpack_states(rows[:num_envs], self.num_ghosts, self.num_candies)
+        truncated = np.zeros(num_envs, dtype=bool)
+        target = self.target_location
+        infos = self._info(agent, ghosts)
+        self.agent_location, self.ghosts_location = agent, ghosts
+
+        done = np.flatnonzero(terminated)
+        if len(done):
+            final_agent, final_ghosts, final_candies = unpack_states(rows[num_envs:], self.num_ghosts, self.num_candies)
+            final = self._observation(final_agent, target[done], final_ghosts, final_candies)
+            final_infos = self._info(final_agent, final_ghosts)
+
+            final_observation = np.full(num_envs, None, dtype=object)
+            final_info = np.full(num_envs, None, dtype=object)
+            for k, i in enumerate(done):
+                if self.obs_mode == 'discrete':
+                    final_observation[i] = int(final[k])
+                elif self.obs_mode == 'flat':
+                    final_observation[i] = final[k].copy()
+                else:
+                    final_observation[i] = {key: value[k].copy() for key, value in final.items()}
+                final_info[i] = {'distance': final_infos['distance'][k]}
+                if self.action_mask is not None:
+                    final_info[i]['action_mask'] = final_infos['action_mask'][k]
+            mask = np.zeros(num_envs, dtype=bool)
+            mask[done] = True
+            infos.update({
+                'final_observation': final_observation, '_final_observation': mask,
+                'final_info': final_info, '_final_info': mask,
+            })
+
+        return self._observation(agent, target, ghosts, candies), reward, terminated, truncated, infos
+
+    ##########################################################################
+    # Close
+    ##########################################################################
+
+    def close_extras(self, **kwargs):
+        '''
+        Description:
+            Tells the server to drop this client's environments and closes the connection.
+        '''
+        try:
+            self._send(CLOSE)
+        except OSError:
+            pass
+        self.socket.close()
+
+##########################################################################
+# Command Line
+##########################################################################
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve Haunted Mansion environments over a socket.')
+    parser.add_argument('--unix', help='Listen on this Unix-domain socket path')
+    parser.add_argument('--host', default='127.0.0.1', help='TCP host (default 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=5555, help='TCP port (default 5555)')
+    args = parser.parse_args(argv)
+
+    server = EnvServer(args.unix or (args.host, args.port))
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
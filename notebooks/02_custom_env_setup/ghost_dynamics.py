@@ -0,0 +1,124 @@
+import numpy as np
+
+from occupancy import GHOST, CANDY, DOOR
+
+# How ghosts can move every step: a random walk, one step towards the agent, or back and forth
+# along a row/column (turning round when blocked)
+GHOST_POLICIES = ('random', 'chase', 'patrol')
+
+# Same directions as the agent's actions: right, down, left, up
+DIRECTIONS = np.array([[1, 0], [0, 1], [-1, 0], [0, -1]], dtype=np.int64)
+
+##########################################################################
+# Proposing Moves
+##########################################################################
+
+def patrol_headings(num_ghosts: int):
+    '''
+    Description:
+        Initial patrol directions, ghosts alternate between patrolling a row (moving right first) and a
+        column (moving down first).
+
+    Outputs:
+        headings: array
+            int64 array of shape (num_ghosts, 2), the direction each ghost moves in.
+    '''
+    return DIRECTIONS[np.arange(num_ghosts) % 2].copy()
+
+def propose_ghost_moves(np_random, policy: str, ghosts, agent, headings=None):
+    '''
+    Description:
+        Returns the move every ghost wants to make under `policy`, computed for all ghosts at once.
+
+    Inputs:
+        np_random: np.random.Generator
+            The environment's random generator (only drawn from by the 'random' policy).
+
+        policy: str
+            One of GHOST_POLICIES.
+
+        ghosts: array
+            Ghost locations, shape (no ghosts, 2).
+
+        agent: array
+            Agent location, shape (2,).
+
+        headings: array
+            Patrol directions (see patrol_headings()), only used by the 'patrol' policy.
+
+    Outputs:
+        moves: array
+            int64 array of shape (no ghosts, 2), one direction (or [0, 0]) per ghost.
+    '''
+    if policy == 'random':
+        return DIRECTIONS[np_random.integers(0, 4, size=len(ghosts))]
+
+    if policy == 'chase':
+        # One step along the axis where the agent is furthest away (x on ties)
+        delta = agent - ghosts
+        horizontal = np.abs(delta[:, 0]) >= np.abs(delta[:, 1])
+        moves = np.zeros_like(ghosts)
+        moves[:, 0] = np.where(horizontal, np.sign(delta[:, 0]), 0)
+        moves[:, 1] = np.where(horizontal, 0, np.sign(delta[:, 1]))
+        return moves
+
+    if policy == 'patrol':
+        return headings
+
+    raise ValueError(f'Unknown ghost policy {policy!r}, expected one of {GHOST_POLICIES}')
+
+##########################################################################
+# Resolving Moves
+##########################################################################
+
+def resolve_ghost_moves(ghosts, moves, occupancy):
+    '''
+    Description:
+        Applies the proposed moves of all ghosts at once, clipped to the grid, and updates the
+        occupancy grid in place. Moves are resolved against the occupancy grid before the move: a ghost
+        stays where it is if its new cell holds the door, a candy or another ghost, and if several ghosts
+        move onto the same free cell the one with the lowest index gets it. Ghosts that stay keep their
+        own cell, which no other ghost could move onto, so a single vectorised pass settles every
+        conflict (no per-ghost loop).
+
+    Inputs:
+        ghosts: array
+            Ghost locations, shape (no ghosts, 2).
+
+        moves: array
+            Proposed move of each ghost, shape (no ghosts, 2).
+
+        occupancy: array
+            Occupancy grid (see occupancy.py), updated in place.
+
+    Outputs:
+        new_ghosts: array
+            New ghost locations, shape (no ghosts, 2).
+
+        moved: array
+            Boolean array of shape (no ghosts,), False for ghosts that were blocked or did not move.
+    '''
+    # Clipping to the grid (np.minimum/np.maximum, cheaper than np.clip on small arrays)
+    new_ghosts = np.minimum(np.maximum(ghosts + moves, 0), occupancy.shape[0] - 1)
+
+    # Ghosts never move onto the door, a candy or a ghost (a ghost that doesn't move "blocks" itself)
+    blocked = (occupancy[new_ghosts[:, 0], new_ghosts[:, 1]] & (DOOR | CANDY | GHOST)) != 0
+    new_ghosts[blocked] = ghosts[blocked]
+
+    moved = ~blocked
+
+    # Only the first of the ghosts moving onto the same cell gets it
+    movers = np.flatnonzero(moved)
+    if len(movers) > 1:
+        cells = new_ghosts[movers, 0] * occupancy.shape[1] + new_ghosts[movers, 1]
+        _, first = np.unique(cells, return_index=True)
+        if len(first) < len(movers):
+            losers = np.delete(movers, first)
+            new_ghosts[losers] = ghosts[losers]
+            moved[losers] = False
+
+    # Moving the ghosts in the occupancy grid
+    occupancy[ghosts[:, 0], ghosts[:, 1]] &= ~GHOST
+    occupancy[new_ghosts[:, 0], new_ghosts[:, 1]] |= GHOST
+
+    return new_ghosts, moved
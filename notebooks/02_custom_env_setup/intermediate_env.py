@@ -1,18 +1,33 @@
 import numpy as np
 import gymnasium as gym
-import pygame
 import sys
 
+from state_encoding import StateEncoder
+from profiling import instrument
+from snapshot import snapshot_dtype, capture_state, restore_state
+from layout import generate_layout
+from distance_field import distance_field, candy_distance_fields, UNREACHABLE
+from action_mask import ACTION_MASKS, boundary_mask_table, ghost_free_mask
+from occupancy import build_occupancy_grid, GHOST, CANDY, DOOR
+
 class Intm_Haunted_Mansion(gym.Env):
 
     # Defining metadata (render_modes/render_fps)
-    metadata = {'render_modes' : ['human'], 'render_fps': 1}
+    metadata = {'render_modes' : ['human', 'rgb_array', 'human_async'], 'render_fps': 1}
+
+    # Rewards/penalties used in step() (also read by VectorHauntedMansion in vector_env.py)
+    door_reward = 20
+    ghost_penalty = 25
+    candy_reward = 15
 
     ##########################################################################
     # Init
     ##########################################################################
 
-    def __init__(self, size: int = 5, render_mode = 'human', step_penalty = 0.1):
+    def __init__(self, size: int = 5, render_mode = None, step_penalty = 0.1, obs_mode = 'dict', profile = False,
+                 num_ghosts: int = 3, num_candies: int = 2, door: str = 'corner', layout_seed: int = 0,
+                 candy_distance: bool = False, shaping_scale: float = 0.0, shaping_gamma: float = 0.99,
+                 action_mask: str = None):
         ''' 
         Description:
             Initialises the environment
@@ -22,7 +37,44 @@ class Intm_Haunted_Mansion(gym.Env):
                 The grid size, 5 by 5 for default 
 
             render_mode: str
-                For visualisation, default render mode set to 'human'
+                For visualisation, default None (no rendering, for training). 'human' opens a window,
+                'rgb_array' draws off-screen and render() returns the frame as an array, 'human_async'
+                draws the window from a background thread at render_fps (see threaded_renderer.py)
+
+            obs_mode: str
+                'dict' (default) for dictionary observations, 'discrete' for a single state index
+                (see state_index()) for tabular methods, 'flat' for one int64 array
+                [agent x, agent y, target x, target y, ghosts..., candies...] (a Box, for MLP policies)
+
+            profile: bool or str
+                False (default) for no profiling, True to time reset/step/_get_obs/_get_info/render
+                (see profile_stats()), 'info' to also add the latest timings to info['profile_ns']
+
+            num_ghosts: int
+                Number of ghosts, 3 for default
+
+            num_candies: int
+                Number of candies, 2 for default
+
+            door: str
+                Door placement policy (see layout.py): 'corner' (default), 'edge' or 'random'
+
+            layout_seed: int
+                Seed of the generated layout, the classic 5x5 mansion is used for the default size/counts
+
+            candy_distance: bool
+                If True, info['candy_distance'] also holds the BFS distance to each candy (-1 once collected)
+
+            shaping_scale: float
+                Weight of the potential-based shaping reward, scale * (distance before - gamma * distance
+                after) with the BFS distance to the door, 0 (default) for no shaping
+
+            shaping_gamma: float
+                Discount used by the shaping reward (match the agent's gamma), 0.99 for default
+
+            action_mask: str
+                None (default) for no mask, 'boundary' to add info['action_mask'], the actions whose move
+                stays on the grid, 'hazard' to also exclude moves onto a ghost (see action_masks())
 
         Outputs:
             size : int
@@ -41,7 +93,7 @@ class Intm_Haunted_Mansion(gym.Env):
                 Initial location of the agent as a numpy array.
                 
             target_location : array
-                Fixed location of the target/door as a numpy array, set to [4, 4].
+                Fixed location of the target/door as a numpy array, [4, 4] in the classic layout.
 
             ghosts_location: array
                 Fixed locations of the ghosts, locations passed in as a list.
@@ -52,6 +104,15 @@ class Intm_Haunted_Mansion(gym.Env):
             step_penalty: float
                 Controls the penalty for each step taken that does not result in termination
             
+            occupancy: array
+                Grid of entity codes (see occupancy.py), indexed as occupancy[x, y], updated in place by step() and reset().
+
+            candy_index: array
+                Index of the candy on each cell of the grid, -1 if there is none.
+
+            state_encoder: StateEncoder
+                Maps the state (agent cell, ghost cells, candies collected) to a dense integer and back.
+
             observation_space : gym.spaces.Dict
                 Observation space for the environment, containing the agent's and target's grid positions.
                 
@@ -80,30 +141,80 @@ class Intm_Haunted_Mansion(gym.Env):
         # Placeholder value for agent location, the agent is out of bounds and is randomly set on the grid during reset() function
         self.agent_location = np.array([-1, -1], dtype=np.int64)   
 
+        # Door, ghosts and candies from the layout generator (the classic 5x5 mansion for the defaults)
+        target, ghosts, candies = generate_layout(size, num_ghosts, num_candies, door, layout_seed)
+
         # Setting position of the target_location (exit door), the door is static
-        self.target_location = np.array([4, 4], dtype=np.int64)
+        self.target_location = target
 
         # Setting positions of ghosts (using nested array as more than one ghost)
-        self.ghosts_location = np.array([[0, 0],[4, 2],[2, 4]])
+        self.ghosts_location = ghosts
         
-        # Setting positions of candies (using nested array as more than one candy)
-        self.candies_location = np.array([[2, 2],[3, 0]])
+        # Setting positions of candies (using nested array as more than one candy), kept in
+        # initial_candies so reset() can put collected candies back
+        self.initial_candies = candies
+        self.candies_location = self.initial_candies.copy()
 
         # Setting penalty for each step the action takes where target location is not reached
         self.step_penalty = step_penalty
 
-        # Observations are represented as dictionaries with the agent's and the target's location.
-        self.observation_space = gym.spaces.Dict(
-            {
-                'agent': gym.spaces.Box(0, size - 1, shape=(2,), dtype = np.int64),
-                'target': gym.spaces.Box(0, size - 1, shape=(2,), dtype = np.int64),
-                # shape for ghosts/candies to (no ghosts/candies, 2), where each has [x, y] coordinates
-                'ghosts': gym.spaces.Box(0, size - 1, shape=(self.ghosts_location.shape[0], 2), dtype = np.int64),
-                # Setting lower bound to -1 as once candies are collected they are placed out of bounds (see step())
-                'candies': gym.spaces.Box(-1, size - 1, shape=(self.candies_location.shape[0], 2), dtype = np.int64)
-            }
+        # Occupancy grid so step() can check the agent's cell with one lookup
+        self.occupancy, self.candy_index = build_occupancy_grid(
+            self.size, self.target_location, self.ghosts_location, self.candies_location
         )
 
+        # BFS distance from every cell to the door (and optionally to each candy), computed once per
+        # layout and shared by every env with the same layout (see distance_field.py)
+        self.door_distance = distance_field(self.size, self.target_location[None])
+        self.candy_distance = candy_distance_fields(self.size, self.initial_candies) if candy_distance else None
+
+        # Potential-based shaping (off for the default scale of 0)
+        self.shaping_scale = shaping_scale
+        self.shaping_gamma = shaping_gamma
+
+        if obs_mode not in ('dict', 'discrete', 'flat'):
+            raise ValueError(f"obs_mode must be 'dict', 'discrete' or 'flat', got {obs_mode!r}")
+        self.obs_mode = obs_mode
+
+        # Mixed-radix encoding of the state into one integer (for tabular methods)
+        self.state_encoder = StateEncoder(
+            self.size, len(self.ghosts_location), len(self.candies_location), fixed_ghosts=True
+        )
+
+        if self.obs_mode == 'discrete':
+            # Observations are a single state index
+            self.state_encoder._check_indexable()
+            self.observation_space = gym.spaces.Discrete(self.state_encoder.num_states)
+        elif self.obs_mode == 'flat':
+            # Observations are one contiguous array, written in place into a preallocated buffer
+            num_ghosts, num_candies = len(self.ghosts_location), len(self.candies_location)
+            self.flat_obs = np.zeros(4 + 2 * (num_ghosts + num_candies), dtype=np.int64)
+            self.flat_agent = self.flat_obs[0:2]
+            self.flat_target = self.flat_obs[2:4]
+            self.flat_ghosts = self.flat_obs[4:4 + 2 * num_ghosts].reshape(num_ghosts, 2)
+            self.flat_candies = self.flat_obs[4 + 2 * num_ghosts:].reshape(num_candies, 2)
+
+            # Read-only view of the buffer, for callers that want the latest observation without a copy
+            self.flat_obs_view = self.flat_obs.view()
+            self.flat_obs_view.flags.writeable = False
+
+            # Setting lower bound to -1 for the candies as once collected they are placed out of bounds
+            low = np.zeros_like(self.flat_obs)
+            low[4 + 2 * num_ghosts:] = -1
+            self.observation_space = gym.spaces.Box(low, size - 1, dtype=np.int64)
+        else:
+            # Observations are represented as dictionaries with the agent's and the target's location.
+            self.observation_space = gym.spaces.Dict(
+                {
+                    'agent': gym.spaces.Box(0, size - 1, shape=(2,), dtype = np.int64),
+                    'target': gym.spaces.Box(0, size - 1, shape=(2,), dtype = np.int64),
+                    # shape for ghosts/candies to (no ghosts/candies, 2), where each has [x, y] coordinates
+                    'ghosts': gym.spaces.Box(0, size - 1, shape=(self.ghosts_location.shape[0], 2), dtype = np.int64),
+                    # Setting lower bound to -1 as once candies are collected they are placed out of bounds (see step())
+                    'candies': gym.spaces.Box(-1, size - 1, shape=(self.candies_location.shape[0], 2), dtype = np.int64)
+                }
+            )
+
         # We have 4 actions: right, up, left, down
         self.action_space = gym.spaces.Discrete(4)
 
@@ -115,16 +226,29 @@ class Intm_Haunted_Mansion(gym.Env):
             2: np.array([-1, 0]),  # left
             3: np.array([0, -1]),  # up
         }
+
+        # Valid actions of every cell (moves that stay on the grid), shared by every env of the same size
+        self.directions = np.array([self.action_to_direction[a] for a in range(4)], dtype=np.int64)
+        self.boundary_masks = boundary_mask_table(self.size, self.directions)
+
+        if action_mask is not None and action_mask not in ACTION_MASKS:
+            raise ValueError(f'action_mask must be None or one of {ACTION_MASKS}, got {action_mask!r}')
+        self.action_mask = action_mask
         
-        # Initialise Pygame if render_mode is 'human'
+        # Pygame is only imported and initialised on the first render() call (see _init_render()),
+        # so environments used for training (render_mode=None) never load it
+        self.screen_size = 800
+        self.cell_size = self.screen_size // self.size
+        self.screen = None
 
-        if self.render_mode == 'human':
-            pygame.init()
-            self.screen_size = 800
-            self.cell_size = self.screen_size // self.size
-            self.screen = pygame.display.set_mode((self.screen_size, self.screen_size))
+        # Background render thread of the 'human_async' mode, started on the first frame
+        self.renderer = None
 
-            pygame.display.set_caption('Trick or ReTreat: Escape the Mansion!')
+        # Layout of the fixed-size records returned by get_state()
+        self.snapshot_dtype = snapshot_dtype(len(self.ghosts_location), len(self.candies_location))
+
+        # Timed wrappers are only bound when profiling, otherwise the plain methods run untouched
+        self.profiler = instrument(self, add_to_info=(profile == 'info')) if profile else None
 
 
     ##########################################################################
@@ -138,8 +262,20 @@ class Intm_Haunted_Mansion(gym.Env):
 
         Outputs:
             observations: dict
-                Returns location of the agent, target, ghosts and candies.
+                Returns location of the agent, target, ghosts and candies (or the state index if
+                obs_mode is 'discrete', one flat array if obs_mode is 'flat').
         '''
+        if self.obs_mode == 'discrete':
+            return self.state_index()
+
+        if self.obs_mode == 'flat':
+            # Returning a copy so the caller can't change (or see changes to) the env's state
+            self.flat_agent[:] = self.agent_location
+            self.flat_target[:] = self.target_location
+            self.flat_ghosts[:] = self.ghosts_location
+            self.flat_candies[:] = self.candies_location
+            return self.flat_obs.copy()
+
         observation = {
             'agent': self.agent_location, 
             'target': self.target_location, 
@@ -150,6 +286,22 @@ class Intm_Haunted_Mansion(gym.Env):
         return observation
 
 
+    ##########################################################################
+    # Encoding the State as an Integer
+    ##########################################################################
+
+    def state_index(self):
+        ''' 
+        Description:
+            Returns the current state (agent cell, ghost cells, candies collected) as one dense integer,
+            to index a flat Q-table. Use state_encoder.decode() for the inverse.
+
+        Outputs:
+            index: int
+                State index in [0, state_encoder.num_states).
+        '''
+        return self.state_encoder.encode(self.agent_location, self.ghosts_location, self.candies_location)
+
     ##########################################################################
     # Returning Distance (between the agent and door)
     ##########################################################################
@@ -161,18 +313,58 @@ class Intm_Haunted_Mansion(gym.Env):
 
         Outputs:
             information: 
-                Returns distance between agent and target location (door).
+                Returns distance between agent and target location (door), looked up in the BFS
+                distance field of the layout (see distance_field.py). With candy_distance, also the
+                distance to each candy (-1 for collected ones), and the valid actions with action_mask.
         '''
-        return {
-            'distance': np.linalg.norm(
-                self.agent_location - self.target_location, ord=1
-            )
-        }
+        x, y = self.agent_location
+        info = {'distance': np.float64(self.door_distance[x, y])}
+
+        if self.candy_distance is not None:
+            info['candy_distance'] = np.where(self.candies_location[:, 0] >= 0, self.candy_distance[:, x, y], UNREACHABLE)
+
+        if self.action_mask is not None:
+            info['action_mask'] = self.action_masks()
+
+        return info
+
+    ##########################################################################
+    # Action Masks
+    ##########################################################################
+
+    def action_masks(self):
+        ''' 
+        Description:
+            Returns the valid actions in the current state, the moves that stay on the grid (the others
+            are clipped and waste the step), looked up in a table built at construction. With
+            action_mask='hazard' the moves onto a ghost are excluded too (unless every move hits one).
+            Same name and format as sb3-contrib's MaskablePPO expects.
+
+        Outputs:
+            mask: array
+                Boolean array of shape (4,).
+        '''
+        mask = self.boundary_masks[self.agent_location[0], self.agent_location[1]]
+        if self.action_mask == 'hazard':
+            mask = ghost_free_mask(mask, self.agent_location, self.directions, self.occupancy)
+
+        return mask
 
     ##########################################################################
     # Resetting the Environment
     ##########################################################################
 
+    def _restore_candies(self):
+        ''' 
+        Description:
+            Puts the collected candies back, in candies_location and in the occupancy grid. Only the
+            candy cells are touched, so the cost of reset() does not grow with the grid size.
+        '''
+        candies = self.initial_candies
+        self.candies_location = candies.copy()
+        self.occupancy[candies[:, 0], candies[:, 1]] |= CANDY
+        self.candy_index[candies[:, 0], candies[:, 1]] = np.arange(len(candies))
+
     def reset(self, seed:int = None, options: dict = None):
         ''' 
         Description:
@@ -191,14 +383,14 @@ class Intm_Haunted_Mansion(gym.Env):
 
         # Setting the agents starting location randomly on the grid
         self.agent_location = self.np_random.integers(0, self.size, size=2, dtype= np.int64)
-        # Reset candies on grid
-        self.candies_location = np.array([[2, 2],[3, 0]])
- 
+        # Reset candies on grid (the ghosts and the door never move)
+        self._restore_candies()
+
         # Getting initial observations and info based on starting agent position
         observation = self._get_obs()
         info = self._get_info()
 
-        if self.render_mode == 'human':
+        if self.render_mode in ('human', 'human_async'):
             self.render()
         
         return observation, info
@@ -239,6 +431,9 @@ class Intm_Haunted_Mansion(gym.Env):
             action = np.int64(action.item()) 
 
         direction = self.action_to_direction[action]
+
+        # Location before the move, for the shaping reward
+        previous = self.agent_location
         
         # We use np.clip to make sure we don't leave the grid bounds
         self.agent_location = np.clip(
@@ -247,36 +442,75 @@ class Intm_Haunted_Mansion(gym.Env):
 
         truncated = False
 
+        # Looking up what is on the agent's new cell in the occupancy grid
+        x, y = self.agent_location
+        cell = self.occupancy[x, y]
+
         # Terminated only when reward is reached (agent same location as door)
-        terminated =np.array_equal(self.agent_location, self.target_location)
+        terminated = bool(cell & DOOR)
 
         # Initialising reward to 0
         reward = 0
   
         if terminated:
-            reward += 20
+            reward += self.door_reward
         else:
             # Check if the agent encounters a ghost
-            if any(np.array_equal(self.agent_location, ghost) for ghost in self.ghosts_location):
-                # Penalty of - 25
-                reward -= 25
+            if cell & GHOST:
+                reward -= self.ghost_penalty
             
-            for candy in self.candies_location:
-                if np.array_equal(self.agent_location, candy) and not np.array_equal(candy, [-1, -1]):
-                    # Reward of +15
-                    reward += 15 
-                    # Removing candy from grid after agnet has collected it (by setting it out of bounds)
-                    candy[:] = [-1, -1]  
+            if cell & CANDY:
+                reward += self.candy_reward
+                # Removing candy from grid after agnet has collected it (by setting it out of bounds)
+                self.candies_location[self.candy_index[x, y]] = [-1, -1]
+                self.occupancy[x, y] &= ~CANDY
+                self.candy_index[x, y] = -1
 
         # Adding penalty for every step agent takes, default = 0.1 to avoid discouraging exploration
         reward -= self.step_penalty
 
+        # Potential-based shaping with potential -distance to the door, which keeps the optimal policy
+        if self.shaping_scale:
+            reward += self.shaping_scale * (
+                self.door_distance[previous[0], previous[1]]
+                - self.shaping_gamma * self.door_distance[self.agent_location[0], self.agent_location[1]]
+            )
+
         # Get observation and info after taking an action
         observation = self._get_obs()
         info = self._get_info()
 
+        # Handing the new frame to the render thread (never waits on the display)
+        if self.render_mode == 'human_async':
+            self._publish_frame()
+
         return observation, reward, terminated, truncated, info
 
+    ##########################################################################
+    # Initialising Pygame (on the first render() call)
+    ##########################################################################
+
+    def _init_render(self):
+        ''' 
+        Description:
+            Imports and initialises pygame and creates the surface to draw on. Only called the first
+            time render() is used, so environments that never render start fast and need no display.
+        '''
+        import pygame
+        from sprite_cache import SpriteCache
+
+        # Sprites are loaded and scaled once here rather than on every render() call
+        self.sprite_cache = SpriteCache()
+
+        if self.render_mode == 'human':
+            pygame.init()
+            self.screen = pygame.display.set_mode((self.screen_size, self.screen_size))
+            pygame.display.set_caption('Trick or ReTreat: Escape the Mansion!')
+
+        # For 'rgb_array' draw on an off-screen surface instead, no window (or display) is needed
+        else:
+            self.screen = SpriteCache.make_surface(self.screen_size)
+
     ##########################################################################
     # Render
     ##########################################################################  
@@ -284,72 +518,116 @@ class Intm_Haunted_Mansion(gym.Env):
     def render(self):
         ''' 
         Description:
-            To visualise the environment and agent's actions, only rendering mode is for human.
+            To visualise the environment and agent's actions, either in a window ('human') or as an
+            array ('rgb_array').
 
         Outputs:
-            pygame display window depicting grid, agent's movement and target location.
+            pygame display window depicting grid, agent's movement and target location. For 'rgb_array'
+            a new (H, W, 3) uint8 array of the frame instead.
         '''
-                
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-
-        # Set background to all white
-        self.screen.fill((255, 255, 255))
-
-        # Looping through rows and columns to draw rectanges (representing the grid)
-        for row in range(self.size):
-            for col in range(self.size):
-                # Calculates x and y positions of each cell in the grid by multiplying the col/row index by pixel cell size
-                cell_x = col * self.cell_size
-                cell_y = row * self.cell_size
-                # Drawing white rectangle to represent each cell in the grid
-                pygame.draw.rect(self.screen, (0, 0, 0), (cell_x, cell_y, self.cell_size, self.cell_size), 1)
-
-        # To calculate the offset to ensure images are placed in centre of cells
-        offset = self.cell_size * 0.1
-
-        # Transform target grid cooridinates into pixel coordinates 
-        door_pos = self.target_location * self.cell_size
-        
-        # Representing the door as an image from Canva
-        door_img = pygame.image.load('images/Door.png')
-        # Scaling the image of the Door to be smaller than size of the cell
-        door_img = pygame.transform.scale(door_img,(self.cell_size * 0.8,self.cell_size * 0.8))
-        # Drawing the image to the grid, adding offset to ensure img is in the middle
-        self.screen.blit(door_img, (door_pos[0] + offset , door_pos[1] + offset))
-        
-        # Iterate over each ghost in the grid
-        for ghost in self.ghosts_location:
-            # Calculate the position of the ghost in terms of pixels
-            ghost_pos = ghost * self.cell_size
-            # Load the image of the ghost
-            ghost_img = pygame.image.load('images/Ghost.png')
-            # Scale the image to fit within the cell
-            ghost_img = pygame.transform.scale(ghost_img, (self.cell_size * 0.8, self.cell_size * 0.8))
-            # Add offset to center the image in the cell and render it at the calculated position
-            self.screen.blit(ghost_img, (ghost_pos[0] + offset, ghost_pos[1] + offset))
-        
-        # Iterate over each candy in the grid
-        for candy in self.candies_location:
-            # Calculate the position of the candy in terms of pixels
-            candy_pos = candy * self.cell_size
-            # Load the image of the candy
-            candy_img = pygame.image.load('images/Candy.png')
-            # Scale the image to fit within the cell
-            candy_img = pygame.transform.scale(candy_img, (self.cell_size * 0.8, self.cell_size * 0.8))
-            # Add offset to center the image in the cell and render it at the calculated position
-            self.screen.blit(candy_img, (candy_pos[0] + offset, candy_pos[1] + offset))
-
-        agent_pos = self.agent_location * self.cell_size
-        # Representing the agent as an image from Canva
-        agent_img = pygame.image.load('images/Agent.png')
-        agent_img = pygame.transform.scale(agent_img,(self.cell_size * 0.8,self.cell_size * 0.8))
-        self.screen.blit(agent_img, (agent_pos[0] + offset, agent_pos[1] + offset))
-
-        # To keep updating the display after each action
-        pygame.display.update()  
+
+        if self.render_mode is None:
+            gym.logger.warn("render() called without a render_mode, set render_mode='human' or 'rgb_array'")
+            return
+
+        # The render thread draws on its own, the frame is only handed over
+        if self.render_mode == 'human_async':
+            self._publish_frame()
+            return
+
+        # Only the first call actually imports pygame, afterwards this is a cheap lookup
+        import pygame
+
+        if self.screen is None:
+            self._init_render()
+
+        if self.render_mode == 'human':
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    pygame.quit()
+                    sys.exit()
+
+        # Sprites and the empty grid are only loaded/scaled again if the grid or screen size changes,
+        # the door is drawn once onto the static layer
+        self.sprite_cache.build(self.size, self.screen_size)
+        self.sprite_cache.build_static(tuple(self.target_location.tolist()))
+
+        # Only the cells whose sprites changed since the last frame (agent moved, candy collected,
+        # ghost moved) are redrawn, ghosts first, then candies, then the agent on top
+        cells = self.sprite_cache.cell_sprites((
+            ('ghost', self.ghosts_location),
+            ('candy', self.candies_location),
+            ('agent', self.agent_location[None]),
+        ))
+        rects = self.sprite_cache.draw(self.screen, cells)
+
+        # Copying the frame into an array
+        if self.render_mode == 'rgb_array':
+            return self.sprite_cache.to_array(self.screen)
+
+        # Pushing only the redrawn cells to the window (the whole window after a full redraw)
+        if rects is None:
+            pygame.display.update()
+        elif rects:
+            pygame.display.update(rects)  
+
+    ##########################################################################
+    # Publishing Frames ('human_async')
+    ##########################################################################
+
+    def _publish_frame(self):
+        ''' 
+        Description:
+            Publishes copies of the entity locations to the render thread, which draws the latest frame
+            at its own pace (stale frames are dropped). Starts the thread on the first call.
+        '''
+        if self.renderer is None:
+            from threaded_renderer import ThreadedRenderer
+            self.renderer = ThreadedRenderer(self.size, self.screen_size, self.metadata['render_fps'])
+
+        self.renderer.publish(tuple(self.target_location.tolist()), (
+            ('ghost', self.ghosts_location.copy()),
+            ('candy', self.candies_location.copy()),
+            ('agent', self.agent_location[None].copy()),
+        ))
+
+    ##########################################################################
+    # Snapshots (for planning)
+    ##########################################################################
+
+    def get_state(self):
+        ''' 
+        Description:
+            Returns the full dynamic state (agent, ghosts, candies, timestep, random generator) as a small
+            fixed-size record, much cheaper than copy.deepcopy(env). See snapshot.py.
+
+        Outputs:
+            snapshot: array
+                0-d structured array of dtype self.snapshot_dtype.
+        '''
+        return capture_state(self)
+
+    def set_state(self, snapshot):
+        ''' 
+        Description:
+            Restores a state returned by get_state(), stepping afterwards gives exactly what it gave then.
+        '''
+        restore_state(self, snapshot)
+
+    ##########################################################################
+    # Profiling
+    ##########################################################################
+
+    def profile_stats(self):
+        ''' 
+        Description:
+            Returns the timings collected when the env was built with profile=True (empty otherwise).
+
+        Outputs:
+            stats: dict
+                Phase ('reset', 'step', '_get_obs', '_get_info', 'render') -> {'calls', 'total_ms', 'mean_us'}.
+        '''
+        return self.profiler.stats() if self.profiler is not None else {}
 
     ##########################################################################
     # Close
@@ -364,5 +642,11 @@ class Intm_Haunted_Mansion(gym.Env):
             Quit all pygame windows after the environment is no longer in use.
         '''
         
-        if self.render_mode == 'human':
-            pygame.quit()  # Close the pygame window
\ No newline at end of file
+        if self.renderer is not None:
+            self.renderer.close()  # Stop the render thread, which closes its window
+            self.renderer = None
+
+        if self.render_mode == 'human' and self.screen is not None:
+            import pygame
+            pygame.quit()  # Close the pygame window
+            self.screen = None
\ No newline at end of file
@@ -0,0 +1,83 @@
+import numpy as np
+
+from occupancy import sample_free_cells
+
+# Where the door can be placed: bottom right corner (as in the original 5x5 mansion), a random
+# cell on the edge of the grid or any random cell
+DOOR_POLICIES = ('corner', 'edge', 'random')
+
+# The hand-made 5x5 mansion the notebooks were trained on, kept for size 5 with the default counts
+CLASSIC_TARGET = np.array([4, 4], dtype=np.int64)
+CLASSIC_GHOSTS = np.array([[0, 0], [4, 2], [2, 4]], dtype=np.int64)
+CLASSIC_CANDIES = np.array([[2, 2], [3, 0]], dtype=np.int64)
+
+##########################################################################
+# Generating a Layout
+##########################################################################
+
+def generate_layout(size: int = 5, num_ghosts: int = 3, num_candies: int = 2, door: str = 'corner', seed: int = 0):
+    '''
+    Description:
+        Builds a valid mansion layout: a door, plus ghosts and candies on distinct cells that are not
+        the door. With size 5, 3 ghosts, 2 candies and the door in the corner it returns the classic
+        layout of the original environments, otherwise the entities are placed at random.
+
+        The cost is linear in the number of cells at worst, and only grows with the number of entities
+        on large, mostly empty grids (see sample_free_cells()).
+
+    Inputs:
+        size: int
+            The grid size.
+
+        num_ghosts: int
+            Number of ghosts to place (the final env only uses the count, its ghosts move in reset()).
+
+        num_candies: int
+            Number of candies to place.
+
+        door: str
+            Door placement policy, one of DOOR_POLICIES.
+
+        seed: int
+            Seed of the layout, the same arguments always give the same layout.
+
+    Outputs:
+        target: array
+            Location of the door, shape (2,).
+
+        ghosts: array
+            Locations of the ghosts, shape (num_ghosts, 2).
+
+        candies: array
+            Locations of the candies, shape (num_candies, 2).
+    '''
+    if door not in DOOR_POLICIES:
+        raise ValueError(f'Unknown door policy {door!r}, expected one of {DOOR_POLICIES}')
+
+    # The agent needs a free cell to start from as well as the door
+    if num_ghosts + num_candies + 2 > size * size:
+        raise ValueError(f'A {size}x{size} grid is too small for {num_ghosts} ghosts and {num_candies} candies')
+
+    if size == 5 and num_ghosts == 3 and num_candies == 2 and door == 'corner':
+        return CLASSIC_TARGET.copy(), CLASSIC_GHOSTS.copy(), CLASSIC_CANDIES.copy()
+
+    rng = np.random.default_rng(seed)
+
+    if door == 'corner':
+        target = np.array([size - 1, size - 1], dtype=np.int64)
+    elif door == 'edge':
+        # Walking round the border, cell k of the 4 * (size - 1) edge cells
+        k = int(rng.integers(0, max(4 * (size - 1), 1)))
+        side, offset = divmod(k, max(size - 1, 1))
+        target = np.array([
+            [offset, 0], [size - 1, offset], [size - 1 - offset, size - 1], [0, size - 1 - offset]
+        ][side], dtype=np.int64)
+    else:
+        target = rng.integers(0, size, size=2, dtype=np.int64)
+
+    # Ghosts and candies are picked together so they never share a cell (or the door's)
+    occupied = np.zeros((size, size), dtype=bool)
+    occupied[target[0], target[1]] = True
+    cells = sample_free_cells(rng, occupied, num_ghosts + num_candies)
+
+    return target, cells[:num_ghosts], cells[num_ghosts:]
@@ -0,0 +1,143 @@
+import math
+
+import numpy as np
+
+class _Node:
+
+    # Slots keep the thousands of nodes of a search small and fast to create
+    __slots__ = ('state', 'reward', 'terminal', 'children', 'visits', 'value_sum')
+
+    def __init__(self, state, reward: float = 0.0, terminal: bool = False, num_actions: int = 4):
+        self.state = state
+        self.reward = reward
+        self.terminal = terminal
+        self.children = [None] * num_actions
+        self.visits = 0
+        self.value_sum = 0.0
+
+class MCTSPlanner:
+
+    ##########################################################################
+    # Init
+    ##########################################################################
+
+    def __init__(self, env, num_simulations: int = 1000, exploration: float = 1.4, rollout_depth: int = 10,
+                 gamma: float = 0.99, seed: int = None):
+        '''
+        Description:
+            Monte Carlo tree search (UCT) for the intermediate/final Haunted Mansion. Every tree node
+            holds a get_state() snapshot, so a simulation restores its leaf's state with one set_state()
+            call instead of replaying the path from the root, then expands one action and finishes with
+            a random rollout.
+
+            With moving random ghosts each node keeps the outcome that was sampled when it was expanded
+            (the snapshot includes the random generator), the same as planning on one sampled future.
+
+        Inputs:
+            env: Intm_Haunted_Mansion or Final_Haunted_Mansion
+                The environment to plan in (it is stepped during the search and put back afterwards).
+
+            num_simulations: int
+                Simulations per plan() call.
+
+            exploration: float
+                UCT exploration constant.
+
+            rollout_depth: int
+                Maximum random steps after expanding a node.
+
+            gamma: float
+                Discount factor.
+
+            seed: int
+                Seeds the rollout actions.
+        '''
+        self.env = env
+        self.num_simulations = num_simulations
+        self.exploration = exploration
+        self.rollout_depth = rollout_depth
+        self.gamma = gamma
+        self.rng = np.random.default_rng(seed)
+        self.num_actions = env.action_space.n
+
+    ##########################################################################
+    # Search
+    ##########################################################################
+
+    def _select(self, node):
+        # UCT choice among the children, untried actions first
+        for action, child in enumerate(node.children):
+            if child is None:
+                return action
+
+        log_visits = math.log(node.visits)
+        best_action, best_score = 0, -math.inf
+        for action, child in enumerate(node.children):
+            score = child.reward + self.gamma * child.value_sum / max(child.visits, 1) \
+                + self.exploration * math.sqrt(log_visits / max(child.visits, 1))
+            if score > best_score:
+                best_action, best_score = action, score
+
+        return best_action
+
+    def _rollout(self):
+        # Discounted return of random actions from the env's current state
+        total, discount = 0.0, 1.0
+        for action in self.rng.integers(0, self.num_actions, size=self.rollout_depth).tolist():
+            _, reward, terminated, truncated, _ = self.env.step(action)
+            total += discount * reward
+            discount *= self.gamma
+            if terminated or truncated:
+                break
+
+        return total
+
+    def search(self):
+        '''
+        Description:
+            Runs num_simulations simulations from the env's current state and returns the root of the tree.
+            The env is restored to the state it was in before the search.
+        '''
+        env = self.env
+        root = _Node(env.get_state(), num_actions=self.num_actions)
+
+        for _ in range(self.num_simulations):
+            node, path = root, [root]
+
+            # Selection, going down fully expanded nodes
+            while not node.terminal:
+                action = self._select(node)
+                child = node.children[action]
+                if child is None:
+                    break
+                node = child
+                path.append(node)
+
+            # Expansion of one untried action, then a rollout from the new node
+            value = 0.0
+            if not node.terminal:
+                env.set_state(node.state)
+                _, reward, terminated, truncated, _ = env.step(action)
+                child = _Node(env.get_state(), reward, terminated or truncated, self.num_actions)
+                node.children[action] = child
+                path.append(child)
+                if not child.terminal:
+                    value = self._rollout()
+
+            # Backing up, the value of a node is the discounted return after reaching it
+            for node in reversed(path):
+                node.visits += 1
+                node.value_sum += value
+                value = node.reward + self.gamma * value
+
+        env.set_state(root.state)
+        return root
+
+    def plan(self):
+        '''
+        Description:
+            Returns the action to take in the env's current state: the most visited action at the root.
+        '''
+        root = self.search()
+        visits = [child.visits if child is not None else -1 for child in root.children]
+        return int(np.argmax(visits))
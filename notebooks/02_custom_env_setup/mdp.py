@@ -0,0 +1,248 @@
+import numpy as np
+
+from state_encoding import StateEncoder
+from occupancy import build_occupancy_grid, GHOST, DOOR
+
+class MansionMDP:
+
+    ##########################################################################
+    # Init (exporting the MDP from an environment)
+    ##########################################################################
+
+    def __init__(self, env):
+        '''
+        Description:
+            Exact MDP of an intermediate or final Haunted Mansion for its current layout (for the final
+            env, the ghosts placed by the last reset()). The env is deterministic, so the transitions are
+            stored as the index of the next state for every (state, action).
+
+            States are (agent cell, candies collected) pairs, indexed with a StateEncoder that leaves the
+            (fixed) ghosts out. All transitions are computed at once with the same rules as step(),
+            including the env's potential-based shaping reward if it has a shaping_scale.
+
+        Inputs:
+            env: Intm_Haunted_Mansion or Final_Haunted_Mansion
+                The environment to export, it is not modified.
+
+        Outputs:
+            encoder: StateEncoder
+                Maps states of this MDP to indices and back.
+
+            next_states: array
+                int64 array of shape (no states, 4), index of the state reached by each action.
+
+            rewards: array
+                float64 array of shape (no states, 4), reward of each transition.
+
+            terminals: array
+                Boolean array of shape (no states, 4), True if the transition ends the episode.
+
+            initial_states: array
+                Indices of the states reset() can start from (any agent cell, no candy collected).
+        '''
+        if getattr(env, 'ghost_policy', None) is not None:
+            raise ValueError('The MDP assumes ghosts that only move in reset(), not a ghost_policy')
+
+        self.size = env.size
+        self.target_location = env.target_location.copy()
+        self.ghosts_location = np.asarray(env.ghosts_location).copy()
+        self.initial_candies = np.asarray(env.initial_candies).copy()
+
+        num_candies = len(self.initial_candies)
+        self.encoder = StateEncoder(self.size, len(self.ghosts_location), num_candies, fixed_ghosts=True)
+        num_states = self.encoder.num_states
+        num_actions = env.action_space.n
+
+        # Shaping reward of the env (see step()), so the MDP's rewards are the ones the agent is trained on
+        self.shaping_scale = getattr(env, 'shaping_scale', 0.0)
+        self.shaping_gamma = getattr(env, 'shaping_gamma', 0.99)
+        door_distance = getattr(env, 'door_distance', None)
+
+        # Static part of the layout (door/ghosts) and which candy sits on each cell
+        occupancy, candy_index = build_occupancy_grid(
+            self.size, self.target_location, self.ghosts_location, self.initial_candies
+        )
+
+        # Every state at once: agent locations (S, 2) and collected candies (S, no candies)
+        states = np.arange(num_states)
+        agent, _, collected = self.encoder.decode(states)
+        candy_mask = states // self.encoder.strides[1]
+
+        self.next_states = np.empty((num_states, num_actions), dtype=np.int64)
+        self.rewards = np.empty((num_states, num_actions), dtype=np.float64)
+        self.terminals = np.empty((num_states, num_actions), dtype=bool)
+
+        for action in range(num_actions):
+            # Same move as step(), clipped to the grid
+            moved = np.clip(agent + env.action_to_direction[action], 0, self.size - 1)
+            cell = occupancy[moved[:, 0], moved[:, 1]]
+            terminated = (cell & DOOR) != 0
+
+            # A candy is picked up if there is one on the new cell that was not collected yet
+            candy = candy_index[moved[:, 0], moved[:, 1]]
+            has_candy = candy >= 0
+            bit = np.where(has_candy, 1 << np.maximum(candy, 0), 0)
+            picked = has_candy & ((candy_mask & bit) == 0) & ~terminated
+
+            reward = np.where(terminated, float(env.door_reward), 0.0)
+            reward -= env.ghost_penalty * (((cell & GHOST) != 0) & ~terminated)
+            reward += env.candy_reward * picked
+            reward -= env.step_penalty
+            if self.shaping_scale:
+                reward += self.shaping_scale * (
+                    door_distance[agent[:, 0], agent[:, 1]] - self.shaping_gamma * door_distance[moved[:, 0], moved[:, 1]]
+                )
+
+            next_mask = np.where(picked, candy_mask | bit, candy_mask)
+            self.next_states[:, action] = (moved[:, 0] * self.size + moved[:, 1]) + next_mask * self.encoder.strides[1]
+            self.rewards[:, action] = reward
+            self.terminals[:, action] = terminated
+
+        self.initial_states = np.arange(self.size * self.size, dtype=np.int64)
+
+    ##########################################################################
+    # Helpers
+    ##########################################################################
+
+    @property
+    def num_states(self):
+        return self.encoder.num_states
+
+    def state_index(self, env):
+        '''
+        Description:
+            Returns the index in this MDP of the env's current state (the env must have the same layout).
+        '''
+        return self.encoder.encode(env.agent_location, None, env.candies_location)
+
+    def transition_tensor(self):
+        '''
+        Description:
+            Returns the dense transition tensor P[s, a, s'] (one-hot as the env is deterministic).
+        '''
+        tensor = np.zeros(self.next_states.shape + (self.num_states,), dtype=np.float64)
+        np.put_along_axis(tensor, self.next_states[..., None], 1.0, axis=2)
+        return tensor
+
+    def observations(self):
+        '''
+        Description:
+            Returns the dict observation of every state (batched, leading axis of size no states), e.g. to
+            get the actions of a trained SB3 model for all states with model.predict().
+        '''
+        states = np.arange(self.num_states)
+        agent, _, collected = self.encoder.decode(states)
+        candies = np.where(collected[..., None], -1, self.initial_candies)
+        return {
+            'agent': agent.astype(np.int64),
+            'target': np.tile(self.target_location, (self.num_states, 1)),
+            'ghosts': np.tile(self.ghosts_location, (self.num_states, 1, 1)),
+            'candies': candies.astype(np.int64),
+        }
+
+    def q_values(self, values, gamma: float):
+        '''
+        Description:
+            One-step lookahead Q[s, a] = r + gamma * V[s'] (terminal transitions don't bootstrap).
+        '''
+        return self.rewards + gamma * np.where(self.terminals, 0.0, values[self.next_states])
+
+##########################################################################
+# Solvers
+##########################################################################
+
+def value_iteration(mdp: MansionMDP, gamma: float = 0.99, tol: float = 1e-8, max_iterations: int = 100_000):
+    '''
+    Description:
+        Vectorised value iteration, every sweep updates all states at once.
+
+    Inputs:
+        mdp: MansionMDP
+            The MDP to solve.
+
+        gamma: float
+            Discount factor, must be < 1 (the agent could otherwise wander forever).
+
+        tol: float
+            Stops once no value changes by more than `tol` in a sweep.
+
+    Outputs:
+        values: array
+            Optimal value of every state.
+
+        policy: array
+            Optimal (greedy) action of every state.
+    '''
+    values = np.zeros(mdp.num_states, dtype=np.float64)
+    for _ in range(max_iterations):
+        new_values = mdp.q_values(values, gamma).max(axis=1)
+        converged = np.max(np.abs(new_values - values)) < tol
+        values = new_values
+        if converged:
+            break
+
+    return values, mdp.q_values(values, gamma).argmax(axis=1)
+
+def evaluate_policy(mdp: MansionMDP, policy, gamma: float = 0.99):
+    '''
+    Description:
+        Exact value of a deterministic policy, solving the linear system (I - gamma P_pi) V = R_pi.
+
+    Inputs:
+        policy: array
+            Action for every state.
+
+    Outputs:
+        values: array
+            Value of every state under the policy.
+    '''
+    states = np.arange(mdp.num_states)
+    policy = np.asarray(policy, dtype=np.int64)
+
+    continues = ~mdp.terminals[states, policy]
+    system = np.eye(mdp.num_states)
+    np.add.at(system, (states[continues], mdp.next_states[states, policy][continues]), -gamma)
+
+    return np.linalg.solve(system, mdp.rewards[states, policy])
+
+def policy_iteration(mdp: MansionMDP, gamma: float = 0.99, max_iterations: int = 1000):
+    '''
+    Description:
+        Policy iteration with exact policy evaluation, usually converges in a handful of iterations.
+
+    Outputs:
+        values: array
+            Optimal value of every state.
+
+        policy: array
+            Optimal action of every state.
+    '''
+    policy = np.zeros(mdp.num_states, dtype=np.int64)
+    for _ in range(max_iterations):
+        values = evaluate_policy(mdp, policy, gamma)
+        q_values = mdp.q_values(values, gamma)
+
+        # Only switching action when strictly better, so the loop stops on ties
+        best = q_values.argmax(axis=1)
+        improves = q_values[np.arange(mdp.num_states), best] > q_values[np.arange(mdp.num_states), policy] + 1e-12
+        if not improves.any():
+            break
+        policy = np.where(improves, best, policy)
+
+    return values, policy
+
+def optimality_gap(mdp: MansionMDP, policy, gamma: float = 0.99):
+    '''
+    Description:
+        Scores a policy (e.g. a trained PPO/DQN model's actions for mdp.observations()) against the
+        optimum: the difference in expected value from the start states, averaged over where reset()
+        can place the agent.
+
+    Outputs:
+        gap: float
+            Optimal expected start value minus the policy's (0 for an optimal policy).
+    '''
+    optimal_values, _ = value_iteration(mdp, gamma)
+    policy_values = evaluate_policy(mdp, policy, gamma)
+
+    return float(optimal_values[mdp.initial_states].mean() - policy_values[mdp.initial_states].mean())
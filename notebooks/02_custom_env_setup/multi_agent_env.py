@@ -0,0 +1,390 @@
+import numpy as np
+import gymnasium as gym
+from gymnasium.utils import seeding
+
+from layout import generate_layout
+from distance_field import distance_field
+from occupancy import build_occupancy_grid, sample_free_cells, GHOST, CANDY, DOOR
+
+class Multi_Haunted_Mansion:
+
+    # Defining metadata (render_modes/render_fps, and the name PettingZoo tools expect)
+    metadata = {'render_modes' : ['human', 'rgb_array'], 'render_fps': 1, 'name': 'haunted_mansion_v0', 'is_parallelizable': True}
+
+    # Rewards/penalties, the same as Final_Haunted_Mansion
+    door_reward = 10
+    ghost_penalty = 15
+    candy_reward = 3
+
+    ##########################################################################
+    # Init
+    ##########################################################################
+
+    def __init__(self, num_agents: int = 4, size: int = 5, render_mode = None, step_penalty = 0.1,
+                 num_ghosts: int = 3, num_candies: int = 2, door: str = 'corner', layout_seed: int = 0,
+                 max_steps: int = None):
+        '''
+        Description:
+            Final mansion with a crowd of trick-or-treaters that all act at once, with the PettingZoo
+            parallel API (reset() and step() take and return dicts keyed by agent name, agents that
+            leave through the door are removed from `agents`). PettingZoo itself is not needed.
+
+            Every step is resolved for all agents together with array operations (moves, door exits,
+            ghost hits and candy contention), so its cost barely grows with the number of agents.
+            step_arrays() is the same step on (num_agents,) arrays without the per-agent dicts, for
+            large crowds.
+
+            Agents share cells freely. A candy goes to the agent that reaches it first, and to the agent
+            with the lowest index when several reach it in the same step.
+
+        Inputs:
+            num_agents: int
+                Number of trick-or-treaters, 4 for default
+
+            size: int
+                The grid size, 5 by 5 for default
+
+            render_mode: str
+                For visualisation, default None. 'human' opens a window, 'rgb_array' returns the frame
+
+            step_penalty: float
+                Penalty of every step of an agent that is still in the mansion, 0.1 for default
+
+            num_ghosts, num_candies, door, layout_seed:
+                Layout of the mansion (see layout.py), the classic 5x5 mansion for the defaults
+
+            max_steps: int
+                If set, every agent still in the mansion is truncated after this many steps
+
+        Outputs:
+            possible_agents: list
+                Names of all agents, 'trick_or_treater_<i>'.
+
+            agents: list
+                Names of the agents still in the mansion.
+
+            agents_location: array
+                Agent locations, shape (num_agents, 2), agents that left stay on the door.
+
+            active: array
+                Boolean array of shape (num_agents,), False for agents that left (or were truncated).
+        '''
+        self.size = size
+        self.render_mode = render_mode
+        self.step_penalty = step_penalty
+        self.max_steps = max_steps
+
+        self.possible_agents = [f'trick_or_treater_{i}' for i in range(num_agents)]
+        self.agent_index = {agent: i for i, agent in enumerate(self.possible_agents)}
+        self.agents = []
+
+        # Door, ghosts and candies from the layout generator, ghosts are placed in reset()
+        target, ghosts, candies = generate_layout(size, num_ghosts, num_candies, door, layout_seed)
+        self.target_location = target
+        self.ghosts_location = np.full((num_ghosts, 2), -1, dtype=np.int64)
+        self.initial_candies = candies
+        self.candies_location = candies.copy()
+
+        # Agents, ghosts, the door and the candies all need a cell of their own at reset
+        if num_agents + num_ghosts + num_candies + 1 > size * size:
+            raise ValueError(f'{num_agents} agents, {num_ghosts} ghosts and {num_candies} candies do not fit on a {size}x{size} grid')
+
+        self.agents_location = np.full((num_agents, 2), -1, dtype=np.int64)
+        self.active = np.zeros(num_agents, dtype=bool)
+        self.timestep = 0
+
+        # Occupancy grid of the static entities (door, ghosts, candies), agents are not in it
+        self.occupancy, self.candy_index = build_occupancy_grid(size, target, self.ghosts_location, self.candies_location)
+
+        # BFS distance to the door (see distance_field.py), for info['distance']
+        self.door_distance = distance_field(size, target[None])
+
+        # Right, down, left, up, as a table so a batch of actions is one fancy index
+        self.directions = np.array([[1, 0], [0, 1], [-1, 0], [0, -1]], dtype=np.int64)
+
+        # Observations of all agents in one (num_agents, obs size) buffer, laid out like the final env's
+        # 'flat' mode: [own x, own y, target x, target y, ghosts..., candies...]
+        self.ghost_columns = slice(4, 4 + 2 * num_ghosts)
+        self.candy_columns = slice(4 + 2 * num_ghosts, 4 + 2 * (num_ghosts + num_candies))
+        self.observations = np.zeros((num_agents, 4 + 2 * (num_ghosts + num_candies)), dtype=np.int64)
+        self.observations[:, 2:4] = target
+
+        low = np.zeros(self.observations.shape[1], dtype=np.int64)
+        low[self.candy_columns] = -1
+        self._observation_space = gym.spaces.Box(low, size - 1, dtype=np.int64)
+        self._action_space = gym.spaces.Discrete(4)
+
+        self.np_random = None
+        self.screen_size = 800
+        self.screen = None
+
+    def observation_space(self, agent):
+        '''
+        Description:
+            Observation space of an agent (the same for all): flat int64 Box, see __init__.
+        '''
+        return self._observation_space
+
+    def action_space(self, agent):
+        '''
+        Description:
+            Action space of an agent (the same for all): right, down, left, up.
+        '''
+        return self._action_space
+
+    @property
+    def num_agents(self):
+        return len(self.agents)
+
+    @property
+    def max_num_agents(self):
+        return len(self.possible_agents)
+
+    ##########################################################################
+    # Returning Observations and State
+    ##########################################################################
+
+    def _get_obs(self):
+        # Only the agents' own columns change every step, ghosts/candies are written when they change
+        self.observations[:, 0:2] = self.agents_location
+        return self.observations.copy()
+
+    def state(self):
+        '''
+        Description:
+            Global state: all agent locations, then the door, ghosts and candies.
+        '''
+        return np.concatenate((
+            self.agents_location.ravel(), self.target_location, self.ghosts_location.ravel(), self.candies_location.ravel()
+        ))
+
+    ##########################################################################
+    # Resetting the Environment
+    ##########################################################################
+
+    def reset_arrays(self, seed: int = None):
+        '''
+        Description:
+            Resets the mansion: candies are put back, agents are placed on distinct empty cells and the
+            ghosts on other empty cells, all with single draws (see sample_free_cells()).
+
+        Outputs:
+            observations: array
+                (num_agents, obs size) observations.
+        '''
+        if seed is not None or self.np_random is None:
+            self.np_random, _ = seeding.np_random(seed)
+
+        # Putting the candies back, and taking the last episode's ghosts off the grid
+        candies = self.initial_candies
+        self.candies_location = candies.copy()
+        self.occupancy[candies[:, 0], candies[:, 1]] |= CANDY
+        self.candy_index[candies[:, 0], candies[:, 1]] = np.arange(len(candies))
+        placed = self.ghosts_location[(self.ghosts_location >= 0).all(axis=1)]
+        self.occupancy[placed[:, 0], placed[:, 1]] &= ~GHOST
+
+        # Agents on cells without the door or a candy, then ghosts on cells without an agent either
+        self.agents_location = sample_free_cells(self.np_random, self.occupancy, len(self.possible_agents))
+        x, y = self.agents_location[:, 0], self.agents_location[:, 1]
+        self.occupancy[x, y] = GHOST
+        self.ghosts_location = sample_free_cells(self.np_random, self.occupancy, len(self.ghosts_location))
+        self.occupancy[x, y] = 0
+        self.occupancy[self.ghosts_location[:, 0], self.ghosts_location[:, 1]] |= GHOST
+
+        self.active[:] = True
+        self.timestep = 0
+        self.observations[:, self.ghost_columns] = self.ghosts_location.ravel()
+        self.observations[:, self.candy_columns] = self.candies_location.ravel()
+
+        return self._get_obs()
+
+    def reset(self, seed: int = None, options: dict = None):
+        '''
+        Description:
+            PettingZoo parallel reset.
+
+        Outputs:
+            observations: dict
+                Agent name -> observation.
+
+            infos: dict
+                Agent name -> {'distance': BFS distance to the door}.
+        '''
+        observations = self.reset_arrays(seed)
+        self.agents = self.possible_agents[:]
+
+        distance = self.door_distance[self.agents_location[:, 0], self.agents_location[:, 1]].astype(np.float64)
+        infos = {agent: {'distance': d} for agent, d in zip(self.agents, distance.tolist())}
+
+        if self.render_mode == 'human':
+            self.render()
+
+        return dict(zip(self.agents, observations)), infos
+
+    ##########################################################################
+    # Step
+    ##########################################################################
+
+    def step_arrays(self, actions):
+        '''
+        Description:
+            Steps every agent still in the mansion at once. The number of array operations doesn't
+            depend on the number of agents.
+
+        Inputs:
+            actions: array
+                (num_agents,) actions, the entries of agents that left are ignored.
+
+        Outputs:
+            observations: array
+                (num_agents, obs size) observations.
+
+            rewards: array
+                (num_agents,) rewards, 0 for agents that had already left.
+
+            terminated: array
+                (num_agents,) flags, True for the agents that reached the door in this step.
+
+            truncated: array
+                (num_agents,) flags, True for the agents still in the mansion when max_steps is reached.
+        '''
+        self.timestep += 1
+        active = self.active
+        size = self.size
+
+        # Moving all active agents at once, clipping to stay within the grid
+        moved = np.minimum(np.maximum(self.agents_location + self.directions[np.asarray(actions, dtype=np.int64)], 0), size - 1)
+        self.agents_location = np.where(active[:, None], moved, self.agents_location)
+        x, y = self.agents_location[:, 0], self.agents_location[:, 1]
+        cells = self.occupancy[x, y]
+
+        # Door exits, then ghost hits for the agents still inside
+        terminated = active & ((cells & DOOR) != 0)
+        inside = active & ~terminated
+        rewards = np.where(terminated, float(self.door_reward), 0.0)
+        rewards -= self.ghost_penalty * (inside & ((cells & GHOST) != 0))
+
+        # Candy contention: of the agents on a candy cell, the lowest index gets it (np.unique returns
+        # the first occurrence of each cell, and the agents are in index order)
+        grabbers = np.flatnonzero(inside & ((cells & CANDY) != 0))
+        if len(grabbers):
+            _, first = np.unique(x[grabbers] * size + y[grabbers], return_index=True)
+            winners = grabbers[first]
+            rewards[winners] += self.candy_reward
+
+            wx, wy = x[winners], y[winners]
+            self.candies_location[self.candy_index[wx, wy]] = -1
+            self.occupancy[wx, wy] &= ~CANDY
+            self.candy_index[wx, wy] = -1
+            self.observations[:, self.candy_columns] = self.candies_location.ravel()
+
+        rewards -= self.step_penalty * active
+
+        truncated = inside if self.max_steps is not None and self.timestep >= self.max_steps else np.zeros_like(inside)
+        self.active = inside & ~truncated
+
+        return self._get_obs(), rewards, terminated, truncated
+
+    def step(self, actions: dict):
+        '''
+        Description:
+            PettingZoo parallel step.
+
+        Inputs:
+            actions: dict
+                Agent name -> action, exactly one for each agent in `agents` (ValueError otherwise).
+
+        Outputs:
+            observations, rewards, terminations, truncations, infos: dict
+                Agent name -> value, for the agents that acted. Agents that terminated or were truncated
+                are removed from `agents`.
+        '''
+        if actions.keys() != set(self.agents):
+            missing = sorted(set(self.agents) - actions.keys())
+            unexpected = sorted(actions.keys() - set(self.agents))
+            raise ValueError(f'Expected one action per agent in `agents`, missing {missing}, unexpected {unexpected}')
+
+        # Agents that already left keep action 0, step_arrays() ignores them
+        action_array = np.zeros(len(self.possible_agents), dtype=np.int64)
+        action_array[[self.agent_index[agent] for agent in actions]] = list(actions.values())
+
+        acting = self.agents
+        index = [self.agent_index[agent] for agent in acting]
+        observations, rewards, terminated, truncated = self.step_arrays(action_array)
+
+        distance = self.door_distance[self.agents_location[index, 0], self.agents_location[index, 1]].astype(np.float64)
+        observations = dict(zip(acting, observations[index]))
+        rewards = dict(zip(acting, rewards[index].tolist()))
+        terminations = dict(zip(acting, terminated[index].tolist()))
+        truncations = dict(zip(acting, truncated[index].tolist()))
+        infos = {agent: {'distance': d} for agent, d in zip(acting, distance.tolist())}
+
+        self.agents = [agent for agent, i in zip(acting, index) if self.active[i]]
+
+        if self.render_mode == 'human':
+            self.render()
+
+        return observations, rewards, terminations, truncations, infos
+
+    ##########################################################################
+    # Render
+    ##########################################################################
+
+    def render(self):
+        '''
+        Description:
+            Draws the mansion with every agent still inside, in a window ('human') or as a (H, W, 3)
+            uint8 array ('rgb_array'), only redrawing the cells that changed (see SpriteCache.draw()).
+        '''
+        if self.render_mode is None:
+            gym.logger.warn("render() called without a render_mode, set render_mode='human' or 'rgb_array'")
+            return
+
+        import pygame
+        from sprite_cache import SpriteCache
+
+        if self.screen is None:
+            self.sprite_cache = SpriteCache()
+            if self.render_mode == 'human':
+                pygame.init()
+                self.screen = pygame.display.set_mode((self.screen_size, self.screen_size))
+                pygame.display.set_caption('Trick or ReTreat: Escape the Mansion!')
+            else:
+                self.screen = SpriteCache.make_surface(self.screen_size)
+
+        if self.render_mode == 'human':
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    self.close()
+                    return
+
+        self.sprite_cache.build(self.size, self.screen_size)
+        self.sprite_cache.build_static(tuple(self.target_location.tolist()))
+        cells = self.sprite_cache.cell_sprites((
+            ('ghost', self.ghosts_location),
+            ('candy', self.candies_location),
+            ('agent', self.agents_location[self.active]),
+        ))
+        rects = self.sprite_cache.draw(self.screen, cells)
+
+        if self.render_mode == 'rgb_array':
+            return self.sprite_cache.to_array(self.screen)
+
+        if rects is None:
+            pygame.display.update()
+        elif rects:
+            pygame.display.update(rects)
+
+    ##########################################################################
+    # Close
+    ##########################################################################
+
+    def close(self):
+        '''
+        Description:
+            Closes the pygame window, if one was opened.
+        '''
+        if self.render_mode == 'human' and self.screen is not None:
+            import pygame
+            pygame.quit()
+            self.screen = None
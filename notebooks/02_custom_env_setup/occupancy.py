@@ -0,0 +1,153 @@
+import numpy as np
+
+# Entity codes stored in the occupancy grid, bit flags so one cell can hold more than one entity
+EMPTY = 0
+GHOST = 1
+CANDY = 2
+DOOR = 4
+
+# Above this many cells, sample_free_cells() samples by rejection instead of listing the free cells
+SPARSE_SAMPLING_CELLS = 1 << 16
+
+##########################################################################
+# Building the Occupancy Grid
+##########################################################################
+
+def build_occupancy_grid(size: int, target, ghosts, candies):
+    '''
+    Description:
+        Builds a `size x size` grid of entity codes, indexed as grid[x, y] like the entity locations,
+        so step() can find what is on the agent's cell with one lookup instead of comparing the
+        agent against every ghost and candy.
+
+    Inputs:
+        size: int
+            The grid size.
+
+        target: array
+            Location of the door, shape (2,).
+
+        ghosts: array
+            Locations of the ghosts, shape (no ghosts, 2).
+
+        candies: array
+            Locations of the candies, shape (no candies, 2). Collected candies ([-1, -1]) are skipped.
+
+    Outputs:
+        grid: array
+            int8 array of shape (size, size) holding the OR of the codes of the entities on each cell.
+
+        candy_index: array
+            int64 array of shape (size, size) holding the index (in `candies`) of the candy on each
+            cell, -1 where there is no candy. Used to remove the right candy once it is collected.
+    '''
+    grid = np.zeros((size, size), dtype=np.int8)
+    candy_index = np.full((size, size), -1, dtype=np.int64)
+
+    grid[target[0], target[1]] |= DOOR
+
+    # Ghosts/candies that are off the grid (not placed yet or collected) have negative coordinates
+    ghosts = np.asarray(ghosts).reshape(-1, 2)
+    ghosts = ghosts[(ghosts >= 0).all(axis=1)]
+    grid[ghosts[:, 0], ghosts[:, 1]] |= GHOST
+
+    candies = np.asarray(candies).reshape(-1, 2)
+    on_grid = np.flatnonzero((candies >= 0).all(axis=1))
+    grid[candies[on_grid, 0], candies[on_grid, 1]] |= CANDY
+    candy_index[candies[on_grid, 0], candies[on_grid, 1]] = on_grid
+
+    return grid, candy_index
+
+##########################################################################
+# Sampling Free Cells
+##########################################################################
+
+def sample_free_cells(np_random, occupied, k: int):
+    '''
+    Description:
+        Picks `k` distinct cells that are not occupied, uniformly at random. Deterministic for a given
+        state of `np_random`.
+
+        Small grids (or a large share of the cells) use a single draw from the set of free cells (no
+        rejection loop, so the cost does not grow as the grid fills up). On large grids, where listing
+        the free cells would dominate, a few random cells are drawn and the occupied ones rejected, so
+        the cost depends on `k` and not on the number of cells.
+
+    Inputs:
+        np_random: np.random.Generator
+            The environment's random generator.
+
+        occupied: array
+            Grid of shape (size, size), non-zero (e.g. True or an occupancy code) for cells that can't be used.
+
+        k: int
+            Number of cells to pick.
+
+    Outputs:
+        cells: array
+            int64 array of shape (k, 2) with the [x, y] location of each picked cell.
+    '''
+    flat = occupied.ravel()
+    picked = None
+
+    if flat.size > SPARSE_SAMPLING_CELLS and k <= flat.size // 8:
+        picked = _sample_sparse(np_random, flat, k)
+
+    if picked is None:
+        free = np.flatnonzero(flat == 0)
+        if len(free) < k:
+            raise ValueError(f'Cannot place {k} entities, only {len(free)} free cells left on the grid')
+
+        picked = np_random.choice(free, size=k, replace=False)
+
+    # Flat index -> [x, y] location on the grid
+    cells = np.empty((k, 2), dtype=np.int64)
+    cells[:, 0], cells[:, 1] = np.divmod(picked, occupied.shape[1])
+
+    return cells
+
+def _sample_sparse(np_random, flat, k: int, max_rounds: int = 8):
+    '''
+    Description:
+        Bounded rejection sampling of k distinct free cells, for grids of more than SPARSE_SAMPLING_CELLS
+        cells where k is at most 1/8 of the cells (see sample_free_cells()).
+
+        Listing the free cells scans every cell of the grid, about 1 ms per million cells on every
+        reset(), even when only a handful of ghosts are placed. Here random cells are drawn instead and
+        the occupied ones dropped, so the cost depends on k, not on the grid size. Unlike the old
+        placement loop it can't run for long as the grid fills up: each round draws twice the
+        missing cells (plus 8), and after `max_rounds` rounds it gives up and returns None, so the
+        caller falls back to the exact draw over the listed free cells.
+
+        Each kept cell is uniform over the free cells and repeats are dropped in draw order, so the
+        result is a uniform sample without replacement, deterministic for a given state of `np_random`.
+
+    Inputs:
+        np_random: np.random.Generator
+            The environment's random generator.
+
+        flat: array
+            Flattened occupancy grid, non-zero for cells that can't be used.
+
+        k: int
+            Number of cells to pick.
+
+        max_rounds: int
+            Most rounds of draws before giving up, 8 for default.
+
+    Outputs:
+        picked: array
+            Flat indices of the k picked cells, or None if the grid was too full to finish in `max_rounds`.
+    '''
+    picked = np.empty(0, dtype=np.int64)
+    for _ in range(max_rounds):
+        candidates = np_random.integers(0, flat.size, size=2 * (k - len(picked)) + 8)
+        candidates = np.concatenate((picked, candidates[flat[candidates] == 0]))
+
+        # Dropping repeats but keeping the draw order, so the first k cells are a uniform sample
+        _, first = np.unique(candidates, return_index=True)
+        picked = candidates[np.sort(first)]
+        if len(picked) >= k:
+            return picked[:k]
+
+    return None
@@ -0,0 +1,425 @@
+import glob
+import json
+import os
+
+import numpy as np
+
+from vector_env import VectorHauntedMansion
+from mdp import MansionMDP, value_iteration
+from state_encoding import StateEncoder
+
+# Built-in behaviour policies (a loaded model, anything with an SB3-style predict(), can also be passed)
+BEHAVIOUR_POLICIES = ('random', 'optimal')
+
+# Most ghost layouts OptimalPolicy keeps a solved policy for (the least recently used is dropped first)
+MAX_CACHED_POLICIES = 256
+
+##########################################################################
+# Behaviour Policies
+##########################################################################
+
+class OptimalPolicy:
+
+    def __init__(self, envs: VectorHauntedMansion, gamma: float = 0.99, **env_kwargs):
+        '''
+        Description:
+            Value-iteration optimum for every sub-environment of a VectorHauntedMansion. The MDP depends
+            on the ghosts, so one is solved (and cached) per ghost layout: once for the intermediate env,
+            once per new layout drawn by reset() for the final env. At most MAX_CACHED_POLICIES layouts
+            are kept, so the cache stays bounded over a long generation run.
+
+        Inputs:
+            envs: VectorHauntedMansion
+                The batch of environments to act in ('intermediate' or 'final' variant).
+
+            gamma: float
+                Discount factor of the optimum.
+
+            env_kwargs: dict
+                Arguments the environments were built with (size, step_penalty, layout...).
+        '''
+        if envs.variant == 'simple':
+            raise ValueError("The 'optimal' policy needs the intermediate or final variant")
+
+        self.gamma = gamma
+
+        # Scalar env the MDPs are exported from, its ghosts are swapped for each layout
+        self.template = VectorHauntedMansion.variants[envs.variant](**dict(env_kwargs, render_mode=None))
+
+        # MDP states leave the (fixed) ghosts out, so all layouts share the same state indices
+        self.encoder = StateEncoder(
+            envs.size, envs.ghosts_location.shape[1], envs.candies_location.shape[1], fixed_ghosts=True
+        )
+
+        # Ghost layout (as bytes) -> optimal action of every MDP state, in least recently used order
+        self.policies = {}
+
+    def _policy(self, ghosts):
+        key = ghosts.tobytes()
+        policy = self.policies.pop(key, None)
+
+        if policy is None:
+            self.template.ghosts_location = ghosts.copy()
+            policy = value_iteration(MansionMDP(self.template), self.gamma)[1]
+
+            if len(self.policies) >= MAX_CACHED_POLICIES:
+                del self.policies[next(iter(self.policies))]
+
+        # (Re)inserted last, so the first key is always the least recently used
+        self.policies[key] = policy
+        return policy
+
+    def __call__(self, envs: VectorHauntedMansion):
+        '''
+        Description:
+            Returns the optimal action of every sub-environment, shape (num_envs,).
+        '''
+        layouts, inverse = np.unique(envs.ghosts_location.reshape(envs.num_envs, -1), axis=0, return_inverse=True)
+        policies = np.stack([self._policy(layout.reshape(-1, 2)) for layout in layouts])
+
+        states = self.encoder.encode(envs.agent_location, None, envs.candies_location)
+        return policies[inverse.reshape(-1), states]
+
+def make_behaviour_policy(policy, envs: VectorHauntedMansion, rng, epsilon: float = 0.0, **env_kwargs):
+    '''
+    Description:
+        Returns a function mapping (observations, envs) to a batch of actions.
+
+    Inputs:
+        policy: str or model
+            'random', 'optimal' (value iteration), or a loaded model with an SB3-style
+            predict(observation, deterministic=True) taking the batched observations.
+
+        envs: VectorHauntedMansion
+            The batch of environments to act in.
+
+        rng: np.random.Generator
+            Draws the random actions.
+
+        epsilon: float
+            Probability of replacing the policy's action with a random one (exploration for offline RL).
+    '''
+    num_actions = envs.single_action_space.n
+
+    if isinstance(policy, str):
+        if policy not in BEHAVIOUR_POLICIES:
+            raise ValueError(f'Unknown policy {policy!r}, expected one of {BEHAVIOUR_POLICIES} or a model')
+        if policy == 'random':
+            return lambda observations, envs: rng.integers(0, num_actions, size=envs.num_envs)
+        act = OptimalPolicy(envs, **env_kwargs)
+        greedy = lambda observations, envs: act(envs)
+    else:
+        greedy = lambda observations, envs: np.asarray(policy.predict(observations, deterministic=True)[0]).reshape(envs.num_envs)
+
+    def behaviour(observations, envs):
+        actions = greedy(observations, envs)
+        if epsilon > 0:
+            explore = rng.random(envs.num_envs) < epsilon
+            actions = np.where(explore, rng.integers(0, num_actions, size=envs.num_envs), actions)
+        return actions
+
+    return behaviour
+
+##########################################################################
+# Writing Shards
+##########################################################################
+
+def _observation_fields(observation_space, prefix: str):
+    # Name, shape and dtype of the stored arrays of one observation (one array per key for dict spaces)
+    if hasattr(observation_space, 'spaces'):
+        return [(f'{prefix}_{key}', space.shape, space.dtype) for key, space in observation_space.spaces.items()]
+    return [(prefix, observation_space.shape, observation_space.dtype)]
+
+def _split_observation(observation, prefix: str):
+    # Batched observation -> {field name: array}
+    if isinstance(observation, dict):
+        return {f'{prefix}_{key}': value for key, value in observation.items()}
+    return {prefix: observation}
+
+class ShardWriter:
+
+    def __init__(self, path: str, fields, chunk_size: int):
+        '''
+        Description:
+            Collects transitions in preallocated arrays of `chunk_size` rows and writes every full chunk
+            as a shard directory of `.npy` files (one per field), so memory use stays at one chunk.
+
+        Inputs:
+            path: str
+                Dataset directory.
+
+            fields: list
+                (name, shape, dtype) of every stored array.
+
+            chunk_size: int
+                Transitions per shard.
+        '''
+        self.path = path
+        self.chunk_size = chunk_size
+        self.buffers = {name: np.empty((chunk_size,) + tuple(shape), dtype=dtype) for name, shape, dtype in fields}
+        self.num_rows = 0
+        self.num_shards = 0
+        self.num_transitions = 0
+
+    def add(self, batch: dict):
+        '''
+        Description:
+            Appends a batch of transitions (every field with the same leading size), writing full chunks.
+        '''
+        size = len(next(iter(batch.values())))
+        start = 0
+        while start < size:
+            count = min(size - start, self.chunk_size - self.num_rows)
+            for name, buffer in self.buffers.items():
+                buffer[self.num_rows:self.num_rows + count] = batch[name][start:start + count]
+            self.num_rows += count
+            start += count
+            if self.num_rows == self.chunk_size:
+                self.flush()
+
+    def flush(self):
+        '''
+        Description:
+            Writes the collected rows (if any) as the next shard.
+        '''
+        if not self.num_rows:
+            return
+
+        shard = os.path.join(self.path, f'shard_{self.num_shards:05d}')
+        os.makedirs(shard, exist_ok=True)
+        for name, buffer in self.buffers.items():
+            np.save(os.path.join(shard, f'{name}.npy'), buffer[:self.num_rows])
+
+        self.num_shards += 1
+        self.num_transitions += self.num_rows
+        self.num_rows = 0
+
+##########################################################################
+# Generating a Dataset
+##########################################################################
+
+def generate_dataset(path: str, num_transitions: int, policy = 'random', variant: str = 'final', num_envs: int = 64,
+                     chunk_size: int = 100_000, epsilon: float = 0.0, seed: int = None, **env_kwargs):
+    '''
+    Description:
+        Streams (obs, action, reward, next_obs, terminated, truncated) transitions from a behaviour policy
+        on a VectorHauntedMansion to `.npy` shards in `path`, writing a shard every `chunk_size`
+        transitions so the dataset is never held in RAM. For finished episodes next_obs is the last
+        observation of the episode (not the autoreset one).
+
+    Inputs:
+        path: str
+            Dataset directory (created if needed).
+
+        num_transitions: int
+            Number of transitions to write.
+
+        policy: str or model
+            'random', 'optimal' (value iteration) or a loaded model (see make_behaviour_policy()).
+
+        variant: str
+            'simple', 'intermediate' or 'final' (default).
+
+        num_envs: int
+            Environments stepped in parallel.
+
+        chunk_size: int
+            Transitions per shard.
+
+        epsilon: float
+            Probability of a random action instead of the policy's.
+
+        seed: int
+            Seeds the environments and the random actions.
+
+        env_kwargs: dict
+            Passed to the environment (e.g. size, obs_mode='flat' to store one array per observation).
+
+    Outputs:
+        metadata: dict
+            Description of the dataset, also written to `metadata.json`.
+    '''
+    rng = np.random.default_rng(seed)
+    envs = VectorHauntedMansion(num_envs, variant=variant, copy=False, **dict(env_kwargs))
+    behaviour = make_behaviour_policy(policy, envs, rng, epsilon, **env_kwargs)
+
+    single_space = envs.single_observation_space
+    fields = (
+        _observation_fields(single_space, 'obs')
+        + [('action', (), np.int8), ('reward', (), np.float32)]
+        + _observation_fields(single_space, 'next_obs')
+        + [('terminated', (), np.bool_), ('truncated', (), np.bool_)]
+    )
+
+    os.makedirs(path, exist_ok=True)
+    writer = ShardWriter(path, fields, chunk_size)
+
+    observation, _ = envs.reset(seed=seed)
+    remaining = num_transitions
+    while remaining > 0:
+        actions = behaviour(observation, envs)
+
+        # Copying the observations before the step changes the (uncopied) env buffers
+        batch = {name: value.copy() for name, value in _split_observation(observation, 'obs').items()}
+        next_observation, rewards, terminated, truncated, infos = envs.step(actions)
+
+        batch.update(_split_observation(next_observation, 'next_obs'))
+        done = np.flatnonzero(terminated | truncated)
+        if len(done):
+            # Finished sub-environments were reset, their real next observation is in final_observation
+            batch = {name: value.copy() if name.startswith('next_obs') else value for name, value in batch.items()}
+            for i in done:
+                final = _split_observation(infos['final_observation'][i], 'next_obs')
+                for name, value in final.items():
+                    batch[name][i] = value
+
+        batch.update({'action': actions, 'reward': rewards, 'terminated': terminated, 'truncated': truncated})
+
+        count = min(remaining, num_envs)
+        writer.add({name: value[:count] for name, value in batch.items()})
+        remaining -= count
+        observation = next_observation
+
+    writer.flush()
+    envs.close()
+
+    metadata = {
+        'num_transitions': writer.num_transitions,
+        'num_shards': writer.num_shards,
+        'chunk_size': chunk_size,
+        'policy': policy if isinstance(policy, str) else type(policy).__name__,
+        'epsilon': epsilon,
+        'variant': variant,
+        'env_kwargs': {key: value for key, value in env_kwargs.items() if isinstance(value, (int, float, str, type(None)))},
+        'fields': {name: [list(shape), np.dtype(dtype).name] for name, shape, dtype in fields},
+    }
+    with open(os.path.join(path, 'metadata.json'), 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+    return metadata
+
+##########################################################################
+# Loading a Dataset
+##########################################################################
+
+class OfflineDataset:
+
+    def __init__(self, path: str):
+        '''
+        Description:
+            Memory-maps the shards written by generate_dataset(), nothing is read until it is used.
+
+        Inputs:
+            path: str
+                Dataset directory.
+
+        Outputs:
+            shards: list
+                One dict per shard of field name -> memory-mapped array.
+
+            offsets: array
+                Index of the first transition of every shard (plus the total at the end).
+        '''
+        self.path = path
+        self.shards = []
+        for shard in sorted(glob.glob(os.path.join(path, 'shard_*'))):
+            files = sorted(glob.glob(os.path.join(shard, '*.npy')))
+            self.shards.append({os.path.basename(f)[:-4]: np.load(f, mmap_mode='r') for f in files})
+
+        if not self.shards:
+            raise FileNotFoundError(f'No shards found in {path}')
+
+        sizes = [len(shard['action']) for shard in self.shards]
+        self.offsets = np.concatenate(([0], np.cumsum(sizes))).astype(np.int64)
+        self.fields = list(self.shards[0])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def sample(self, batch_size: int, rng = None):
+        '''
+        Description:
+            Returns `batch_size` transitions drawn uniformly (with replacement) from all shards, as a
+            dict of field name -> array. Only the sampled rows are read from disk.
+        '''
+        rng = rng if rng is not None else np.random.default_rng()
+        indices = np.sort(rng.integers(0, len(self), size=batch_size))
+        shard_ids = np.searchsorted(self.offsets, indices, side='right') - 1
+
+        batch = {name: [] for name in self.fields}
+        for shard_id in np.unique(shard_ids):
+            rows = indices[shard_ids == shard_id] - self.offsets[shard_id]
+            for name in self.fields:
+                batch[name].append(self.shards[shard_id][name][rows])
+
+        return {name: np.concatenate(parts) for name, parts in batch.items()}
+
+    def fill_replay_buffer(self, buffer, limit: int = None):
+        '''
+        Description:
+            Copies the dataset (or its first `limit` transitions) into a Stable Baselines 3 ReplayBuffer
+            or DictReplayBuffer, shard by shard straight into the buffer's arrays, e.g. to warm-start
+            DQN with `model.replay_buffer`. Transitions beyond the buffer size overwrite the oldest ones.
+            The buffer adds whole rows of n_envs transitions, so the number copied is rounded down to a
+            multiple of n_envs (the last few transitions are left out) and the next `add()` starts on a
+            fresh row instead of overwriting copied ones.
+
+        Inputs:
+            buffer: ReplayBuffer or DictReplayBuffer
+                The buffer to fill (with optimize_memory_usage=False), its observations must match the
+                dataset's (same env and obs_mode).
+
+            limit: int
+                Maximum number of transitions to copy, the whole dataset by default (rounded down to a
+                multiple of n_envs).
+        '''
+        if getattr(buffer, 'next_observations', None) is None:
+            raise ValueError('The replay buffer must keep next_observations (optimize_memory_usage=False)')
+
+        # Buffer arrays are (buffer_size, n_envs, ...), filled as one flat sequence of transitions
+        capacity = buffer.buffer_size * buffer.n_envs
+
+        def flat(array):
+            return array.reshape((capacity,) + array.shape[2:])
+
+        def targets(name):
+            # Buffer array(s) for a dataset field
+            prefix = 'obs' if name.startswith('obs') else 'next_obs'
+            observations = buffer.observations if prefix == 'obs' else buffer.next_observations
+            return flat(observations[name[len(prefix) + 1:]]) if isinstance(observations, dict) else flat(observations)
+
+        observation_fields = [name for name in self.fields if name.startswith(('obs', 'next_obs'))]
+        position = 0
+        total = len(self) if limit is None else min(limit, len(self))
+        total -= total % buffer.n_envs
+
+        for shard_id, shard in enumerate(self.shards):
+            start = int(self.offsets[shard_id])
+            if start >= total:
+                break
+            count = min(len(shard['action']), total - start)
+
+            # Copying the shard in pieces that don't wrap around the end of the buffer
+            done = 0
+            while done < count:
+                piece = min(count - done, capacity - position)
+                rows = slice(done, done + piece)
+                dest = slice(position, position + piece)
+
+                for name in observation_fields:
+                    target = targets(name)
+                    target[dest] = shard[name][rows].reshape((piece,) + target.shape[1:])
+                flat(buffer.actions)[dest] = shard['action'][rows].reshape((piece,) + buffer.actions.shape[2:])
+                flat(buffer.rewards)[dest] = shard['reward'][rows]
+                flat(buffer.dones)[dest] = shard['terminated'][rows] | shard['truncated'][rows]
+                if hasattr(buffer, 'timeouts'):
+                    flat(buffer.timeouts)[dest] = shard['truncated'][rows]
+
+                done += piece
+                position = (position + piece) % capacity
+                if position == 0:
+                    buffer.full = True
+
+        # The buffer's position counts rows of n_envs transitions (position is a multiple of n_envs)
+        buffer.pos = position // buffer.n_envs
+        return buffer
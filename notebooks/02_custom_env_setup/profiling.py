@@ -0,0 +1,126 @@
+import functools
+import time
+
+class PhaseProfiler:
+
+    # Env methods that are timed
+    phases = ('reset', 'step', '_get_obs', '_get_info', 'render')
+
+    ##########################################################################
+    # Init
+    ##########################################################################
+
+    def __init__(self):
+        '''
+        Description:
+            Per-phase call counters and perf_counter_ns timers for an environment. Timed wrappers are
+            bound over the env's methods by instrument(), so an env built without profiling runs its
+            plain methods and pays nothing.
+
+            Times are inclusive: step() and reset() include the _get_obs()/_get_info() calls they make.
+
+        Outputs:
+            calls: dict
+                Phase -> number of calls.
+
+            total_ns: dict
+                Phase -> total time spent, in nanoseconds.
+
+            last_ns: dict
+                Phase -> duration of the most recent call, in nanoseconds.
+        '''
+        self.calls = dict.fromkeys(self.phases, 0)
+        self.total_ns = dict.fromkeys(self.phases, 0)
+        self.last_ns = dict.fromkeys(self.phases, 0)
+
+    def reset_stats(self):
+        '''
+        Description:
+            Sets all counters and timers back to zero. The dicts are zeroed in place, the timed wrappers
+            keep references to them.
+        '''
+        for counters in (self.calls, self.total_ns, self.last_ns):
+            counters.update(dict.fromkeys(self.phases, 0))
+
+    ##########################################################################
+    # Timing
+    ##########################################################################
+
+    def wrap(self, phase: str, method):
+        '''
+        Description:
+            Returns a wrapper of a bound method that times every call under `phase`.
+        '''
+        calls, total_ns, last_ns = self.calls, self.total_ns, self.last_ns
+        perf_counter_ns = time.perf_counter_ns
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = perf_counter_ns()
+            result = method(*args, **kwargs)
+            elapsed = perf_counter_ns() - start
+            calls[phase] += 1
+            total_ns[phase] += elapsed
+            last_ns[phase] = elapsed
+            return result
+
+        return timed
+
+    def stats(self):
+        '''
+        Description:
+            Returns the profile so far.
+
+        Outputs:
+            stats: dict
+                Phase -> {'calls', 'total_ms', 'mean_us'} for every phase that was called.
+        '''
+        return {
+            phase: {
+                'calls': self.calls[phase],
+                'total_ms': self.total_ns[phase] / 1e6,
+                'mean_us': self.total_ns[phase] / self.calls[phase] / 1e3,
+            }
+            for phase in self.phases if self.calls[phase]
+        }
+
+##########################################################################
+# Instrumenting an Environment
+##########################################################################
+
+def instrument(env, add_to_info: bool = False):
+    '''
+    Description:
+        Binds timed wrappers over the env's reset/step/_get_obs/_get_info/render methods (as instance
+        attributes, the class is not changed) and returns the profiler holding the timings.
+
+    Inputs:
+        env: gym.Env
+            The environment to profile.
+
+        add_to_info: bool
+            If True, step() and reset() also put the durations of their latest calls (in nanoseconds)
+            in info['profile_ns'].
+
+    Outputs:
+        profiler: PhaseProfiler
+            The timings, also available through env.profile_stats().
+    '''
+    profiler = PhaseProfiler()
+
+    for phase in profiler.phases:
+        setattr(env, phase, profiler.wrap(phase, getattr(env, phase)))
+
+    if add_to_info:
+        for phase in ('reset', 'step'):
+            timed = getattr(env, phase)
+
+            def with_info(*args, _timed=timed, **kwargs):
+                result = _timed(*args, **kwargs)
+                # info is the last item returned by both reset() and step()
+                result[-1]['profile_ns'] = dict(profiler.last_ns)
+                return result
+
+            setattr(env, phase, functools.wraps(timed)(with_info))
+
+    return profiler
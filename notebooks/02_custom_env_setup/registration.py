@@ -0,0 +1,113 @@
+import gymnasium as gym
+
+# Scalar entry point of each variant, as 'module:Class' strings so nothing is imported until gym.make()
+ENTRY_POINTS = {
+    'simple': 'simple_env:Simple_Haunted_Mansion',
+    'intermediate': 'intermediate_env:Intm_Haunted_Mansion',
+    'final': 'final_env:Final_Haunted_Mansion',
+}
+
+# Registered ids -> (variant, env kwargs), the three mansions plus a few configured variants
+ENV_IDS = {
+    'HauntedMansion-Simple-v0': ('simple', {}),
+    'HauntedMansion-Intermediate-v0': ('intermediate', {}),
+    'HauntedMansion-Final-v0': ('final', {}),
+    'HauntedMansion-Final-Large-v0': ('final', {'size': 20, 'num_ghosts': 24, 'num_candies': 8, 'door': 'random'}),
+    'HauntedMansion-Final-Discrete-v0': ('final', {'obs_mode': 'discrete'}),
+    'HauntedMansion-Final-Chase-v0': ('final', {'ghost_policy': 'chase'}),
+}
+
+##########################################################################
+# Vector Entry Points
+##########################################################################
+
+def make_vector_env(num_envs: int = 1, variant: str = 'final', max_episode_steps: int = None, **env_kwargs):
+    '''
+    Description:
+        Builds a natively batched Haunted Mansion: VectorHauntedMansion (one vectorised NumPy update for
+        all sub-environments), or SharedMemoryVectorEnv for moving ghosts, which the vectorised engine
+        doesn't support. The modules are only imported here.
+
+    Inputs:
+        num_envs: int
+            Number of sub-environments.
+
+        variant: str
+            'simple', 'intermediate' or 'final' (default).
+
+        max_episode_steps: int
+            Passed by gym.make_vec() from the spec, the batched envs have no time limit so it must be None.
+
+        env_kwargs: dict
+            Passed to the scalar environment class (e.g. size, obs_mode).
+    '''
+    if max_episode_steps is not None:
+        raise ValueError('The batched Haunted Mansions have no time limit, register them with max_episode_steps=None')
+
+    if env_kwargs.get('ghost_policy') is not None:
+        from shared_memory_env import SharedMemoryVectorEnv
+        return SharedMemoryVectorEnv(num_envs, variant, **env_kwargs)
+
+    from vector_env import VectorHauntedMansion
+    return VectorHauntedMansion(num_envs, variant, **env_kwargs)
+
+def _vector_entry_point(variant: str, env_kwargs: dict):
+    # Vector creator of one registered id, the spec's kwargs are bound here as gym.make_vec() doesn't
+    # pass them on in 'custom' mode (arguments given to the creator take precedence)
+    def create(num_envs: int = 1, **kwargs):
+        return make_vector_env(num_envs, variant, **{**env_kwargs, **kwargs})
+
+    return create
+
+##########################################################################
+# Registering
+##########################################################################
+
+def register_env(env_id: str, variant: str = 'final', **env_kwargs):
+    '''
+    Description:
+        Registers a configured Haunted Mansion with gymnasium, with a scalar entry point for gym.make()
+        and a vector entry point for gym.make_vec(..., vectorization_mode='custom'). Ids that are already
+        registered are left as they are.
+
+    Inputs:
+        env_id: str
+            Gymnasium id, e.g. 'HauntedMansion-Final-12x12-v0'.
+
+        variant: str
+            'simple', 'intermediate' or 'final' (default).
+
+        env_kwargs: dict
+            Default arguments of the environment class for this id (e.g. size, num_ghosts).
+    '''
+    if variant not in ENTRY_POINTS:
+        raise ValueError(f'Unknown variant {variant!r}, expected one of {list(ENTRY_POINTS)}')
+
+    if env_id in gym.envs.registry:
+        return
+
+    gym.register(
+        id=env_id,
+        entry_point=ENTRY_POINTS[variant],
+        vector_entry_point=_vector_entry_point(variant, env_kwargs),
+        kwargs=env_kwargs,
+    )
+
+def register_envs():
+    '''
+    Description:
+        Registers every id of ENV_IDS (called when this module is imported).
+    '''
+    for env_id, (variant, env_kwargs) in ENV_IDS.items():
+        register_env(env_id, variant, **env_kwargs)
+
+def make_vec(env_id: str, num_envs: int = 1, **kwargs):
+    '''
+    Description:
+        gym.make_vec() with the natively batched implementation: vectorization_mode='custom', and the
+        env kwargs forwarded (gymnasium 0.29 drops them in 'custom' mode unless they are passed as
+        vector_kwargs).
+    '''
+    return gym.make_vec(env_id, num_envs=num_envs, vectorization_mode='custom', vector_kwargs=kwargs)
+
+register_envs()
@@ -0,0 +1,381 @@
+import multiprocessing as mp
+import numbers
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+import gymnasium as gym
+
+from vector_env import VectorHauntedMansion
+from action_mask import batched_action_masks
+
+##########################################################################
+# Shared Buffers
+##########################################################################
+
+def _buffer_layout(num_envs: int, num_ghosts: int, num_candies: int):
+    '''
+    Description:
+        Returns the arrays kept in shared memory as a list of (name, shape, dtype, offset) and the
+        total number of bytes. All arrays live in one shared memory block, 8-byte aligned.
+    '''
+    fields = [
+        ('actions', (num_envs,), np.int64),
+        ('agent', (num_envs, 2), np.int64),
+        ('target', (num_envs, 2), np.int64),
+        ('ghosts', (num_envs, num_ghosts, 2), np.int64),
+        ('candies', (num_envs, num_candies, 2), np.int64),
+        ('reward', (num_envs,), np.float64),
+        ('terminated', (num_envs,), np.bool_),
+        # Last state of the episodes that ended in the latest step (before the autoreset)
+        ('final_agent', (num_envs, 2), np.int64),
+        ('final_ghosts', (num_envs, num_ghosts, 2), np.int64),
+        ('final_candies', (num_envs, num_candies, 2), np.int64),
+    ]
+
+    layout, offset = [], 0
+    for name, shape, dtype in fields:
+        layout.append((name, shape, dtype, offset))
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        offset += -(-nbytes // 8) * 8
+
+    return layout, max(offset, 8)
+
+def _buffer_views(shm, layout):
+    # NumPy arrays backed directly by the shared memory block (no copies)
+    return {name: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset) for name, shape, dtype, offset in layout}
+
+##########################################################################
+# Worker Process
+##########################################################################
+
+def _write_state(buffers, i, env, prefix: str = ''):
+    # Copies the state of scalar env i into the shared buffers (or into the final_* buffers)
+    buffers[prefix + 'agent'][i] = env.agent_location
+    if buffers['ghosts'].shape[1]:
+        buffers[prefix + 'ghosts'][i] = env.ghosts_location
+    if buffers['candies'].shape[1]:
+        buffers[prefix + 'candies'][i] = env.candies_location
+
+def _worker(remote, parent_remote, shm_name: str, layout, variant: str, env_kwargs: dict, start: int, stop: int):
+    '''
+    Description:
+        Worker loop hosting the scalar envs [start, stop). Commands come through the pipe, one per
+        batch, and all data goes through the shared buffers: actions are read from them, states,
+        rewards and terminations are written to them. Finished episodes are reset in place.
+    '''
+    parent_remote.close()
+
+    # Workers share the parent's resource tracker, the parent unlinks the block in close()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    buffers = _buffer_views(shm, layout)
+
+    envs = [VectorHauntedMansion.variants[variant](**env_kwargs) for _ in range(start, stop)]
+    actions, reward, terminated = buffers['actions'], buffers['reward'], buffers['terminated']
+
+    try:
+        while True:
+            command, data = remote.recv()
+            try:
+                if command == 'step':
+                    for i, env in enumerate(envs, start):
+                        _, reward[i], terminated[i], _, _ = env.step(int(actions[i]))
+                        if terminated[i]:
+                            _write_state(buffers, i, env, 'final_')
+                            env.reset()
+                        _write_state(buffers, i, env)
+                    remote.send(None)
+
+                elif command == 'reset':
+                    for i, env in enumerate(envs, start):
+                        env.reset(seed=data[i - start])
+                        buffers['target'][i] = env.target_location
+                        _write_state(buffers, i, env)
+                    remote.send(None)
+
+                elif command == 'close':
+                    break
+
+                else:
+                    raise ValueError(f'Unknown command {command!r}')
+
+            except Exception:
+                remote.send(traceback.format_exc())
+
+    except (KeyboardInterrupt, EOFError):
+        pass
+
+    finally:
+        for env in envs:
+            env.close()
+        del actions, reward, terminated, buffers
+        shm.close()
+        remote.close()
+
+class SharedMemoryVectorEnv(gym.vector.VectorEnv):
+
+    # Defining metadata (no rendering, sub-environments autoreset)
+    metadata = {'render_modes' : [], 'autoreset': True}
+
+    ##########################################################################
+    # Init
+    ##########################################################################
+
+    def __init__(self, num_envs: int = 8, variant: str = 'final', num_workers: int = None, copy: bool = True,
+                 context: str = None, **env_kwargs):
+        '''
+        Description:
+            Runs `num_envs` scalar Haunted Mansions in a pool of worker processes. Unlike SB3's
+            SubprocVecEnv nothing is pickled per step: workers write the agent/ghost/candy locations,
+            rewards and terminations straight into one `multiprocessing.shared_memory` block, which the
+            parent reads as NumPy arrays. The only per-batch messages are one tiny command and one
+            acknowledgement per worker.
+
+            Each worker steps a contiguous slice of the environments, so CPU-heavy variants (large grids,
+            moving ghosts) scale with the number of cores. Sub-environment i reset with seed s behaves
+            exactly as `env_class().reset(seed=s)`, the same as VectorHauntedMansion.
+
+        Inputs:
+            num_envs: int
+                Number of environments, 8 for default.
+
+            variant: str
+                'simple', 'intermediate' or 'final' (default).
+
+            num_workers: int
+                Number of worker processes, defaults to min(num_envs, cpu count).
+
+            copy: bool
+                If True (default) observations, rewards and flags are returned as copies, otherwise as
+                views of the shared buffers (no copies), which change on the next step.
+
+            context: str
+                Multiprocessing start method ('fork', 'spawn', 'forkserver'), the platform default if None.
+
+            env_kwargs: dict
+                Passed to the scalar environment class (e.g. size, step_penalty).
+        '''
+        if variant not in VectorHauntedMansion.variants:
+            raise ValueError(f'Unknown variant {variant!r}, expected one of {list(VectorHauntedMansion.variants)}')
+
+        if variant == 'simple' and env_kwargs.get('obs_mode', 'dict') != 'dict':
+            raise ValueError(f"The simple variant only has 'dict' observations, got obs_mode={env_kwargs['obs_mode']!r}")
+
+        # Template scalar env, only used to read the spaces and the number of ghosts/candies
+        env_kwargs['render_mode'] = None
+        template = VectorHauntedMansion.variants[variant](**env_kwargs)
+        super().__init__(num_envs, template.observation_space, template.action_space)
+
+        self.variant = variant
+        self.copy = copy
+        self.obs_mode = getattr(template, 'obs_mode', 'dict')
+        self.state_encoder = getattr(template, 'state_encoder', None)
+        self.door_distance = template.door_distance
+        self.directions = np.array([template.action_to_direction[a] for a in range(4)], dtype=np.int64)
+        self.boundary_masks = template.boundary_masks
+        self.action_mask = template.action_mask
+        num_ghosts = len(getattr(template, 'ghosts_location', ()))
+        num_candies = len(getattr(template, 'candies_location', ()))
+        template.close()
+
+        # One shared memory block holding every buffer
+        layout, nbytes = _buffer_layout(num_envs, num_ghosts, num_candies)
+        self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        self.buffers = _buffer_views(self.shm, layout)
+
+        # Contiguous slices of environments per worker
+        num_workers = min(num_envs, num_workers or mp.cpu_count())
+        bounds = np.linspace(0, num_envs, num_workers + 1).astype(int)
+        self.slices = list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+        ctx = mp.get_context(context)
+        self.remotes, self.processes = [], []
+        for start, stop in self.slices:
+            remote, work_remote = ctx.Pipe()
+            process = ctx.Process(
+                target=_worker,
+                args=(work_remote, remote, self.shm.name, layout, variant, env_kwargs, start, stop),
+                daemon=True,
+            )
+            process.start()
+            work_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+
+    ##########################################################################
+    # Talking to the Workers
+    ##########################################################################
+
+    def _send(self, command: str, data_per_worker=None):
+        # One command per worker (all workers then run in parallel)
+        for k, remote in enumerate(self.remotes):
+            remote.send((command, None if data_per_worker is None else data_per_worker[k]))
+
+    def _wait(self):
+        # Waiting for every worker to finish the batch, re-raising the first error
+        errors = [error for error in (remote.recv() for remote in self.remotes) if error is not None]
+        if errors:
+            raise RuntimeError('Worker failed:\n' + errors[0])
+
+    ##########################################################################
+    # Returning Observations and Info
+    ##########################################################################
+
+    def _observation(self, agent, target, ghosts, candies):
+        # Batched observation built from (views of) the shared buffers
+        if self.obs_mode == 'discrete':
+            return self.state_encoder.encode(agent, ghosts, candies)
+
+        if self.obs_mode == 'flat':
+            num_envs = len(agent)
+            return np.concatenate((agent, target, ghosts.reshape(num_envs, -1), candies.reshape(num_envs, -1)), axis=1)
+
+        observation = {'agent': agent, 'target': target}
+        if self.variant != 'simple':
+            observation['ghosts'] = ghosts
+            observation['candies'] = candies
+
+        if self.copy:
+            observation = {key: value.copy() for key, value in observation.items()}
+
+        return observation
+
+    def _get_obs(self):
+        '''
+        Description:
+            Returns the batched observations (see VectorHauntedMansion._get_obs()).
+        '''
+        buffers = self.buffers
+        return self._observation(buffers['agent'], buffers['target'], buffers['ghosts'], buffers['candies'])
+
+    def _get_info(self):
+        '''
+        Description:
+            Returns the batched info, distance between each agent and its door (BFS distance field) and
+            the valid actions if action_mask is set.
+        '''
+        agent = self.buffers['agent']
+        distance = self.door_distance[agent[:, 0], agent[:, 1]].astype(np.float64)
+        info = {'distance': distance, '_distance': np.ones(self.num_envs, dtype=bool)}
+
+        if self.action_mask is not None:
+            info['action_mask'] = self.action_masks()
+            info['_action_mask'] = info['_distance']
+
+        return info
+
+    def action_masks(self, agent=None, ghosts=None):
+        '''
+        Description:
+            Returns the valid actions of every sub-environment with one batched lookup (or of the given
+            agent/ghost locations), see VectorHauntedMansion.action_masks().
+        '''
+        if agent is None:
+            agent, ghosts = self.buffers['agent'], self.buffers['ghosts']
+        return batched_action_masks(self.boundary_masks, agent, self.directions, ghosts if self.action_mask == 'hazard' else None)
+
+    ##########################################################################
+    # Reset and Step
+    ##########################################################################
+
+    def reset_wait(self, seed=None, options: dict = None):
+        '''
+        Description:
+            Resets all sub-environments.
+
+        Inputs:
+            seed: int or list
+                An int seeds sub-environment i with `seed + i`, a list gives one seed per sub-environment.
+        '''
+        # NumPy integers count as ints, and every seed is passed on as a Python int (see seeding.np_random)
+        if seed is None or isinstance(seed, numbers.Integral):
+            seeds = [None if seed is None else int(seed) + i for i in range(self.num_envs)]
+        else:
+            seeds = [None if env_seed is None else int(env_seed) for env_seed in seed]
+            if len(seeds) != self.num_envs:
+                raise ValueError(f'Expected {self.num_envs} seeds, got {len(seeds)}')
+
+        self._send('reset', [seeds[start:stop] for start, stop in self.slices])
+        self._wait()
+
+        return self._get_obs(), self._get_info()
+
+    def step_async(self, actions):
+        '''
+        Description:
+            Writes the batch of actions into the shared buffer and starts stepping the workers.
+        '''
+        self.buffers['actions'][:] = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+        self._send('step')
+
+    def step_wait(self):
+        '''
+        Description:
+            Waits for every worker to step its environments (finished ones are reset by the workers) and
+            returns the batch, see VectorHauntedMansion.step_wait().
+        '''
+        self._wait()
+
+        buffers = self.buffers
+        reward, terminated = buffers['reward'], buffers['terminated']
+        if self.copy:
+            reward, terminated = reward.copy(), terminated.copy()
+        truncated = np.zeros(self.num_envs, dtype=bool)
+
+        infos = self._get_info()
+
+        done = np.flatnonzero(terminated)
+        if len(done):
+            final = self._observation(
+                buffers['final_agent'][done], buffers['target'][done], buffers['final_ghosts'][done], buffers['final_candies'][done]
+            )
+            final_agent = buffers['final_agent'][done]
+            final_distance = self.door_distance[final_agent[:, 0], final_agent[:, 1]].astype(np.float64)
+            if self.action_mask is not None:
+                final_masks = self.action_masks(final_agent, buffers['final_ghosts'][done])
+
+            final_observation = np.full(self.num_envs, None, dtype=object)
+            final_info = np.full(self.num_envs, None, dtype=object)
+            for k, i in enumerate(done):
+                if self.obs_mode == 'discrete':
+                    final_observation[i] = int(final[k])
+                elif self.obs_mode == 'flat':
+                    final_observation[i] = final[k].copy()
+                else:
+                    final_observation[i] = {key: value[k].copy() for key, value in final.items()}
+                final_info[i] = {'distance': final_distance[k]}
+                if self.action_mask is not None:
+                    final_info[i]['action_mask'] = final_masks[k]
+            mask = np.zeros(self.num_envs, dtype=bool)
+            mask[done] = True
+            infos.update({
+                'final_observation': final_observation, '_final_observation': mask,
+                'final_info': final_info, '_final_info': mask,
+            })
+
+        return self._get_obs(), reward, terminated, truncated, infos
+
+    ##########################################################################
+    # Close
+    ##########################################################################
+
+    def close_extras(self, **kwargs):
+        '''
+        Description:
+            Stops the workers and frees the shared memory block.
+        '''
+        for remote in self.remotes:
+            try:
+                remote.send(('close', None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for remote in self.remotes:
+            remote.close()
+
+        self.buffers = None
+        self.shm.close()
+        self.shm.unlink()
@@ -1,17 +1,26 @@
 import numpy as np
 import gymnasium as gym
-import pygame
+
+from layout import generate_layout
+from profiling import instrument
+from distance_field import distance_field
+from action_mask import boundary_mask_table
 
 class Simple_Haunted_Mansion(gym.Env):
 
     # Defining metadata (render_modes/render_fps)
-    metadata = {'render_modes' : ['human'], 'render_fps': 1}
+    metadata = {'render_modes' : ['human', 'rgb_array', 'human_async'], 'render_fps': 1}
+
+    # Reward for reaching the door (also read by VectorHauntedMansion in vector_env.py)
+    door_reward = 1
 
     ##########################################################################
     # Init
     ##########################################################################
 
-    def __init__(self, size: int = 5, render_mode = 'human'):
+    def __init__(self, size: int = 5, render_mode = None, profile = False, door: str = 'corner', layout_seed: int = 0,
+                 shaping_scale: float = 0.0, shaping_gamma: float = 0.99,
+                 action_mask: str = None):
         ''' 
         Description:
             Initialises the environment
@@ -21,7 +30,30 @@ class Simple_Haunted_Mansion(gym.Env):
                 The grid size, 5 by 5 for default 
 
             render_mode: str
-                For visualisation, default render mode set to 'human'
+                For visualisation, default None (no rendering, for training). 'human' opens a window,
+                'rgb_array' draws off-screen and render() returns the frame as an array, 'human_async'
+                draws the window from a background thread at render_fps (see threaded_renderer.py)
+
+            profile: bool or str
+                False (default) for no profiling, True to time reset/step/_get_obs/_get_info/render
+                (see profile_stats()), 'info' to also add the latest timings to info['profile_ns']
+
+            door: str
+                Door placement policy (see layout.py): 'corner' (default), 'edge' or 'random'
+
+            layout_seed: int
+                Seed of the generated layout (only used by the 'edge' and 'random' door policies)
+
+            shaping_scale: float
+                Weight of the potential-based shaping reward, scale * (distance before - gamma * distance
+                after) with the BFS distance to the door, 0 (default) for no shaping
+
+            shaping_gamma: float
+                Discount used by the shaping reward (match the agent's gamma), 0.99 for default
+
+            action_mask: str
+                None (default) for no mask, 'boundary' to add info['action_mask'], the actions whose move
+                stays on the grid (see action_masks())
 
         Outputs (Attributes):
             size : int
@@ -71,7 +103,15 @@ class Simple_Haunted_Mansion(gym.Env):
         self.agent_location = np.array([-1, -1], dtype=np.int64)
 
         # Setting position of the target_location (exit door), the door is static
-        self.target_location = np.array([4, 4], dtype=np.int64)
+        self.target_location = generate_layout(size, 0, 0, door, layout_seed)[0]
+
+        # BFS distance from every cell to the door, computed once per layout and shared by every env
+        # with the same layout (see distance_field.py)
+        self.door_distance = distance_field(self.size, self.target_location[None])
+
+        # Potential-based shaping (off for the default scale of 0)
+        self.shaping_scale = shaping_scale
+        self.shaping_gamma = shaping_gamma
 
         # Observations are represented as dictionaries with the agent's and the target's location.
         self.observation_space = gym.spaces.Dict(
@@ -92,16 +132,26 @@ class Simple_Haunted_Mansion(gym.Env):
             2: np.array([-1, 0]),  # left
             3: np.array([0, -1]),  # up
         }
+
+        # Valid actions of every cell (moves that stay on the grid), shared by every env of the same size
+        self.directions = np.array([self.action_to_direction[a] for a in range(4)], dtype=np.int64)
+        self.boundary_masks = boundary_mask_table(self.size, self.directions)
+
+        if action_mask not in (None, 'boundary'):
+            raise ValueError(f"action_mask must be None or 'boundary' (no ghosts in the simple env), got {action_mask!r}")
+        self.action_mask = action_mask
         
-        # Initialise Pygame if render_mode is 'human'
-        
-        if self.render_mode == 'human':
-            pygame.init()
-            self.screen_size = 800
-            self.cell_size = self.screen_size // self.size
-            self.screen = pygame.display.set_mode((self.screen_size, self.screen_size))
+        # Pygame is only imported and initialised on the first render() call (see _init_render()),
+        # so environments used for training (render_mode=None) never load it
+        self.screen_size = 800
+        self.cell_size = self.screen_size // self.size
+        self.screen = None
 
-            pygame.display.set_caption('Trick or ReTreat: Escape the Mansion!')
+        # Background render thread of the 'human_async' mode, started on the first frame
+        self.renderer = None
+
+        # Timed wrappers are only bound when profiling, otherwise the plain methods run untouched
+        self.profiler = instrument(self, add_to_info=(profile == 'info')) if profile else None
 
 
     ##########################################################################
@@ -130,13 +180,33 @@ class Simple_Haunted_Mansion(gym.Env):
 
         Outputs:
             information: 
-                Returns distance between agent and target location (door).
+                Returns distance between agent and target location (door), looked up in the BFS
+                distance field of the layout (see distance_field.py), and the valid actions with
+                action_mask.
         '''
-        return {
-            'distance': np.linalg.norm(
-                self.agent_location - self.target_location, ord=1
-            )
-        }
+        info = {'distance': np.float64(self.door_distance[self.agent_location[0], self.agent_location[1]])}
+
+        if self.action_mask is not None:
+            info['action_mask'] = self.action_masks()
+
+        return info
+
+    ##########################################################################
+    # Action Masks
+    ##########################################################################
+
+    def action_masks(self):
+        ''' 
+        Description:
+            Returns the valid actions in the current state, the moves that stay on the grid (the others
+            are clipped and waste the step). One lookup in a table built at construction. Same name and
+            format as sb3-contrib's MaskablePPO expects.
+
+        Outputs:
+            mask: array
+                Read-only boolean array of shape (4,).
+        '''
+        return self.boundary_masks[self.agent_location[0], self.agent_location[1]]
 
     ##########################################################################
     # Resetting the Environment
@@ -165,7 +235,7 @@ class Simple_Haunted_Mansion(gym.Env):
         observation = self._get_obs()
         info = self._get_info()
 
-        if self.render_mode == 'human':
+        if self.render_mode in ('human', 'human_async'):
             self.render()
         
         return observation, info
@@ -206,6 +276,9 @@ class Simple_Haunted_Mansion(gym.Env):
             action = np.int64(action.item()) 
 
         direction = self.action_to_direction[action]
+
+        # Location before the move, for the shaping reward
+        previous = self.agent_location
         
         # We use np.clip to make sure we don't leave the grid bounds
         self.agent_location = np.clip(
@@ -219,14 +292,50 @@ class Simple_Haunted_Mansion(gym.Env):
         terminated =np.array_equal(self.agent_location, self.target_location)
 
         # To only receive reward of 1 if terminated flag is set
-        reward = 1 if terminated else 0
+        reward = self.door_reward if terminated else 0
+
+        # Potential-based shaping with potential -distance to the door, which keeps the optimal policy
+        if self.shaping_scale:
+            reward += self.shaping_scale * (
+                self.door_distance[previous[0], previous[1]]
+                - self.shaping_gamma * self.door_distance[self.agent_location[0], self.agent_location[1]]
+            )
 
         # Get observation and info after taking an action
         observation = self._get_obs()
         info = self._get_info()
 
+        # Handing the new frame to the render thread (never waits on the display)
+        if self.render_mode == 'human_async':
+            self._publish_frame()
+
         return observation, reward, terminated, truncated, info
 
+    ##########################################################################
+    # Initialising Pygame (on the first render() call)
+    ##########################################################################
+
+    def _init_render(self):
+        ''' 
+        Description:
+            Imports and initialises pygame and creates the surface to draw on. Only called the first
+            time render() is used, so environments that never render start fast and need no display.
+        '''
+        import pygame
+        from sprite_cache import SpriteCache
+
+        # Sprites are loaded and scaled once here rather than on every render() call
+        self.sprite_cache = SpriteCache()
+
+        if self.render_mode == 'human':
+            pygame.init()
+            self.screen = pygame.display.set_mode((self.screen_size, self.screen_size))
+            pygame.display.set_caption('Trick or ReTreat: Escape the Mansion!')
+
+        # For 'rgb_array' draw on an off-screen surface instead, no window (or display) is needed
+        else:
+            self.screen = SpriteCache.make_surface(self.screen_size)
+
     ##########################################################################
     # Render
     ##########################################################################  
@@ -234,50 +343,87 @@ class Simple_Haunted_Mansion(gym.Env):
     def render(self):
         ''' 
         Description:
-            To visualise the environment and agent's actions, only rendering mode is for human.
+            To visualise the environment and agent's actions, either in a window ('human') or as an
+            array ('rgb_array').
 
         Outputs:
-            pygame display window depicting grid, agent's movement and target location.
+            pygame display window depicting grid, agent's movement and target location. For 'rgb_array'
+            a new (H, W, 3) uint8 array of the frame instead.
         '''
-                
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                exit()
-
-        # Set background to all white
-        self.screen.fill((255, 255, 255))
-
-        # Looping through rows and columns to draw rectanges (representing the grid)
-        for row in range(self.size):
-            for col in range(self.size):
-                # Calculates x and y positions of each cell in the grid by multiplying the col/row index by pixel cell size
-                cell_x = col * self.cell_size
-                cell_y = row * self.cell_size
-                # Drawing white rectangle to represent each cell in the grid
-                pygame.draw.rect(self.screen, (0, 0, 0), (cell_x, cell_y, self.cell_size, self.cell_size), 1)
-
-        # To calculate the offset to ensure images are placed in centre of cells
-        offset = self.cell_size * 0.1
-
-        # Transform target grid cooridinates into pixel coordinates 
-        door_pos = self.target_location * self.cell_size
-        
-        # Representing the door as an image from Canva
-        door_img = pygame.image.load('images/Door.png')
-        # Scaling the image of the Door to be smaller than size of the cell
-        door_img = pygame.transform.scale(door_img,(self.cell_size * 0.8,self.cell_size * 0.8))
-        # Drawing the image to the grid, adding offset to ensure img is in the middle
-        self.screen.blit(door_img, (door_pos[1] + offset , door_pos[0] + offset))
-
-        agent_pos = self.agent_location * self.cell_size
-        # Representing the agent as an image from Canva
-        agent_img = pygame.image.load('images/Agent.png')
-        agent_img = pygame.transform.scale(agent_img,(self.cell_size * 0.8,self.cell_size * 0.8))
-        self.screen.blit(agent_img, (agent_pos[1] + offset, agent_pos[0] + offset))
-
-        # To keep updating the display after each action
-        pygame.display.update()  
+
+        if self.render_mode is None:
+            gym.logger.warn("render() called without a render_mode, set render_mode='human' or 'rgb_array'")
+            return
+
+        # The render thread draws on its own, the frame is only handed over
+        if self.render_mode == 'human_async':
+            self._publish_frame()
+            return
+
+        # Only the first call actually imports pygame, afterwards this is a cheap lookup
+        import pygame
+
+        if self.screen is None:
+            self._init_render()
+
+        if self.render_mode == 'human':
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    pygame.quit()
+                    exit()
+
+        # Sprites and the empty grid are only loaded/scaled again if the grid or screen size changes,
+        # the door is drawn once onto the static layer (locations are (row, column), the screen is (x, y))
+        self.sprite_cache.build(self.size, self.screen_size)
+        self.sprite_cache.build_static(tuple(self.target_location[::-1].tolist()))
+
+        # Only the cells whose sprites changed since the last frame are redrawn
+        cells = self.sprite_cache.cell_sprites((('agent', self.agent_location[None, ::-1]),))
+        rects = self.sprite_cache.draw(self.screen, cells)
+
+        # Copying the frame into an array
+        if self.render_mode == 'rgb_array':
+            return self.sprite_cache.to_array(self.screen)
+
+        # Pushing only the redrawn cells to the window (the whole window after a full redraw)
+        if rects is None:
+            pygame.display.update()
+        elif rects:
+            pygame.display.update(rects)  
+
+    ##########################################################################
+    # Publishing Frames ('human_async')
+    ##########################################################################
+
+    def _publish_frame(self):
+        ''' 
+        Description:
+            Publishes copies of the door and agent cells to the render thread, which draws the latest
+            frame at its own pace (stale frames are dropped). Starts the thread on the first call.
+        '''
+        if self.renderer is None:
+            from threaded_renderer import ThreadedRenderer
+            self.renderer = ThreadedRenderer(self.size, self.screen_size, self.metadata['render_fps'])
+
+        # Locations are (row, column), the screen is (x, y)
+        self.renderer.publish(
+            tuple(self.target_location[::-1].tolist()), (('agent', self.agent_location[None, ::-1].copy()),)
+        )
+
+    ##########################################################################
+    # Profiling
+    ##########################################################################
+
+    def profile_stats(self):
+        ''' 
+        Description:
+            Returns the timings collected when the env was built with profile=True (empty otherwise).
+
+        Outputs:
+            stats: dict
+                Phase ('reset', 'step', '_get_obs', '_get_info', 'render') -> {'calls', 'total_ms', 'mean_us'}.
+        '''
+        return self.profiler.stats() if self.profiler is not None else {}
 
     ##########################################################################
     # Close
@@ -292,5 +438,11 @@ class Simple_Haunted_Mansion(gym.Env):
             Quit all pygame windows after the environment is no longer in use.
         '''
         
-        if self.render_mode == 'human':
-            pygame.quit()  # Close the pygame window
\ No newline at end of file
+        if self.renderer is not None:
+            self.renderer.close()  # Stop the render thread, which closes its window
+            self.renderer = None
+
+        if self.render_mode == 'human' and self.screen is not None:
+            import pygame
+            pygame.quit()  # Close the pygame window
+            self.screen = None
\ No newline at end of file
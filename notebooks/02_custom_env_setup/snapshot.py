@@ -0,0 +1,99 @@
+import numpy as np
+
+from occupancy import GHOST, CANDY, DOOR
+
+# Lower 64 bits of the 128-bit PCG64 state/increment
+_LOW_BITS = (1 << 64) - 1
+
+##########################################################################
+# Snapshot Layout
+##########################################################################
+
+def snapshot_dtype(num_ghosts: int, num_candies: int):
+    '''
+    Description:
+        Structured dtype of a state snapshot: the full dynamic state of an intermediate/final env in a
+        fixed-size record (a few hundred bytes for the default layout).
+
+        The random generator's PCG64 state is stored as 6 uint64s (128-bit state and increment as two
+        halves each, plus the buffered 32-bit draw).
+    '''
+    return np.dtype([
+        ('agent', np.int64, (2,)),
+        ('ghosts', np.int64, (num_ghosts, 2)),
+        ('candies', np.int64, (num_candies, 2)),
+        ('ghost_headings', np.int64, (num_ghosts, 2)),
+        ('timestep', np.int64),
+        ('rng', np.uint64, (6,)),
+    ])
+
+##########################################################################
+# Capturing and Restoring
+##########################################################################
+
+def capture_state(env):
+    '''
+    Description:
+        Returns a snapshot of the env's dynamic state (agent, ghosts, candies, timestep, patrol
+        headings and random generator state) as a 0-d structured array (see snapshot_dtype()).
+    '''
+    snapshot = np.zeros((), dtype=env.snapshot_dtype)
+    snapshot['agent'] = env.agent_location
+    snapshot['ghosts'] = env.ghosts_location
+    snapshot['candies'] = env.candies_location
+    if getattr(env, 'ghost_headings', None) is not None:
+        snapshot['ghost_headings'] = env.ghost_headings
+    snapshot['timestep'] = getattr(env, 'timestep', 0)
+
+    rng_state = env.np_random.bit_generator.state
+    if rng_state['bit_generator'] != 'PCG64':
+        raise ValueError(f"Only PCG64 generators can be snapshotted, got {rng_state['bit_generator']}")
+    state, inc = rng_state['state']['state'], rng_state['state']['inc']
+    snapshot['rng'] = (
+        state & _LOW_BITS, state >> 64, inc & _LOW_BITS, inc >> 64, rng_state['has_uint32'], rng_state['uinteger']
+    )
+
+    return snapshot
+
+def restore_state(env, snapshot):
+    '''
+    Description:
+        Puts the env back in the state of a snapshot from capture_state(). The occupancy grid is updated
+        in place (only the ghost and candy cells are touched), so restoring costs microseconds whatever
+        the grid size.
+    '''
+    size = env.occupancy.shape[1]
+    num_ghosts = len(env.ghosts_location)
+    occupancy, candy_index = env.occupancy.reshape(-1), env.candy_index.reshape(-1)
+
+    # Flat cells of the current ghosts and candies, off-grid entities ([-1, -1]) give negative cells
+    old_cells = np.concatenate((env.ghosts_location, env.candies_location)) @ (size, 1)
+    old_cells = old_cells[old_cells >= 0]
+
+    # Clearing them (the door is the only static entity, it is kept)
+    occupancy[old_cells] &= DOOR
+    candy_index[old_cells] = -1
+
+    env.agent_location = snapshot['agent'].copy()
+    env.ghosts_location = snapshot['ghosts'].copy()
+    env.candies_location = snapshot['candies'].copy()
+    if getattr(env, 'ghost_headings', None) is not None:
+        env.ghost_headings = snapshot['ghost_headings'].copy()
+    if hasattr(env, 'timestep'):
+        env.timestep = int(snapshot['timestep'])
+
+    # Adding the snapshot's ghosts and uncollected candies back
+    new_cells = np.concatenate((env.ghosts_location, env.candies_location)) @ (size, 1)
+    ghost_cells, candy_cells = new_cells[:num_ghosts], new_cells[num_ghosts:]
+    occupancy[ghost_cells[ghost_cells >= 0]] |= GHOST
+    on_grid = np.flatnonzero(candy_cells >= 0)
+    occupancy[candy_cells[on_grid]] |= CANDY
+    candy_index[candy_cells[on_grid]] = on_grid
+
+    state_low, state_high, inc_low, inc_high, has_uint32, uinteger = snapshot['rng'].tolist()
+    env.np_random.bit_generator.state = {
+        'bit_generator': 'PCG64',
+        'state': {'state': state_low | state_high << 64, 'inc': inc_low | inc_high << 64},
+        'has_uint32': has_uint32,
+        'uinteger': uinteger,
+    }
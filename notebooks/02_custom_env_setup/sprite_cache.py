@@ -0,0 +1,278 @@
+import os
+import sys
+import numpy as np
+import pygame
+
+# Folder holding the sprites (from Canva), resolved from this file so rendering works from any working directory
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'images')
+
+# Pixel masks of an off-screen surface whose memory is laid out as R, G, B bytes (see make_surface())
+RGB_MASKS = (0xFF, 0xFF00, 0xFF0000, 0)
+
+# Decoded images shared by every cache in the process, so each PNG is only read from disk once
+_loaded_images = {}
+
+class SpriteCache:
+
+    # Sprite name -> image file in IMAGES_DIR
+    image_files = {
+        'door': 'Door.png',
+        'ghost': 'Ghost.png',
+        'candy': 'Candy.png',
+        'agent': 'Agent.png',
+    }
+
+    ##########################################################################
+    # Init
+    ##########################################################################
+
+    def __init__(self):
+        '''
+        Description:
+            Holds the sprites scaled to the current cell size and a prebuilt background surface
+            (white grid with black cell borders) so render() only has to blit.
+
+        Outputs:
+            sprites: dict
+                Sprite name -> pygame surface scaled to 80% of a cell.
+
+            background: pygame.Surface
+                The empty grid, drawn once per grid/screen size.
+
+            cell_size: int
+                Pixel size of each cell in the grid.
+
+            offset: float
+                Pixel offset that centres a sprite in its cell.
+
+            static: pygame.Surface
+                The background with the door drawn on it (everything that never moves), see build_static().
+
+            drawn: dict
+                Cell -> sprites drawn there in the last frame, to know which cells changed (see draw()).
+        '''
+        self.sprites = {}
+        self.background = None
+        self.static = None
+        self.cell_size = 0
+        self.offset = 0
+        self.drawn = None
+
+        # Grid size and screen size the surfaces were built for, to know when to rebuild
+        self.key = None
+
+        # Build key and door cell the static layer was drawn for, and the surface last drawn on
+        self.static_key = None
+        self.drawn_surface = None
+
+    ##########################################################################
+    # Loading Images
+    ##########################################################################
+
+    @staticmethod
+    def load_image(name: str):
+        '''
+        Description:
+            Returns the decoded image for a sprite file, reading it from disk only the first time.
+
+        Inputs:
+            name: str
+                File name inside IMAGES_DIR.
+        '''
+        if name not in _loaded_images:
+            _loaded_images[name] = pygame.image.load(os.path.join(IMAGES_DIR, name))
+        return _loaded_images[name]
+
+    @staticmethod
+    def make_surface(screen_size: int):
+        '''
+        Description:
+            Creates the off-screen surface used by the 'rgb_array' render mode. Its pixels are stored
+            as packed R, G, B bytes so to_array() is a single memory copy.
+
+        Inputs:
+            screen_size: int
+                Pixel size of the (square) surface.
+        '''
+        return pygame.Surface((screen_size, screen_size), 0, 24, RGB_MASKS)
+
+    ##########################################################################
+    # Building Sprites and Background
+    ##########################################################################
+
+    def build(self, size: int, screen_size: int):
+        '''
+        Description:
+            Scales the sprites and draws the background for a `size x size` grid on a screen of
+            `screen_size` pixels. Does nothing if they were already built for the same sizes.
+
+        Inputs:
+            size: int
+                Number of cells along each side of the grid.
+
+            screen_size: int
+                Pixel size of the (square) screen.
+        '''
+        if self.key == (size, screen_size):
+            return
+
+        cell_size = screen_size // size
+        sprite_size = (int(cell_size * 0.8), int(cell_size * 0.8))
+
+        # convert_alpha() makes blitting much faster but needs a display to exist
+        has_display = pygame.display.get_init() and pygame.display.get_surface() is not None
+
+        self.sprites = {}
+        for sprite, file_name in self.image_files.items():
+            image = pygame.transform.scale(self.load_image(file_name), sprite_size)
+            self.sprites[sprite] = image.convert_alpha() if has_display else image
+
+        # Set background to all white and draw a black border around each cell of the grid
+        # (without a display it is kept in the same pixel format as the 'rgb_array' surface)
+        self.background = pygame.Surface((screen_size, screen_size)) if has_display else self.make_surface(screen_size)
+        self.background.fill((255, 255, 255))
+        for row in range(size):
+            for col in range(size):
+                pygame.draw.rect(self.background, (0, 0, 0), (col * cell_size, row * cell_size, cell_size, cell_size), 1)
+        if has_display:
+            self.background = self.background.convert()
+
+        # To calculate the offset to ensure images are placed in centre of cells
+        self.cell_size = cell_size
+        self.offset = cell_size * 0.1
+        self.key = (size, screen_size)
+
+    def build_static(self, door):
+        '''
+        Description:
+            Draws the static layer, the background with the door on it. Does nothing if it was already
+            drawn for the same grid, screen size and door cell. Call build() first.
+
+        Inputs:
+            door: tuple
+                (column, row) cell of the door on the screen.
+        '''
+        if self.static_key == (self.key, door):
+            return
+
+        self.static = self.background.copy()
+        self.static.blit(self.sprites['door'], (door[0] * self.cell_size + self.offset, door[1] * self.cell_size + self.offset))
+        self.static_key = (self.key, door)
+
+        # Everything drawn before was on the old layer, the next frame is drawn in full
+        self.drawn = None
+
+    ##########################################################################
+    # Drawing Changed Cells
+    ##########################################################################
+
+    @staticmethod
+    def cell_sprites(groups):
+        '''
+        Description:
+            Returns which sprites go in which cell for one frame. Entities off the grid (at [-1, -1],
+            like collected candies) are left out.
+
+        Inputs:
+            groups: sequence
+                (sprite name, (no entities, 2) array of (column, row) cells) pairs, in drawing order.
+
+        Outputs:
+            cells: dict
+                (column, row) -> list of sprite names, drawn in that order.
+        '''
+        cells = {}
+        for name, locations in groups:
+            for cell in map(tuple, locations.tolist()):
+                if cell[0] >= 0:
+                    cells.setdefault(cell, []).append(name)
+
+        return cells
+
+    def draw(self, surface, cells):
+        '''
+        Description:
+            Draws a frame on `surface` by only redrawing the cells whose sprites changed since the last
+            frame: each is restored from the static layer and its new sprites are blitted on top. The
+            whole frame is drawn the first time, after the grid, screen size or door changed, or when
+            drawing on another surface. Call build() and build_static() first.
+
+        Inputs:
+            surface: pygame.Surface
+                The screen or off-screen surface to draw on, which must still hold the last frame.
+
+            cells: dict
+                Sprites of every cell for this frame, see cell_sprites().
+
+        Outputs:
+            rects: list
+                pygame.Rect of every redrawn cell, to pass to pygame.display.update(). None if the whole
+                frame was drawn.
+        '''
+        cell_size = self.cell_size
+        offset = self.offset
+        sprites = self.sprites
+
+        # Drawing the whole frame
+        if self.drawn is None or self.drawn_surface is not surface:
+            surface.blit(self.static, (0, 0))
+            for (x, y), names in cells.items():
+                for name in names:
+                    surface.blit(sprites[name], (x * cell_size + offset, y * cell_size + offset))
+            self.drawn, self.drawn_surface = cells, surface
+            return None
+
+        # Cells that gained, lost or changed sprites (an agent moving one cell changes two of them)
+        previous = self.drawn
+        rects = []
+        for cell in previous.keys() | cells.keys():
+            names = cells.get(cell)
+            if previous.get(cell) == names:
+                continue
+
+            x, y = cell
+            rect = pygame.Rect(x * cell_size, y * cell_size, cell_size, cell_size)
+            surface.blit(self.static, rect, rect)
+            for name in names or ():
+                surface.blit(sprites[name], (x * cell_size + offset, y * cell_size + offset))
+            rects.append(rect)
+
+        self.drawn = cells
+        return rects
+
+    ##########################################################################
+    # Converting a Surface to an Array
+    ##########################################################################
+
+    def to_array(self, surface):
+        '''
+        Description:
+            Copies the pixels of a surface into a new array, with one memory copy.
+
+        Inputs:
+            surface: pygame.Surface
+                The surface drawn by render().
+
+        Outputs:
+            frame: array
+                (H, W, 3) uint8 array. A new array on every call, so frames can be kept (e.g. by
+                RecordVideo or RenderCollection) without copying them.
+        '''
+        width, height = surface.get_size()
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+
+        if surface.get_masks() == RGB_MASKS and surface.get_bitsize() == 24 and sys.byteorder == 'little':
+            # Rows of packed R, G, B bytes (plus padding up to the pitch), copied straight into the frame
+            buffer = surface.get_buffer()
+            rows = np.frombuffer(buffer, dtype=np.uint8).reshape(height, surface.get_pitch())
+            np.copyto(frame, rows[:, :width * 3].reshape(height, width, 3))
+            del rows
+        else:
+            # pixels3d is a (W, H, 3) view of the surface's pixels, no pixel data is allocated
+            buffer = pygame.surfarray.pixels3d(surface)
+            np.copyto(frame, buffer.transpose(1, 0, 2))
+
+        # Releasing the view unlocks the surface so it can be drawn on again
+        del buffer
+
+        return frame
@@ -0,0 +1,152 @@
+import math
+
+import numpy as np
+
+class StateEncoder:
+
+    ##########################################################################
+    # Init
+    ##########################################################################
+
+    def __init__(self, size: int, num_ghosts: int, num_candies: int, fixed_ghosts: bool = False):
+        '''
+        Description:
+            Maps a mansion state (agent cell, ghost cells, candy-collected bitmask) to one dense integer
+            and back, so tabular agents can index a flat NumPy Q-array directly.
+
+            The state is written as a mixed-radix number with digits
+                [agent cell, candy bitmask, ghost 1 cell, ..., ghost n cell]
+            where a cell is `x * size + y`. The radix and place value of each digit are precomputed.
+
+        Inputs:
+            size: int
+                The grid size.
+
+            num_ghosts: int
+                Number of ghosts.
+
+            num_candies: int
+                Number of candies.
+
+            fixed_ghosts: bool
+                True if the ghosts never move (intermediate env), their cells are then left out of the
+                index, False if they change between episodes (final env).
+
+        Outputs:
+            radices: array
+                Number of values each digit can take.
+
+            strides: array
+                Place value of each digit, the index is the dot product of the digits and the strides.
+
+            num_states: int
+                Total number of states, indices are in [0, num_states).
+
+            indexable: bool
+                False if num_states doesn't fit in an int64 (large grids with many ghosts/candies), the
+                state can then not be encoded and radices/strides are None.
+        '''
+        self.size = size
+        self.num_ghosts = num_ghosts
+        self.num_candies = num_candies
+        self.fixed_ghosts = fixed_ghosts
+
+        num_cells = size * size
+        ghost_digits = 0 if fixed_ghosts else num_ghosts
+        radices = [num_cells, 2 ** num_candies] + [num_cells] * ghost_digits
+
+        # Counted with Python ints so it can't overflow
+        self.num_states = math.prod(radices)
+        self.indexable = self.num_states <= np.iinfo(np.int64).max
+        self.radices = self.strides = self.candy_bits = None
+        if not self.indexable:
+            return
+
+        self.radices = np.array(radices, dtype=np.int64)
+
+        # Place value of each digit (the first digit varies fastest)
+        self.strides = np.concatenate(([1], np.cumprod(self.radices[:-1]))).astype(np.int64)
+
+        # Bit of each candy in the collected bitmask
+        self.candy_bits = (1 << np.arange(num_candies)).astype(np.int64)
+
+    def _check_indexable(self):
+        if not self.indexable:
+            raise ValueError(f'{self.num_states} states do not fit in an int64 index, use fewer ghosts/candies or a smaller grid')
+
+    ##########################################################################
+    # Encoding
+    ##########################################################################
+
+    def encode(self, agent, ghosts, candies):
+        '''
+        Description:
+            Returns the index of a state. Works on a single state or on a batch (leading axes).
+
+        Inputs:
+            agent: array
+                Agent location(s), shape (..., 2).
+
+            ghosts: array
+                Ghost locations, shape (..., no ghosts, 2). Ignored if the ghosts are fixed.
+
+            candies: array
+                Candy locations, shape (..., no candies, 2), collected candies are at [-1, -1].
+
+        Outputs:
+            index: int or array
+                State index, or an int64 array of indices for a batch.
+        '''
+        self._check_indexable()
+        agent = np.asarray(agent)
+        candies = np.asarray(candies)
+
+        # Agent cell and candy-collected bitmask
+        index = (agent[..., 0] * self.size + agent[..., 1]) * self.strides[0]
+        collected = candies[..., 0] < 0
+        index = index + (collected * self.candy_bits).sum(axis=-1) * self.strides[1]
+
+        if not self.fixed_ghosts:
+            ghosts = np.asarray(ghosts)
+            ghost_cells = ghosts[..., 0] * self.size + ghosts[..., 1]
+            index = index + (ghost_cells * self.strides[2:]).sum(axis=-1)
+
+        return int(index) if np.ndim(index) == 0 else index.astype(np.int64)
+
+    ##########################################################################
+    # Decoding
+    ##########################################################################
+
+    def decode(self, index):
+        '''
+        Description:
+            Inverse of encode(). Works on a single index or an array of indices.
+
+        Inputs:
+            index: int or array
+                State index (or indices).
+
+        Outputs:
+            agent: array
+                Agent location(s), shape (..., 2).
+
+            ghosts: array
+                Ghost locations, shape (..., no ghosts, 2), or None if the ghosts are fixed.
+
+            collected: array
+                Boolean array of shape (..., no candies), True for candies that were collected.
+        '''
+        self._check_indexable()
+        index = np.asarray(index, dtype=np.int64)
+
+        # Splitting the index back into its digits
+        digits = (index[..., None] // self.strides) % self.radices
+
+        agent = np.stack(np.divmod(digits[..., 0], self.size), axis=-1)
+        collected = (digits[..., 1:2] & self.candy_bits) != 0
+
+        ghosts = None
+        if not self.fixed_ghosts:
+            ghosts = np.stack(np.divmod(digits[..., 2:], self.size), axis=-1)
+
+        return agent, ghosts, collected
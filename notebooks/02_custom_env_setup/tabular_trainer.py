@@ -0,0 +1,240 @@
+import numpy as np
+
+from vector_env import VectorHauntedMansion
+
+##########################################################################
+# Schedules (epsilon/alpha)
+##########################################################################
+
+def constant_schedule(value: float):
+    '''
+    Description:
+        Schedule that always returns `value`.
+    '''
+    return lambda step: value
+
+def linear_schedule(start: float, end: float, duration: int):
+    '''
+    Description:
+        Schedule going linearly from `start` to `end` over `duration` env-steps, then staying at `end`.
+    '''
+    return lambda step: end + (start - end) * max(0.0, 1.0 - step / duration)
+
+def exponential_schedule(start: float, end: float, decay: float):
+    '''
+    Description:
+        Schedule decaying from `start` towards `end` by a factor of `decay` per env-step.
+    '''
+    return lambda step: end + (start - end) * decay ** step
+
+def _as_schedule(value):
+    # Floats are turned into constant schedules so both can be passed for epsilon/alpha
+    return value if callable(value) else constant_schedule(value)
+
+class TabularTrainer:
+
+    algorithms = ('q_learning', 'sarsa')
+
+    ##########################################################################
+    # Init
+    ##########################################################################
+
+    def __init__(self, num_envs: int = 64, variant: str = 'intermediate', algorithm: str = 'q_learning',
+                 gamma: float = 0.99, alpha = 0.1, epsilon = 0.1, seed: int = None, **env_kwargs):
+        '''
+        Description:
+            Epsilon-greedy Q-learning or SARSA on a batch of Haunted Mansions. All environments are
+            stepped together (VectorHauntedMansion in 'discrete' mode) and the TD updates for the whole
+            batch are applied to a flat Q-array with one vectorised NumPy call per step.
+
+        Inputs:
+            num_envs: int
+                Number of environments stepped in parallel, 64 for default.
+
+            variant: str
+                'intermediate' (default) or 'final'.
+
+            algorithm: str
+                'q_learning' (default, off-policy max target) or 'sarsa' (on-policy target).
+
+            gamma: float
+                Discount factor.
+
+            alpha: float or callable
+                Learning rate, or a schedule mapping the number of env-steps so far to a learning rate.
+
+            epsilon: float or callable
+                Exploration rate, or a schedule (see linear_schedule/exponential_schedule).
+
+            seed: int
+                Seeds the environments and the action sampling.
+
+            env_kwargs: dict
+                Passed to the environment class (e.g. size, step_penalty). The trainer needs state indices,
+                so obs_mode can only be 'discrete' (the default here).
+
+        Outputs:
+            q_table: array
+                Q-values of shape (no states, 4), indexed by StateEncoder state indices.
+
+            episode_returns: list
+                Return of every finished episode, in order of completion.
+        '''
+        if algorithm not in self.algorithms:
+            raise ValueError(f'Unknown algorithm {algorithm!r}, expected one of {self.algorithms}')
+
+        obs_mode = env_kwargs.pop('obs_mode', 'discrete')
+        if obs_mode != 'discrete':
+            raise ValueError(f"The tabular trainer needs obs_mode='discrete', got {obs_mode!r}")
+
+        self.envs = VectorHauntedMansion(num_envs, variant=variant, copy=False, obs_mode='discrete', **env_kwargs)
+        self.algorithm = algorithm
+        self.gamma = gamma
+        self.alpha = _as_schedule(alpha)
+        self.epsilon = _as_schedule(epsilon)
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
+        num_states = self.envs.state_encoder.num_states
+        num_actions = self.envs.single_action_space.n
+        self.q_table = np.zeros((num_states, num_actions), dtype=np.float64)
+
+        self.num_steps = 0
+        self.episode_returns = []
+
+        # Current states/returns of the batch, set on the first call to train()
+        self.states = None
+        self.returns = np.zeros(num_envs, dtype=np.float64)
+
+    ##########################################################################
+    # Acting
+    ##########################################################################
+
+    def select_actions(self, states, epsilon: float):
+        '''
+        Description:
+            Epsilon-greedy actions for a batch of states (ties go to the lowest action).
+
+        Inputs:
+            states: array
+                State indices, shape (num_envs,).
+
+            epsilon: float
+                Probability of taking a random action.
+        '''
+        actions = self.q_table[states].argmax(axis=1)
+        explore = self.rng.random(len(states)) < epsilon
+        actions[explore] = self.rng.integers(0, self.q_table.shape[1], size=int(explore.sum()))
+
+        return actions
+
+    ##########################################################################
+    # Training
+    ##########################################################################
+
+    def train(self, total_steps: int, checkpoint_path: str = None, checkpoint_every: int = None):
+        '''
+        Description:
+            Runs `total_steps` env-steps (summed over the batch) of Q-learning/SARSA. Can be called again
+            to continue training.
+
+        Inputs:
+            total_steps: int
+                Number of env-steps, each batched step counts as `num_envs` env-steps.
+
+            checkpoint_path: str
+                If given, the Q-table is saved there as a `.npy` file at the end of training.
+
+            checkpoint_every: int
+                If given (with checkpoint_path), the Q-table is also saved every `checkpoint_every` env-steps.
+
+        Outputs:
+            q_table: array
+                The trained Q-table.
+        '''
+        num_envs = self.envs.num_envs
+        num_actions = self.q_table.shape[1]
+
+        if self.states is None:
+            self.states, _ = self.envs.reset(seed=self.seed)
+        actions = self.select_actions(self.states, self.epsilon(self.num_steps))
+
+        next_checkpoint = self.num_steps + checkpoint_every if checkpoint_every else None
+        end = self.num_steps + total_steps
+
+        while self.num_steps < end:
+            alpha = self.alpha(self.num_steps)
+            epsilon = self.epsilon(self.num_steps)
+
+            next_states, rewards, terminated, truncated, infos = self.envs.step(actions)
+
+            # Finished sub-environments are already reset, next_states holds the new episode's start
+            # state, which is only used as the next state to act from (terminal targets don't bootstrap)
+            next_actions = self.select_actions(next_states, epsilon)
+            if self.algorithm == 'q_learning':
+                next_values = self.q_table[next_states].max(axis=1)
+            else:
+                next_values = self.q_table[next_states, next_actions]
+
+            # Truncated episodes still bootstrap from their real last state
+            if truncated.any():
+                final_states = np.array([infos['final_observation'][i] for i in np.flatnonzero(truncated)])
+                next_values[truncated] = self.q_table[final_states].max(axis=1)
+
+            targets = rewards + self.gamma * np.where(terminated, 0.0, next_values)
+            td_errors = targets - self.q_table[self.states, actions]
+
+            # Batched TD update. Several envs can hit the same (state, action) in one step, their TD errors
+            # are averaged so the step size stays alpha however many envs share it
+            flat_index = self.states * num_actions + actions
+            updated, inverse, counts = np.unique(flat_index, return_inverse=True, return_counts=True)
+            mean_td_errors = np.bincount(inverse, weights=td_errors) / counts
+            self.q_table.flat[updated] += alpha * mean_td_errors
+
+            # Episode bookkeeping
+            self.returns += rewards
+            done = terminated | truncated
+            if done.any():
+                self.episode_returns.extend(self.returns[done].tolist())
+                self.returns[done] = 0.0
+
+            self.states = next_states
+            actions = next_actions
+            self.num_steps += num_envs
+
+            if next_checkpoint is not None and checkpoint_path and self.num_steps >= next_checkpoint:
+                self.save(checkpoint_path)
+                next_checkpoint += checkpoint_every
+
+        if checkpoint_path:
+            self.save(checkpoint_path)
+
+        return self.q_table
+
+    ##########################################################################
+    # Policy and Checkpoints
+    ##########################################################################
+
+    def greedy_policy(self):
+        '''
+        Description:
+            Returns the greedy action for every state, an int64 array of shape (no states,).
+        '''
+        return self.q_table.argmax(axis=1)
+
+    def save(self, path: str):
+        '''
+        Description:
+            Saves the Q-table as a `.npy` file.
+        '''
+        np.save(path, self.q_table)
+
+    def load(self, path: str):
+        '''
+        Description:
+            Loads a Q-table saved with save(), it must match the environment's number of states.
+        '''
+        q_table = np.load(path)
+        if q_table.shape != self.q_table.shape:
+            raise ValueError(f'Q-table shape {q_table.shape} does not match the environment {self.q_table.shape}')
+        self.q_table = q_table
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import numpy as np
+
+# The environment modules are flat files in the parent folder (imported as `from final_env import ...`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Number of sub-environments of the batched envs under test
+NUM_ENVS = 8
+
+def same(a, b):
+    # Equality of two observations, dicts of arrays or arrays
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(np.array_equal(a[key], b[key]) for key in a)
+    return np.array_equal(a, b)
+
+def assert_same_rollout(reference, envs, num_steps: int = 300):
+    # Both batches are reset and stepped with the same seeds and actions, everything they return must match
+    observations, infos = reference.reset(seed=3)
+    other_observations, other_infos = envs.reset(seed=3)
+    assert same(observations, other_observations)
+    assert np.array_equal(infos['distance'], other_infos['distance'])
+
+    rng = np.random.default_rng(0)
+    for _ in range(num_steps):
+        actions = rng.integers(0, 4, NUM_ENVS)
+        expected, result = reference.step(actions), envs.step(actions)
+
+        assert same(expected[0], result[0])
+        assert np.array_equal(expected[1], result[1])
+        assert np.array_equal(expected[2], result[2])
+        assert np.array_equal(expected[4]['distance'], result[4]['distance'])
+
+        for i in np.flatnonzero(expected[2]):
+            assert same(expected[4]['final_observation'][i], result[4]['final_observation'][i])
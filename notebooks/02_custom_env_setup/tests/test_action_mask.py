@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from action_mask import boundary_mask_table, ghost_free_mask, batched_action_masks
+from occupancy import build_occupancy_grid
+from intermediate_env import Intm_Haunted_Mansion
+from final_env import Final_Haunted_Mansion
+from vector_env import VectorHauntedMansion
+from conftest import NUM_ENVS
+
+DIRECTIONS = np.array([[1, 0], [0, 1], [-1, 0], [0, -1]])
+
+def test_boundary_table():
+    table = boundary_mask_table(4, DIRECTIONS)
+    assert table.shape == (4, 4, 4) and not table.flags.writeable
+    assert boundary_mask_table(4, DIRECTIONS.copy()) is table
+
+    for x in range(4):
+        for y in range(4):
+            moved = np.array([x, y]) + DIRECTIONS
+            assert np.array_equal(table[x, y], ((moved >= 0) & (moved < 4)).all(axis=1))
+    assert table[0, 0].tolist() == [True, True, False, False]
+
+def test_hazard_mask():
+    table = boundary_mask_table(5, DIRECTIONS)
+    occupancy, _ = build_occupancy_grid(5, np.array([4, 4]), np.array([[2, 1], [1, 2]]), np.zeros((0, 2), dtype=np.int64))
+
+    # Ghosts right of and below the agent, only the moves off the ghosts stay
+    agent = np.array([1, 1])
+    assert ghost_free_mask(table[1, 1], agent, DIRECTIONS, occupancy).tolist() == [False, False, True, True]
+
+    # In the corner every on-grid move hits a ghost, so the boundary mask is kept
+    corner = np.array([1, 0])
+    occupancy, _ = build_occupancy_grid(5, np.array([4, 4]), np.array([[2, 0], [0, 0], [1, 1]]), np.zeros((0, 2), dtype=np.int64))
+    assert np.array_equal(ghost_free_mask(table[1, 0], corner, DIRECTIONS, occupancy), table[1, 0])
+
+    # No ghost next to the agent, the mask is returned without a copy
+    mask = table[3, 3]
+    assert ghost_free_mask(mask, np.array([3, 3]), DIRECTIONS, occupancy) is mask
+
+def test_batched_masks_match_scalar_masks():
+    rng = np.random.default_rng(0)
+    size = 6
+    table = boundary_mask_table(size, DIRECTIONS)
+    agent = rng.integers(0, size, (200, 2))
+    ghosts = rng.integers(0, size, (200, 3, 2))
+    empty = np.zeros((0, 2), dtype=np.int64)
+
+    masks = batched_action_masks(table, agent, DIRECTIONS, ghosts)
+    assert np.array_equal(batched_action_masks(table, agent, DIRECTIONS), table[agent[:, 0], agent[:, 1]])
+    for i in range(len(agent)):
+        # The door cell is not under test, it is put where no agent or ghost is
+        occupancy, _ = build_occupancy_grid(size + 1, np.array([size, size]), ghosts[i], empty)
+        expected = ghost_free_mask(table[agent[i, 0], agent[i, 1]], agent[i], DIRECTIONS, occupancy)
+        assert np.array_equal(masks[i], expected)
+
+@pytest.mark.parametrize('env_class', [Intm_Haunted_Mansion, Final_Haunted_Mansion])
+@pytest.mark.parametrize('action_mask', ['boundary', 'hazard'])
+def test_info_action_mask(env_class, action_mask):
+    env = env_class(action_mask=action_mask)
+    _, info = env.reset(seed=0)
+
+    for action in np.random.default_rng(0).integers(0, 4, 50).tolist():
+        assert np.array_equal(info['action_mask'], env.action_masks())
+        assert info['action_mask'].any()
+        if action_mask == 'hazard':
+            x, y = env.agent_location
+            expected = ghost_free_mask(env.boundary_masks[x, y], env.agent_location, env.directions, env.occupancy)
+            assert np.array_equal(info['action_mask'], expected)
+
+        _, _, terminated, _, info = env.step(action)
+        if terminated:
+            _, info = env.reset()
+
+def test_no_mask_by_default():
+    env = Final_Haunted_Mansion()
+    _, info = env.reset(seed=0)
+    assert 'action_mask' not in info
+
+    with pytest.raises(ValueError):
+        Final_Haunted_Mansion(action_mask='walls')
+
+def test_vector_env_masks():
+    envs = VectorHauntedMansion(NUM_ENVS, 'final', action_mask='hazard')
+    _, info = envs.reset(seed=0)
+
+    for actions in np.random.default_rng(0).integers(0, 4, (50, NUM_ENVS)):
+        assert info['action_mask'].shape == (NUM_ENVS, 4)
+        assert np.array_equal(info['action_mask'], batched_action_masks(
+            envs.boundary_masks, envs.agent_location, envs.directions, envs.ghosts_location
+        ))
+        info = envs.step(actions)[4]
@@ -0,0 +1,14 @@
+import benchmark
+
+def test_env_modules_import_without_pygame():
+    # measure_import_time() raises if importing the module pulls in pygame
+    for module in ('simple_env', 'intermediate_env', 'final_env', 'vector_env'):
+        assert benchmark.measure_import_time(module, repeats=1) > 0
+
+def test_startup_regressions_are_reported():
+    baseline = {'results': {'final/size=5': {'import_ms': 2.0, 'construct_ms': 1.0, 'steps_per_sec': 1000.0}}}
+    results = {'results': {'final/size=5': {'import_ms': 2.5, 'construct_ms': 9.0, 'steps_per_sec': 1000.0}}}
+
+    # Construction got 8 ms slower (a regression), import 0.5 ms slower (within TIME_SLACK_MS)
+    regressions = benchmark.compare_to_baseline(results, baseline)
+    assert [(name, metric) for name, metric, _, _ in regressions] == [('final/size=5', 'construct_ms')]
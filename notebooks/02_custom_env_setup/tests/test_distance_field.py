@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+import distance_field
+from distance_field import UNREACHABLE, bfs_distance_field, candy_distance_fields
+from intermediate_env import Intm_Haunted_Mansion
+from final_env import Final_Haunted_Mansion
+from mdp import MansionMDP, value_iteration, optimality_gap
+
+def test_open_grid_is_manhattan_distance():
+    sources = np.array([[0, 0], [6, 3]])
+    field = bfs_distance_field(7, sources)
+
+    x, y = np.indices((7, 7))
+    manhattan = np.min([np.abs(x - sx) + np.abs(y - sy) for sx, sy in sources], axis=0)
+    assert field.dtype == np.int32
+    assert np.array_equal(field, manhattan)
+
+def test_walls_detour_and_unreachable_cells():
+    # A wall along x = 2 with a gap at y = 4, and a walled-in corner cell at (4, 0)
+    blocked = np.zeros((5, 5), dtype=bool)
+    blocked[2, :4] = True
+    blocked[3, 0] = blocked[4, 1] = True
+    field = bfs_distance_field(5, [[0, 0]], blocked)
+
+    assert field[1, 0] == 1
+    assert field[3, 4] == 7  # Around the wall through (2, 4)
+    assert field[3, 1] == 10
+    assert field[4, 0] == UNREACHABLE
+    assert (field[blocked] == UNREACHABLE).all()
+
+def test_fields_are_cached_and_read_only(monkeypatch):
+    monkeypatch.setattr(distance_field, '_cached_fields', {})
+    monkeypatch.setattr(distance_field, 'MAX_CACHED_FIELDS', 2)
+
+    field = distance_field.distance_field(5, [[4, 4]])
+    assert distance_field.distance_field(5, np.array([[4, 4]])) is field
+    with pytest.raises(ValueError):
+        field[0, 0] = 0
+
+    # The oldest field is dropped once the cache is full
+    distance_field.distance_field(5, [[0, 0]])
+    distance_field.distance_field(5, [[2, 2]])
+    assert len(distance_field._cached_fields) == 2
+    assert distance_field.distance_field(5, [[4, 4]]) is not field
+
+def test_envs_with_the_same_layout_share_a_field():
+    first, second = Final_Haunted_Mansion(), Final_Haunted_Mansion()
+    assert first.door_distance is second.door_distance
+
+@pytest.mark.parametrize('env_class', [Intm_Haunted_Mansion, Final_Haunted_Mansion])
+def test_info_distances(env_class):
+    env = env_class(candy_distance=True)
+    _, info = env.reset(seed=0)
+    fields = candy_distance_fields(env.size, env.initial_candies)
+
+    for action in np.random.default_rng(0).integers(0, 4, 50).tolist():
+        x, y = env.agent_location
+        target = np.abs(env.agent_location - env.target_location).sum()
+        assert info['distance'] == target
+        expected = np.where(env.candies_location[:, 0] >= 0, fields[:, x, y], UNREACHABLE)
+        assert np.array_equal(info['candy_distance'], expected)
+
+        _, _, terminated, _, info = env.step(action)
+        if terminated:
+            break
+
+@pytest.mark.parametrize('env_class', [Intm_Haunted_Mansion, Final_Haunted_Mansion])
+def test_shaping_reward(env_class):
+    scale, gamma = 0.5, 0.9
+    plain, shaped = env_class(), env_class(shaping_scale=scale, shaping_gamma=gamma)
+    plain.reset(seed=2)
+    shaped.reset(seed=2)
+
+    for action in np.random.default_rng(1).integers(0, 4, 50).tolist():
+        before = shaped.door_distance[tuple(shaped.agent_location)]
+        _, reward, terminated, _, _ = plain.step(action)
+        _, shaped_reward, _, _, _ = shaped.step(action)
+        after = shaped.door_distance[tuple(shaped.agent_location)]
+
+        assert shaped_reward == pytest.approx(reward + scale * (before - gamma * after))
+        if terminated:
+            break
+
+def test_shaping_keeps_the_optimal_policy():
+    gamma = 0.9
+    plain = Final_Haunted_Mansion()
+    shaped = Final_Haunted_Mansion(shaping_scale=2.0, shaping_gamma=gamma)
+    plain.reset(seed=4)
+    shaped.reset(seed=4)
+
+    # The policy that is optimal with shaping is just as good without it
+    _, shaped_policy = value_iteration(MansionMDP(shaped), gamma)
+    assert optimality_gap(MansionMDP(plain), shaped_policy, gamma) == pytest.approx(0, abs=1e-6)
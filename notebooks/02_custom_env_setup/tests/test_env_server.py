@@ -0,0 +1,101 @@
+import socket
+
+import numpy as np
+import pytest
+
+import env_server
+
+from vector_env import VectorHauntedMansion
+from env_server import EnvServer, EnvClient
+from conftest import NUM_ENVS, same, assert_same_rollout
+
+@pytest.fixture(scope='module')
+def server():
+    server = EnvServer(('127.0.0.1', 0)).start_in_thread()
+    yield server
+    server.close()
+
+@pytest.mark.parametrize('variant, env_kwargs', [('simple', {}), ('final', {}), ('final', {'obs_mode': 'flat'})])
+def test_client_matches_vector_env(server, variant, env_kwargs):
+    reference = VectorHauntedMansion(NUM_ENVS, variant, **env_kwargs)
+    envs = EnvClient(server.address, NUM_ENVS, variant, **env_kwargs)
+    try:
+        assert_same_rollout(reference, envs)
+    finally:
+        envs.close()
+
+def test_client_matches_vector_env_in_thread_pool(server, monkeypatch):
+    # Batches above INLINE_MAX_ENVS are stepped in the server's thread pool
+    monkeypatch.setattr(env_server, 'INLINE_MAX_ENVS', 0)
+    reference = VectorHauntedMansion(NUM_ENVS, 'final')
+    envs = EnvClient(server.address, NUM_ENVS, 'final')
+    try:
+        assert_same_rollout(reference, envs)
+    finally:
+        envs.close()
+
+def test_pack_states_round_trip():
+    rng = np.random.default_rng(0)
+    agent = rng.integers(0, 50, (NUM_ENVS, 2))
+    ghosts = rng.integers(0, 50, (NUM_ENVS, 3, 2))
+    candies = rng.integers(0, 50, (NUM_ENVS, 2, 2))
+    candies[::2, 0] = -1  # Collected candies
+
+    dtype = env_server.coord_dtype(50)
+    rows = env_server.pack_states(agent, ghosts, candies, dtype)
+    assert rows.shape == (NUM_ENVS, 2 + 6 + 4) and rows.dtype == np.dtype('<i2')
+
+    for expected, result in zip((agent, ghosts, candies), env_server.unpack_states(rows, 3, 2)):
+        assert np.array_equal(expected, result)
+
+def test_coord_dtype_grows_for_large_grids():
+    assert env_server.coord_dtype(32767) == np.dtype('<i2')
+    assert env_server.coord_dtype(32768) == np.dtype('<i4')
+
+def request(connection, opcode, payload=b''):
+    # One raw frame and its reply (opcode, payload)
+    connection.sendall(env_server.HEADER.pack(len(payload), opcode) + payload)
+    length, opcode = env_server.HEADER.unpack(connection.recv(env_server.HEADER.size, socket.MSG_WAITALL))
+    return opcode, connection.recv(length, socket.MSG_WAITALL) if length else b''
+
+def test_errors_are_replied_and_the_connection_stays_open(server):
+    with socket.create_connection(server.address) as connection:
+        opcode, payload = request(connection, env_server.STEP, bytes(NUM_ENVS))
+        assert opcode == env_server.ERROR and b'must be HELLO' in payload
+
+        opcode, payload = request(connection, env_server.HELLO, b'{"num_envs": 2, "variant": "final"}')
+        assert opcode == env_server.HELLO
+        assert env_server.HELLO_REPLY.unpack(payload) == (2, 5, 3, 2)  # The default 5x5 mansion
+
+        opcode, payload = request(connection, 42)
+        assert opcode == env_server.ERROR and b'Unknown opcode 42' in payload
+
+        opcode, _ = request(connection, env_server.RESET)
+        assert opcode == env_server.RESET
+
+def test_server_errors_raise_in_the_client(server):
+    envs = EnvClient(server.address, NUM_ENVS, 'final')
+    try:
+        envs.reset(seed=0)
+        envs._send(env_server.STEP, bytes(NUM_ENVS - 1))
+        with pytest.raises(RuntimeError, match='Env server failed'):
+            envs._recv()
+    finally:
+        envs.close()
+
+def test_numpy_integer_seed(server):
+    envs = EnvClient(server.address, NUM_ENVS, 'final')
+    reference = VectorHauntedMansion(NUM_ENVS, 'final')
+    try:
+        assert same(envs.reset(seed=np.int64(7))[0], reference.reset(seed=7)[0])
+    finally:
+        envs.close()
+
+def test_unix_socket(tmp_path):
+    server = EnvServer(str(tmp_path / 'mansion.sock')).start_in_thread()
+    envs = EnvClient(server.address, NUM_ENVS, 'intermediate')
+    try:
+        assert_same_rollout(VectorHauntedMansion(NUM_ENVS, 'intermediate'), envs, num_steps=50)
+    finally:
+        envs.close()
+        server.close()
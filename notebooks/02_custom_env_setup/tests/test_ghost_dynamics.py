@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from final_env import Final_Haunted_Mansion
+from ghost_dynamics import propose_ghost_moves, resolve_ghost_moves, patrol_headings
+from occupancy import build_occupancy_grid, GHOST
+
+def grid(ghosts, target=(4, 4), candies=((2, 2),)):
+    return build_occupancy_grid(5, np.array(target), np.array(ghosts), np.array(candies))[0]
+
+def test_chase_steps_towards_agent():
+    # Along the axis where the agent is furthest away, x on ties
+    ghosts = np.array([[0, 0], [4, 1], [2, 4], [1, 4]])
+    moves = propose_ghost_moves(None, 'chase', ghosts, np.array([3, 2]))
+    assert moves.tolist() == [[1, 0], [-1, 0], [0, -1], [1, 0]]
+
+def test_blocked_moves_stay():
+    # Onto the door, onto a candy, and off the grid (clipped onto its own cell)
+    ghosts = np.array([[3, 4], [1, 2], [0, 0]])
+    occupancy = grid(ghosts)
+    new_ghosts, moved = resolve_ghost_moves(ghosts, np.array([[1, 0], [1, 0], [-1, 0]]), occupancy)
+
+    assert np.array_equal(new_ghosts, ghosts)
+    assert not moved.any()
+
+def test_conflicts_go_to_lowest_index():
+    ghosts = np.array([[1, 0], [3, 0], [0, 3]])
+    occupancy = grid(ghosts)
+    new_ghosts, moved = resolve_ghost_moves(ghosts, np.array([[1, 0], [-1, 0], [1, 0]]), occupancy)
+
+    assert new_ghosts.tolist() == [[2, 0], [3, 0], [1, 3]]
+    assert moved.tolist() == [True, False, True]
+
+    # The occupancy grid follows the ghosts
+    assert sorted(map(tuple, np.argwhere(occupancy & GHOST).tolist())) == sorted(map(tuple, new_ghosts.tolist()))
+
+@pytest.mark.parametrize('policy', ['random', 'chase', 'patrol'])
+def test_env_ghosts_stay_valid(policy):
+    env = Final_Haunted_Mansion(size=8, num_ghosts=10, num_candies=4, ghost_policy=policy)
+    env.reset(seed=0)
+    rng = np.random.default_rng(0)
+    moved = False
+
+    for _ in range(200):
+        before = env.ghosts_location.copy()
+        _, _, terminated, _, _ = env.step(int(rng.integers(4)))
+        moved |= not np.array_equal(before, env.ghosts_location)
+
+        ghosts = env.ghosts_location
+        assert ((ghosts >= 0) & (ghosts < env.size)).all()
+        assert len(np.unique(ghosts, axis=0)) == len(ghosts)
+        assert not (ghosts == env.target_location).all(axis=1).any()
+        candies = env.candies_location[(env.candies_location >= 0).all(axis=1)]
+        assert not (ghosts[:, None] == candies[None]).all(axis=2).any()
+        if terminated:
+            env.reset()
+
+    assert moved
+
+def test_patrol_headings_alternate():
+    assert patrol_headings(3).tolist() == [[1, 0], [0, 1], [1, 0]]
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from final_env import Final_Haunted_Mansion
+from layout import generate_layout, CLASSIC_TARGET, CLASSIC_GHOSTS, CLASSIC_CANDIES
+
+def test_defaults_give_classic_mansion():
+    target, ghosts, candies = generate_layout()
+    assert np.array_equal(target, CLASSIC_TARGET)
+    assert np.array_equal(ghosts, CLASSIC_GHOSTS)
+    assert np.array_equal(candies, CLASSIC_CANDIES)
+
+@pytest.mark.parametrize('door', ['corner', 'edge', 'random'])
+@pytest.mark.parametrize('size', [2, 12, 300])
+def test_entities_on_distinct_cells(door, size):
+    num_ghosts, num_candies = min(size * size - 4, 30), 2
+    target, ghosts, candies = generate_layout(size, num_ghosts, num_candies, door, seed=4)
+
+    cells = np.concatenate((target[None], ghosts, candies))
+    assert cells.shape == (num_ghosts + num_candies + 1, 2)
+    assert ((cells >= 0) & (cells < size)).all()
+    assert len(np.unique(cells, axis=0)) == len(cells)
+
+    if door == 'corner':
+        assert target.tolist() == [size - 1, size - 1]
+    elif door == 'edge':
+        assert 0 in target or size - 1 in target
+
+def test_same_seed_same_layout():
+    first = generate_layout(20, 10, 5, 'random', seed=7)
+    assert all(np.array_equal(a, b) for a, b in zip(first, generate_layout(20, 10, 5, 'random', seed=7)))
+    assert not all(np.array_equal(a, b) for a, b in zip(first, generate_layout(20, 10, 5, 'random', seed=8)))
+
+def test_invalid_arguments_raise():
+    with pytest.raises(ValueError):
+        generate_layout(door='window')
+    with pytest.raises(ValueError):
+        generate_layout(3, 5, 3)
+
+def test_env_uses_layout():
+    env = Final_Haunted_Mansion(size=12, num_ghosts=6, num_candies=4, door='edge', layout_seed=3)
+    observation, _ = env.reset(seed=0)
+    target, _, candies = generate_layout(12, 6, 4, 'edge', seed=3)
+
+    assert np.array_equal(observation['target'], target)
+    assert np.array_equal(observation['candies'], candies)
+    assert observation['ghosts'].shape == (6, 2)
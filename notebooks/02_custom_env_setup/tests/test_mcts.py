@@ -0,0 +1,39 @@
+import pytest
+
+from intermediate_env import Intm_Haunted_Mansion
+from final_env import Final_Haunted_Mansion
+from mcts import MCTSPlanner
+
+@pytest.mark.parametrize('env_class, env_kwargs', [
+    (Intm_Haunted_Mansion, {}),
+    (Final_Haunted_Mansion, {'ghost_policy': 'random'}),
+])
+def test_search_restores_env(env_class, env_kwargs):
+    env = env_class(**env_kwargs)
+    env.reset(seed=0)
+    before = env.get_state().tobytes()
+
+    root = MCTSPlanner(env, num_simulations=200, seed=0).search()
+
+    assert env.get_state().tobytes() == before
+    assert root.visits == 200
+    assert sum(child.visits for child in root.children) == 200
+
+def test_plan_is_deterministic_per_seed():
+    env = Final_Haunted_Mansion(ghost_policy='random')
+    env.reset(seed=3)
+    plans = [MCTSPlanner(env, num_simulations=300, seed=1).plan() for _ in range(2)]
+    assert plans[0] == plans[1]
+
+def test_planner_escapes():
+    env = Intm_Haunted_Mansion()
+    env.reset(seed=0)
+    planner = MCTSPlanner(env, num_simulations=300, rollout_depth=10, seed=0)
+
+    # The door is at most 8 moves away on the default 5x5 mansion, the planner gets a few spare steps
+    for _ in range(20):
+        terminated = env.step(planner.plan())[2]
+        if terminated:
+            break
+
+    assert terminated
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from intermediate_env import Intm_Haunted_Mansion
+from final_env import Final_Haunted_Mansion
+from occupancy import build_occupancy_grid
+from mdp import MansionMDP, value_iteration, policy_iteration
+
+@pytest.mark.parametrize('env_class, env_kwargs', [
+    (Intm_Haunted_Mansion, {}),
+    (Final_Haunted_Mansion, {}),
+    (Final_Haunted_Mansion, {'shaping_scale': 0.5, 'shaping_gamma': 0.9}),
+])
+def test_transitions_match_env_step(env_class, env_kwargs):
+    env = env_class(**env_kwargs)
+    env.reset(seed=5)
+    mdp = MansionMDP(env)
+
+    for state in range(mdp.num_states):
+        agent, _, collected = mdp.encoder.decode(state)
+        for action in range(4):
+            # Putting the env in `state`, then comparing its step with the exported transition
+            env.agent_location = agent.astype(np.int64)
+            env.candies_location = np.where(collected[:, None], -1, env.initial_candies)
+            env.occupancy, env.candy_index = build_occupancy_grid(
+                env.size, env.target_location, env.ghosts_location, env.candies_location
+            )
+            _, reward, terminated, _, _ = env.step(action)
+
+            assert mdp.next_states[state, action] == mdp.state_index(env)
+            assert mdp.rewards[state, action] == pytest.approx(reward)
+            assert mdp.terminals[state, action] == terminated
+
+def test_solvers_agree():
+    env = Final_Haunted_Mansion()
+    env.reset(seed=0)
+    mdp = MansionMDP(env)
+
+    values, _ = value_iteration(mdp)
+    other_values, _ = policy_iteration(mdp)
+    assert np.allclose(values, other_values, atol=1e-6)
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from multi_agent_env import Multi_Haunted_Mansion
+
+def test_parallel_api_rollout():
+    env = Multi_Haunted_Mansion(num_agents=4, max_steps=50)
+    observations, infos = env.reset(seed=1)
+    assert set(observations) == set(infos) == set(env.possible_agents)
+    rng = np.random.default_rng(0)
+
+    while env.agents:
+        acting = env.agents
+        observations, rewards, terminations, truncations, infos = env.step({agent: int(rng.integers(4)) for agent in acting})
+        assert set(observations) == set(rewards) == set(terminations) == set(acting)
+        assert all(env.observation_space(agent).contains(observation) for agent, observation in observations.items())
+
+        # Agents that terminated or were truncated are removed
+        assert env.agents == [agent for agent in acting if not (terminations[agent] or truncations[agent])]
+
+def test_missing_or_unknown_actions_raise():
+    env = Multi_Haunted_Mansion(num_agents=3)
+    env.reset(seed=0)
+
+    with pytest.raises(ValueError):
+        env.step({'trick_or_treater_0': 0, 'trick_or_treater_1': 0})
+    with pytest.raises(ValueError):
+        env.step({**{agent: 0 for agent in env.agents}, 'trick_or_treater_9': 0})
+
+def test_candy_goes_to_lowest_index():
+    env = Multi_Haunted_Mansion(num_agents=4)
+    env.reset(seed=2)
+
+    # Every agent on the cell left of the first candy (kept clear of ghosts), all moving right onto it
+    candy = env.candies_location[0].copy()
+    start = candy - [1, 0]
+    env.occupancy[start[0], start[1]] = 0
+    env.agents_location[:] = start
+    _, rewards, _, _ = env.step_arrays(np.zeros(4, dtype=np.int64))
+
+    assert rewards[0] == pytest.approx(env.candy_reward - env.step_penalty)
+    assert np.allclose(rewards[1:], -env.step_penalty)
+    assert (env.candies_location[0] == -1).all()
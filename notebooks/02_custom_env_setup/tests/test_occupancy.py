@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from intermediate_env import Intm_Haunted_Mansion
+import occupancy
+from occupancy import build_occupancy_grid, sample_free_cells, GHOST, CANDY, DOOR
+
+def test_grid_holds_entity_codes():
+    target = np.array([4, 4])
+    ghosts = np.array([[0, 0], [2, 2], [-1, -1]])
+    candies = np.array([[2, 2], [3, 0], [-1, -1]])
+    grid, candy_index = build_occupancy_grid(5, target, ghosts, candies)
+
+    assert grid[4, 4] == DOOR
+    assert grid[0, 0] == GHOST
+    assert grid[2, 2] == GHOST | CANDY
+    assert grid[3, 0] == CANDY
+    assert np.count_nonzero(grid) == 4
+
+    # Collected candies (and unplaced ghosts) at [-1, -1] are left off the grid
+    assert candy_index[2, 2] == 0 and candy_index[3, 0] == 1
+    assert np.count_nonzero(candy_index >= 0) == 2
+
+def place_agent(env, location):
+    env.reset(seed=0)
+    env.agent_location = np.array(location, dtype=np.int64)
+
+def test_step_into_ghost():
+    env = Intm_Haunted_Mansion()
+    place_agent(env, [1, 0])
+    _, reward, terminated, _, _ = env.step(2)  # left onto the ghost at [0, 0]
+
+    assert reward == pytest.approx(-env.ghost_penalty - env.step_penalty)
+    assert not terminated
+
+def test_candy_collected_once():
+    env = Intm_Haunted_Mansion()
+    place_agent(env, [2, 0])
+    _, reward, _, _, _ = env.step(0)  # right onto the candy at [3, 0]
+
+    assert reward == pytest.approx(env.candy_reward - env.step_penalty)
+    assert (env.candies_location[1] == -1).all()
+    assert not env.occupancy[3, 0] & CANDY and env.candy_index[3, 0] == -1
+
+    # Coming back to the cell gives nothing
+    env.step(2)
+    _, reward, _, _, _ = env.step(0)
+    assert reward == pytest.approx(-env.step_penalty)
+
+def test_door_terminates():
+    env = Intm_Haunted_Mansion()
+    place_agent(env, [4, 3])
+    _, reward, terminated, _, _ = env.step(1)  # down onto the door at [4, 4]
+
+    assert terminated
+    assert reward == pytest.approx(env.door_reward - env.step_penalty)
+
+@pytest.mark.parametrize('size', [10, 300])
+def test_sampled_cells_are_free_and_distinct(size):
+    # 300x300 is above SPARSE_SAMPLING_CELLS, so it takes the rejection path
+    rng = np.random.default_rng(0)
+    occupied = rng.random((size, size)) < 0.5
+    cells = sample_free_cells(np.random.default_rng(1), occupied, 40)
+
+    assert cells.shape == (40, 2)
+    assert not occupied[cells[:, 0], cells[:, 1]].any()
+    assert len(np.unique(cells, axis=0)) == 40
+
+    # Deterministic for a given generator state
+    assert np.array_equal(cells, sample_free_cells(np.random.default_rng(1), occupied, 40))
+
+def test_sparse_sampling_falls_back_on_full_grids():
+    # Almost every cell taken: the bounded rejection rounds give up and the exact draw is used
+    size = 300
+    occupied = np.ones((size, size), dtype=bool)
+    free = np.random.default_rng(0).choice(size * size, 50, replace=False)
+    occupied.ravel()[free] = False
+
+    assert occupancy._sample_sparse(np.random.default_rng(0), occupied.ravel(), 50) is None
+    cells = sample_free_cells(np.random.default_rng(0), occupied, 50)
+    assert np.array_equal(np.sort(cells[:, 0] * size + cells[:, 1]), np.sort(free))
+
+def test_too_few_free_cells_raises():
+    occupied = np.ones((5, 5), dtype=bool)
+    occupied[0, :3] = False
+
+    with pytest.raises(ValueError):
+        sample_free_cells(np.random.default_rng(0), occupied, 4)
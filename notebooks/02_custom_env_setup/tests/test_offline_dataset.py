@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+import offline_dataset
+from vector_env import VectorHauntedMansion
+from mdp import MansionMDP, value_iteration
+
+def test_optimal_policy_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(offline_dataset, 'MAX_CACHED_POLICIES', 4)
+    envs = VectorHauntedMansion(8, 'final')
+    envs.reset(seed=0)
+    policy = offline_dataset.OptimalPolicy(envs)
+
+    for _ in range(10):
+        policy(envs)
+        envs.reset()
+        assert len(policy.policies) <= 4
+
+    # Actions are still the value-iteration optimum of each sub-environment's layout
+    for i in range(envs.num_envs):
+        policy.template.ghosts_location = envs.ghosts_location[i].copy()
+        optimum = value_iteration(MansionMDP(policy.template), policy.gamma)[1]
+        state = policy.encoder.encode(envs.agent_location[i], None, envs.candies_location[i])
+        assert policy(envs)[i] == optimum[state]
+
+def test_fill_replay_buffer_copies_whole_rows(tmp_path):
+    buffers = pytest.importorskip('stable_baselines3.common.buffers')
+    offline_dataset.generate_dataset(str(tmp_path), 10, variant='final', num_envs=2, chunk_size=4, seed=0,
+                                     obs_mode='flat')
+    dataset = offline_dataset.OfflineDataset(str(tmp_path))
+    envs = VectorHauntedMansion(4, 'final', obs_mode='flat')
+    buffer = buffers.ReplayBuffer(8, envs.single_observation_space, envs.single_action_space, n_envs=4)
+
+    dataset.fill_replay_buffer(buffer)
+
+    # 10 transitions round down to 2 rows of 4, so the next add() starts on an empty row
+    assert buffer.pos == 2 and not buffer.full
+    copied = buffer.observations[:2].reshape(8, -1)
+    expected = np.concatenate([shard['obs'] for shard in dataset.shards])[:8]
+    np.testing.assert_array_equal(copied, expected.reshape(8, -1))
+    assert not buffer.observations[2:].any()
@@ -0,0 +1,26 @@
+from final_env import Final_Haunted_Mansion
+
+def test_profile_counts_calls():
+    env = Final_Haunted_Mansion(profile=True)
+    env.reset(seed=0)
+    for _ in range(3):
+        env.step(0)
+
+    stats = env.profile_stats()
+    assert stats['reset']['calls'] == 1
+    assert stats['step']['calls'] == 3
+
+def test_reset_stats_then_measure():
+    env = Final_Haunted_Mansion(profile=True)
+    env.reset(seed=0)
+    env.step(0)
+
+    env.profiler.reset_stats()
+    assert env.profile_stats() == {}
+
+    # Calls after the reset are still counted
+    env.step(0)
+    env.step(0)
+    stats = env.profile_stats()
+    assert stats['step']['calls'] == 2
+    assert 'reset' not in stats
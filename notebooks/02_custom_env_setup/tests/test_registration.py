@@ -0,0 +1,81 @@
+import os
+import subprocess
+import sys
+
+import gymnasium as gym
+import pytest
+
+import registration
+from registration import ENV_IDS, register_env, make_vec
+from simple_env import Simple_Haunted_Mansion
+from intermediate_env import Intm_Haunted_Mansion
+from final_env import Final_Haunted_Mansion
+from vector_env import VectorHauntedMansion
+from shared_memory_env import SharedMemoryVectorEnv
+from conftest import NUM_ENVS, assert_same_rollout
+
+CLASSES = {'simple': Simple_Haunted_Mansion, 'intermediate': Intm_Haunted_Mansion, 'final': Final_Haunted_Mansion}
+
+def test_import_does_not_import_the_envs():
+    modules = ['simple_env', 'intermediate_env', 'final_env', 'vector_env', 'shared_memory_env']
+    code = f'import sys, registration; print(any(name in sys.modules for name in {modules}))'
+    result = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(registration.__file__),
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == 'False'
+
+@pytest.mark.parametrize('env_id', list(ENV_IDS))
+def test_make(env_id):
+    variant, env_kwargs = ENV_IDS[env_id]
+    env = gym.make(env_id)
+    try:
+        assert type(env.unwrapped) is CLASSES[variant]
+        assert env.unwrapped.size == env_kwargs.get('size', 5)
+        assert len(getattr(env.unwrapped, 'ghosts_location', ())) == env_kwargs.get('num_ghosts', 0 if variant == 'simple' else 3)
+        for key in ('obs_mode', 'ghost_policy'):
+            if key in env_kwargs:
+                assert getattr(env.unwrapped, key) == env_kwargs[key]
+        env.reset(seed=0)
+    finally:
+        env.close()
+
+@pytest.mark.parametrize('env_id', ['HauntedMansion-Simple-v0', 'HauntedMansion-Final-v0'])
+def test_make_vec_is_natively_batched(env_id):
+    envs = gym.make_vec(env_id, num_envs=NUM_ENVS, vectorization_mode='custom')
+    try:
+        assert type(envs) is VectorHauntedMansion
+        assert_same_rollout(VectorHauntedMansion(NUM_ENVS, ENV_IDS[env_id][0]), envs, num_steps=50)
+    finally:
+        envs.close()
+
+def test_make_vec_moving_ghosts_uses_shared_memory():
+    envs = make_vec('HauntedMansion-Final-Chase-v0', NUM_ENVS, num_workers=2)
+    try:
+        assert type(envs) is SharedMemoryVectorEnv and envs.num_envs == NUM_ENVS
+        assert_same_rollout(SharedMemoryVectorEnv(NUM_ENVS, 'final', num_workers=1, ghost_policy='chase'), envs, num_steps=50)
+    finally:
+        envs.close()
+
+def test_make_vec_forwards_kwargs():
+    envs = make_vec('HauntedMansion-Final-v0', NUM_ENVS, obs_mode='flat')
+    assert envs.obs_mode == 'flat'
+
+    # Arguments given to make_vec take precedence over the registered ones
+    envs = make_vec('HauntedMansion-Final-Large-v0', 2, size=12)
+    assert envs.size == 12 and envs.ghosts_location.shape[1] == 24
+
+def test_register_env():
+    try:
+        register_env('HauntedMansion-Test-v0', 'intermediate', size=7)
+        register_env('HauntedMansion-Test-v0', 'final', size=9)  # Already registered, left as it is
+
+        env = gym.make('HauntedMansion-Test-v0')
+        assert type(env.unwrapped) is Intm_Haunted_Mansion and env.unwrapped.size == 7
+    finally:
+        gym.envs.registry.pop('HauntedMansion-Test-v0', None)
+
+    with pytest.raises(ValueError):
+        register_env('HauntedMansion-Other-v0', 'haunted')
+
+def test_batched_envs_have_no_time_limit():
+    with pytest.raises(ValueError):
+        registration.make_vector_env(2, 'final', max_episode_steps=100)
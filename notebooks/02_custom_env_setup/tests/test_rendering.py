@@ -0,0 +1,23 @@
+import pytest
+
+pytest.importorskip('pygame')
+
+from simple_env import Simple_Haunted_Mansion
+from intermediate_env import Intm_Haunted_Mansion
+from final_env import Final_Haunted_Mansion
+
+@pytest.mark.parametrize('env_class', [Simple_Haunted_Mansion, Intm_Haunted_Mansion, Final_Haunted_Mansion])
+def test_rgb_array_frames_are_distinct(env_class):
+    # Frames kept by the caller (e.g. RecordVideo) must not change when the next one is rendered
+    env = env_class(render_mode='rgb_array')
+    env.reset(seed=0)
+    frames = [env.render()]
+    kept = frames[0].copy()
+
+    for action in (0, 1, 2, 3):
+        env.step(action)
+        frames.append(env.render())
+
+    assert len({id(frame) for frame in frames}) == len(frames)
+    assert (frames[0] == kept).all()
+    env.close()
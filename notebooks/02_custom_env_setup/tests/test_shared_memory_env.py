@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from vector_env import VectorHauntedMansion
+from shared_memory_env import SharedMemoryVectorEnv
+from conftest import NUM_ENVS, assert_same_rollout
+
+@pytest.mark.parametrize('variant, env_kwargs', [('simple', {}), ('final', {}), ('final', {'obs_mode': 'discrete'})])
+def test_shared_memory_matches_vector_env(variant, env_kwargs):
+    reference = VectorHauntedMansion(NUM_ENVS, variant, **env_kwargs)
+    envs = SharedMemoryVectorEnv(NUM_ENVS, variant, num_workers=2, **env_kwargs)
+    try:
+        assert_same_rollout(reference, envs)
+    finally:
+        envs.close()
+
+def test_numpy_integer_seed():
+    envs = SharedMemoryVectorEnv(NUM_ENVS, 'final', num_workers=2)
+    try:
+        observations, _ = envs.reset(seed=np.int64(3))
+        reference, _ = VectorHauntedMansion(NUM_ENVS, 'final').reset(seed=3)
+        assert all(np.array_equal(observations[key], reference[key]) for key in reference)
+    finally:
+        envs.close()
+
+def test_moving_ghosts_match_scalar_envs():
+    # The vectorised engine has no ghost_policy, so the workers step scalar envs, compared here directly
+    envs = SharedMemoryVectorEnv(NUM_ENVS, 'final', num_workers=2, ghost_policy='chase')
+    scalar = [VectorHauntedMansion.variants['final'](ghost_policy='chase') for _ in range(NUM_ENVS)]
+    try:
+        observations, _ = envs.reset(seed=0)
+        for i, env in enumerate(scalar):
+            env.reset(seed=i)
+
+        rng = np.random.default_rng(0)
+        for _ in range(100):
+            actions = rng.integers(0, 4, NUM_ENVS)
+            observations, rewards, terminated, _, _ = envs.step(actions)
+            for i, env in enumerate(scalar):
+                observation, reward, done, _, _ = env.step(actions[i])
+                assert reward == rewards[i] and done == terminated[i]
+                if done:
+                    env.reset()
+                else:
+                    assert np.array_equal(observations['ghosts'][i], observation['ghosts'])
+    finally:
+        envs.close()
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from intermediate_env import Intm_Haunted_Mansion
+from final_env import Final_Haunted_Mansion
+
+@pytest.mark.parametrize('env_class, env_kwargs', [
+    (Intm_Haunted_Mansion, {}),
+    (Final_Haunted_Mansion, {}),
+    (Final_Haunted_Mansion, {'ghost_policy': 'random'}),
+])
+def test_round_trip(env_class, env_kwargs):
+    env = env_class(**env_kwargs)
+    env.reset(seed=1)
+    rng = np.random.default_rng(0)
+    actions = rng.integers(0, 4, 30)
+
+    snapshot = env.get_state()
+    expected = [env.step(action)[:3] for action in actions]
+
+    # Restoring the snapshot replays the same steps (including the ghosts' random moves)
+    env.set_state(snapshot)
+    for action, (observation, reward, terminated) in zip(actions, expected):
+        result = env.step(action)
+        assert all(np.array_equal(result[0][key], observation[key]) for key in observation)
+        assert result[1] == reward and result[2] == terminated
+        if terminated:
+            break
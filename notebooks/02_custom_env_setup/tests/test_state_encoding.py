@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from final_env import Final_Haunted_Mansion
+from state_encoding import StateEncoder
+
+@pytest.mark.parametrize('fixed_ghosts', [True, False])
+def test_encode_decode_round_trip(fixed_ghosts):
+    encoder = StateEncoder(4, 2, 2, fixed_ghosts=fixed_ghosts)
+    indices = np.arange(encoder.num_states)
+    agent, ghosts, collected = encoder.decode(indices)
+
+    candies = np.where(collected[..., None], -1, [[0, 1], [2, 3]])
+    assert np.array_equal(encoder.encode(agent, ghosts, candies), indices)
+
+def test_indices_are_dense_and_distinct():
+    encoder = StateEncoder(3, 1, 1)
+    assert encoder.num_states == 9 * 2 * 9
+
+    agent = np.array([[x, y] for x in range(3) for y in range(3)])
+    ghosts = agent[::-1, None, :]
+    candies = np.tile([[[1, 1]]], (9, 1, 1))
+    indices = encoder.encode(agent, ghosts, candies)
+    assert len(np.unique(indices)) == 9 and indices.min() >= 0 and indices.max() < encoder.num_states
+
+def test_discrete_observation_matches_state_index():
+    env = Final_Haunted_Mansion(obs_mode='discrete')
+    observation, _ = env.reset(seed=0)
+    assert env.observation_space.contains(observation)
+
+    for action in (0, 1, 2, 3):
+        observation, _, terminated, _, _ = env.step(action)
+        assert observation == env.state_index()
+        assert env.state_encoder.decode(observation)[0].tolist() == env.agent_location.tolist()
+        if terminated:
+            break
+
+def test_too_many_states_raises():
+    encoder = StateEncoder(1000, 10, 10)
+    assert not encoder.indexable
+    with pytest.raises(ValueError):
+        encoder.encode(np.zeros(2), np.zeros((10, 2)), np.zeros((10, 2)))
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+from intermediate_env import Intm_Haunted_Mansion
+from mdp import MansionMDP, optimality_gap
+from tabular_trainer import TabularTrainer
+
+def test_obs_mode_in_env_kwargs():
+    # 'discrete' is what the trainer uses anyway, anything else can't index the Q-table
+    TabularTrainer(4, 'intermediate', obs_mode='discrete')
+    with pytest.raises(ValueError):
+        TabularTrainer(4, 'intermediate', obs_mode='flat')
+
+def test_q_learning_finds_optimal_policy():
+    trainer = TabularTrainer(64, 'intermediate', epsilon=0.2, alpha=0.5, seed=0)
+    trainer.train(100_000)
+
+    env = Intm_Haunted_Mansion()
+    env.reset(seed=0)
+    mdp = MansionMDP(env)
+    assert optimality_gap(mdp, trainer.greedy_policy()) == pytest.approx(0.0, abs=1e-6)
+    assert optimality_gap(mdp, np.zeros(mdp.num_states, dtype=np.int64)) > 1
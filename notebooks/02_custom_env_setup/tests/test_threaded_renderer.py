@@ -0,0 +1,64 @@
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip('pygame')
+
+from intermediate_env import Intm_Haunted_Mansion
+from final_env import Final_Haunted_Mansion
+from threaded_renderer import ThreadedRenderer
+
+@pytest.fixture(autouse=True)
+def headless(monkeypatch):
+    # The render thread opens a real window, SDL's dummy driver draws it without a display
+    monkeypatch.setenv('SDL_VIDEODRIVER', 'dummy')
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.perf_counter() + timeout
+    while not condition() and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def frame(column):
+    return (4, 4), (('ghost', np.array([[1, 1]])), ('agent', np.array([[column, 0]])))
+
+def test_latest_frame_is_drawn_and_stale_ones_dropped():
+    renderer = ThreadedRenderer(5, 200, render_fps=2)
+    renderer.publish(*frame(0))
+    assert wait_for(lambda: renderer.stats()['drawn'] == 1)
+
+    # Published faster than render_fps, only the newest frame is kept
+    for column in range(1, 5):
+        renderer.publish(*frame(column))
+    assert renderer.latest[1][1][1].tolist() == [[4, 0]]
+    assert wait_for(lambda: renderer.stats()['drawn'] == 2)
+
+    renderer.close()
+    assert not renderer.thread.is_alive()
+    assert renderer.stats() == {'published': 5, 'drawn': 2, 'dropped': 3}
+
+    # Nothing is published after close
+    renderer.publish(*frame(0))
+    assert renderer.stats()['published'] == 5
+
+@pytest.mark.parametrize('env_class', [Intm_Haunted_Mansion, Final_Haunted_Mansion])
+def test_human_async_steps_do_not_wait_for_frames(env_class):
+    env = env_class(render_mode='human_async')
+    env.metadata = {**env.metadata, 'render_fps': 1}
+    env.reset(seed=0)
+
+    start = time.perf_counter()
+    for action in np.random.default_rng(0).integers(0, 4, 100).tolist():
+        if env.step(action)[2]:
+            env.reset()
+    elapsed = time.perf_counter() - start
+
+    # One frame per second is drawn, 100 steps don't wait a second for each
+    renderer = env.renderer
+    assert elapsed < 1.0
+    assert renderer.stats()['published'] >= 101
+    assert renderer.stats()['drawn'] <= 2
+
+    env.close()
+    assert env.renderer is None and not renderer.thread.is_alive()
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from final_env import Final_Haunted_Mansion
+from trajectory import TrajectoryRecorder, TrajectoryReader
+
+def test_replay_matches_recording(tmp_path):
+    env = TrajectoryRecorder(Final_Haunted_Mansion(), str(tmp_path), record_rewards=True, record_terminals=True, seed=0)
+    rng = np.random.default_rng(0)
+    recorded = []
+
+    for _ in range(5):
+        env.reset()
+        rewards = []
+        for _ in range(200):
+            _, reward, terminated, truncated, _ = env.step(int(rng.integers(0, 4)))
+            rewards.append(reward)
+            if terminated or truncated:
+                break
+        recorded.append(rewards)
+    env.close()
+
+    reader = TrajectoryReader(str(tmp_path))
+    assert len(reader) == 5
+
+    # replay() raises if a reward or terminated flag differs, the rewards are also compared here
+    for i, rewards in enumerate(recorded):
+        steps = list(reader.replay(Final_Haunted_Mansion(), i))[1:]
+        assert [step[1] for step in steps] == rewards
+
+def record(path, num_episodes: int, **recorder_kwargs):
+    env = TrajectoryRecorder(Final_Haunted_Mansion(), str(path), seed=0, **recorder_kwargs)
+    for _ in range(num_episodes):
+        env.reset()
+        for action in (0, 1, 2, 3):
+            env.step(action)
+    env.close()
+
+def test_append_with_same_flags(tmp_path):
+    record(tmp_path, 2, record_rewards=True)
+    record(tmp_path, 3, record_rewards=True)
+
+    reader = TrajectoryReader(str(tmp_path))
+    assert len(reader) == 5
+    for i in range(5):
+        list(reader.replay(Final_Haunted_Mansion(), i))
+
+@pytest.mark.parametrize('first, second', [
+    ({}, {'record_rewards': True}),
+    ({'record_rewards': True}, {}),
+    ({'record_terminals': True}, {'record_rewards': True, 'record_terminals': True}),
+])
+def test_append_with_other_flags_raises(tmp_path, first, second):
+    record(tmp_path, 2, **first)
+    with pytest.raises(ValueError):
+        record(tmp_path, 1, **second)
+
+    # The recording is left as it was
+    assert len(TrajectoryReader(str(tmp_path))) == 2
+
+def test_reader_rejects_misaligned_files(tmp_path):
+    record(tmp_path, 2, record_rewards=True)
+    with open(tmp_path / 'rewards.bin', 'ab') as f:
+        f.write(np.zeros(3, dtype=np.float32).tobytes())
+
+    with pytest.raises(ValueError):
+        TrajectoryReader(str(tmp_path))
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from vector_env import VectorHauntedMansion
+from conftest import NUM_ENVS, same
+
+@pytest.mark.parametrize('variant, env_kwargs', [
+    ('simple', {}),
+    ('intermediate', {}),
+    ('final', {}),
+    ('final', {'obs_mode': 'flat'}),
+    ('final', {'obs_mode': 'discrete'}),
+])
+def test_matches_scalar_envs(variant, env_kwargs):
+    # Sub-environment i reset with seed + i gives the same transitions as the scalar env with that seed
+    venv = VectorHauntedMansion(NUM_ENVS, variant, **env_kwargs)
+    envs = [VectorHauntedMansion.variants[variant](**env_kwargs) for _ in range(NUM_ENVS)]
+
+    observations, infos = venv.reset(seed=7)
+    outputs = [env.reset(seed=7 + i) for i, env in enumerate(envs)]
+    rng = np.random.default_rng(0)
+    episodes = 0
+
+    for _ in range(500):
+        for i, (observation, info) in enumerate(outputs):
+            assert same(venv._get_single_obs(observations, i), observation)
+            assert infos['distance'][i] == info['distance']
+
+        actions = rng.integers(0, 4, NUM_ENVS)
+        observations, rewards, terminated, truncated, infos = venv.step(actions)
+
+        outputs = []
+        for i, env in enumerate(envs):
+            observation, reward, done, _, info = env.step(actions[i])
+            assert reward == rewards[i] and done == terminated[i]
+            if done:
+                episodes += 1
+                assert same(infos['final_observation'][i], observation)
+                observation, info = env.reset()
+            outputs.append((observation, info))
+
+    assert episodes > 0
+
+def test_simple_state_index_is_agent_cell():
+    venv = VectorHauntedMansion(NUM_ENVS, 'simple')
+    venv.reset(seed=0)
+
+    agent = venv.agent_location
+    assert np.array_equal(venv.state_index(), agent[:, 0] * venv.size + agent[:, 1])
+
+def test_simple_rejects_other_obs_modes():
+    with pytest.raises(ValueError):
+        VectorHauntedMansion(NUM_ENVS, 'simple', obs_mode='discrete')
+
+def test_numpy_integer_seed():
+    # A NumPy integer seeds like an int (sub-environment i gets seed + i)
+    venv = VectorHauntedMansion(NUM_ENVS, 'final')
+    other = VectorHauntedMansion(NUM_ENVS, 'final')
+
+    assert same(venv.reset(seed=np.int64(3))[0], other.reset(seed=3)[0])
+    assert same(venv.reset(seed=np.arange(NUM_ENVS))[0], other.reset(seed=list(range(NUM_ENVS)))[0])
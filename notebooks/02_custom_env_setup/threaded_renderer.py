@@ -0,0 +1,156 @@
+import threading
+import time
+
+# Longest the render thread goes without pumping pygame events, so the window stays responsive even
+# at a low render_fps
+EVENT_INTERVAL = 0.05
+
+class ThreadedRenderer:
+
+    ##########################################################################
+    # Init
+    ##########################################################################
+
+    def __init__(self, size: int, screen_size: int, render_fps: float, caption: str = 'Trick or ReTreat: Escape the Mansion!'):
+        '''
+        Description:
+            Draws the mansion in a pygame window from a background thread (the 'human_async' render
+            mode). The env only publishes small copies of its entity locations with publish(), which
+            never waits on the display: the thread draws the latest published frame at most
+            render_fps times per second and frames published in between are dropped, not queued.
+
+            The thread owns pygame (init, window, events, quit), the env's thread never touches it.
+            Some platforms (macOS) only allow windows on the main thread, use 'human' there.
+
+        Inputs:
+            size: int
+                Number of cells along each side of the grid.
+
+            screen_size: int
+                Pixel size of the (square) window.
+
+            render_fps: float
+                Maximum frames drawn per second.
+
+            caption: str
+                Window title.
+
+        Outputs:
+            published: int
+                Number of frames published by the env.
+
+            drawn: int
+                Number of frames drawn, the others were dropped.
+        '''
+        self.size = size
+        self.screen_size = screen_size
+        self.frame_interval = 1 / render_fps
+        self.caption = caption
+
+        # Most recent frame, replaced by every publish() (a single slot, so stale frames are dropped)
+        self.latest = None
+        self.published = 0
+        self.drawn = 0
+
+        self.new_frame = threading.Event()
+        self.closed = threading.Event()
+
+        self.thread = threading.Thread(target=self._run, name='mansion-renderer', daemon=True)
+        self.thread.start()
+
+    ##########################################################################
+    # Publishing Frames (env thread)
+    ##########################################################################
+
+    def publish(self, door, groups):
+        '''
+        Description:
+            Hands a frame to the render thread and returns straight away. Does nothing once the window
+            was closed.
+
+        Inputs:
+            door: tuple
+                (column, row) cell of the door on the screen.
+
+            groups: sequence
+                (sprite name, (no entities, 2) array of (column, row) cells) pairs in drawing order (see
+                SpriteCache.cell_sprites()). The arrays must not be changed afterwards, pass copies.
+        '''
+        if self.closed.is_set():
+            return
+
+        # Replacing the reference is atomic, the render thread sees either the old or the new frame
+        self.latest = (door, groups)
+        self.published += 1
+
+        # Setting the event takes a lock, skipped while the last frame is still waiting to be drawn
+        if not self.new_frame.is_set():
+            self.new_frame.set()
+
+    def stats(self):
+        '''
+        Description:
+            Returns the number of frames published, drawn and dropped so far.
+        '''
+        return {'published': self.published, 'drawn': self.drawn, 'dropped': self.published - self.drawn}
+
+    ##########################################################################
+    # Drawing (render thread)
+    ##########################################################################
+
+    def _run(self):
+        # Render thread: owns the window, draws the latest frame at most every frame_interval
+        import pygame
+        from sprite_cache import SpriteCache
+
+        pygame.init()
+        screen = pygame.display.set_mode((self.screen_size, self.screen_size))
+        pygame.display.set_caption(self.caption)
+
+        sprite_cache = SpriteCache()
+        sprite_cache.build(self.size, self.screen_size)
+
+        next_draw = 0.0
+        try:
+            while not self.closed.is_set():
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        self.closed.set()
+
+                now = time.perf_counter()
+                if now >= next_draw and self.new_frame.is_set():
+                    self.new_frame.clear()
+                    door, groups = self.latest
+
+                    # Only the cells that changed since the last drawn frame are redrawn and pushed
+                    sprite_cache.build_static(door)
+                    rects = sprite_cache.draw(screen, sprite_cache.cell_sprites(groups))
+                    if rects is None:
+                        pygame.display.update()
+                    elif rects:
+                        pygame.display.update(rects)
+
+                    self.drawn += 1
+                    next_draw = now + self.frame_interval
+
+                # Sleeping until the next frame is due or published, waking up to pump events
+                elif now < next_draw:
+                    self.closed.wait(min(next_draw - now, EVENT_INTERVAL))
+                else:
+                    self.new_frame.wait(EVENT_INTERVAL)
+        finally:
+            pygame.quit()
+
+    ##########################################################################
+    # Close
+    ##########################################################################
+
+    def close(self):
+        '''
+        Description:
+            Stops the render thread and closes the window.
+        '''
+        self.closed.set()
+        self.new_frame.set()
+        if self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join()
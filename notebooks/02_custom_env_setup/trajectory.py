@@ -0,0 +1,257 @@
+import os
+
+import numpy as np
+import gymnasium as gym
+
+# One record per episode in index.bin: reset seed, offset of its first action, number of steps and
+# whether it ended (terminated/truncated) or was cut short by a reset()/close()
+INDEX_DTYPE = np.dtype([('seed', '<i8'), ('start', '<i8'), ('length', '<i4'), ('done', 'u1')])
+
+# Files of a recording directory (all raw little-endian arrays that can be memory-mapped)
+INDEX_FILE = 'index.bin'
+ACTIONS_FILE = 'actions.bin'
+REWARDS_FILE = 'rewards.bin'
+TERMINALS_FILE = 'terminals.bin'
+
+##########################################################################
+# Recording
+##########################################################################
+
+class TrajectoryRecorder(gym.Wrapper):
+
+    def __init__(self, env, path: str, record_rewards: bool = False, record_terminals: bool = False, seed: int = None):
+        '''
+        Description:
+            Records every episode as its reset seed plus an int8 array of actions (and optionally the
+            rewards and terminated flags), appended to raw files in the directory `path`. The
+            environments are deterministic given the reset seed, so TrajectoryReader.replay() rebuilds
+            any episode exactly.
+
+            Actions are kept in a Python list during the episode and written with one call when it
+            ends, so recording costs one list append per step. An episode of n steps takes n bytes
+            (plus 21 bytes of index), millions of episodes fit in a few hundred MB.
+
+            reset() without a seed still gets one: the recorder draws it, so every episode can be
+            replayed on its own (each episode is then seeded, unlike plain unseeded resets).
+
+        Inputs:
+            env: gym.Env
+                The environment to record (a Haunted Mansion, or any env with up to 128 discrete actions).
+
+            path: str
+                Directory of the recording, created if needed. Existing recordings are appended to, with
+                the same record_rewards/record_terminals flags they were made with (ValueError otherwise).
+
+            record_rewards: bool
+                Also store the rewards (float32), to check replays or inspect episodes without replaying.
+
+            record_terminals: bool
+                Also store the terminated flags.
+
+            seed: int
+                Seeds the draws of the reset seeds.
+        '''
+        super().__init__(env)
+        self.path = path
+        self.record_rewards = record_rewards
+        self.record_terminals = record_terminals
+        self.seed_rng = np.random.default_rng(seed)
+
+        os.makedirs(path, exist_ok=True)
+        _check_aligned(path, record_rewards, record_terminals)
+
+        self.index_file = open(os.path.join(path, INDEX_FILE), 'ab')
+        self.actions_file = open(os.path.join(path, ACTIONS_FILE), 'ab')
+        self.rewards_file = open(os.path.join(path, REWARDS_FILE), 'ab') if record_rewards else None
+        self.terminals_file = open(os.path.join(path, TERMINALS_FILE), 'ab') if record_terminals else None
+
+        # Offset of the next episode's first action (appending after what is already recorded)
+        self.num_recorded_steps = self.actions_file.tell()
+
+        self.episode_seed = None
+        self.actions, self.rewards, self.terminals = [], [], []
+
+    def reset(self, *, seed: int = None, options: dict = None):
+        '''
+        Description:
+            Ends the current episode (if any) and starts a new one with `seed`, or a drawn seed.
+        '''
+        self._end_episode(done=False)
+
+        if seed is None:
+            seed = int(self.seed_rng.integers(0, 2**63 - 1))
+        self.episode_seed = seed
+
+        return self.env.reset(seed=seed, options=options)
+
+    def step(self, action):
+        '''
+        Description:
+            Steps the environment and records the action (and reward/terminated flag).
+        '''
+        observation, reward, terminated, truncated, info = self.env.step(action)
+
+        self.actions.append(int(action))
+        if self.record_rewards:
+            self.rewards.append(reward)
+        if self.record_terminals:
+            self.terminals.append(terminated)
+
+        if terminated or truncated:
+            self._end_episode(done=True)
+
+        return observation, reward, terminated, truncated, info
+
+    def _end_episode(self, done: bool):
+        # Appending the finished episode to the files (nothing if no step was taken)
+        if not self.actions:
+            return
+
+        self.actions_file.write(np.asarray(self.actions, dtype=np.int8).tobytes())
+        if self.record_rewards:
+            self.rewards_file.write(np.asarray(self.rewards, dtype=np.float32).tobytes())
+        if self.record_terminals:
+            self.terminals_file.write(np.asarray(self.terminals, dtype=np.bool_).tobytes())
+
+        record = np.array([(self.episode_seed, self.num_recorded_steps, len(self.actions), done)], dtype=INDEX_DTYPE)
+        self.index_file.write(record.tobytes())
+
+        self.num_recorded_steps += len(self.actions)
+        self.actions, self.rewards, self.terminals = [], [], []
+
+    def flush(self):
+        '''
+        Description:
+            Flushes the files so a TrajectoryReader sees every finished episode.
+        '''
+        for f in (self.index_file, self.actions_file, self.rewards_file, self.terminals_file):
+            if f is not None:
+                f.flush()
+
+    def close(self):
+        '''
+        Description:
+            Records the current (unfinished) episode, closes the files and the environment.
+        '''
+        if self.index_file is not None:
+            self._end_episode(done=False)
+            for f in (self.index_file, self.actions_file, self.rewards_file, self.terminals_file):
+                if f is not None:
+                    f.close()
+            self.index_file = None
+
+        super().close()
+
+##########################################################################
+# Reading and Replaying
+##########################################################################
+
+def _num_records(path: str, dtype):
+    # Number of records in a raw array file, 0 if it doesn't exist
+    return os.path.getsize(path) // np.dtype(dtype).itemsize if os.path.exists(path) else 0
+
+def _check_aligned(path: str, record_rewards: bool, record_terminals: bool):
+    '''
+    Description:
+        Checks that the rewards/terminals files of a recording line up with its actions: each holds
+        one record per recorded step, or none if it was never recorded. Episodes are sliced out of all
+        files with the same offsets, so appending with different flags would shift every later episode.
+
+    Inputs:
+        path: str
+            Directory of the recording.
+
+        record_rewards, record_terminals: bool
+            Whether the rewards/terminals are (to be) recorded.
+    '''
+    num_steps = _num_records(os.path.join(path, ACTIONS_FILE), np.int8)
+
+    for name, recorded, dtype in ((REWARDS_FILE, record_rewards, np.float32), (TERMINALS_FILE, record_terminals, np.bool_)):
+        count = _num_records(os.path.join(path, name), dtype)
+        if count != (num_steps if recorded else 0):
+            raise ValueError(
+                f'{os.path.join(path, name)} has {count} records for {num_steps} recorded steps, append with '
+                f'the record_rewards/record_terminals flags the recording was made with, or use a new directory'
+            )
+
+def _memmap(path: str, dtype):
+    # Memory-maps a raw array file (np.memmap can't map an empty or missing file)
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r')
+
+class TrajectoryReader:
+
+    def __init__(self, path: str):
+        '''
+        Description:
+            Reads a recording made by TrajectoryRecorder. The files are memory-mapped, episodes are only
+            read from disk when accessed. Raises a ValueError if the rewards/terminals files don't line up
+            with the actions (see _check_aligned()).
+
+        Inputs:
+            path: str
+                Directory of the recording.
+
+        Outputs:
+            index: array
+                Structured array (INDEX_DTYPE) with one record per episode.
+        '''
+        self.path = path
+        _check_aligned(
+            path,
+            _num_records(os.path.join(path, REWARDS_FILE), np.float32) > 0,
+            _num_records(os.path.join(path, TERMINALS_FILE), np.bool_) > 0,
+        )
+
+        self.index = _memmap(os.path.join(path, INDEX_FILE), INDEX_DTYPE)
+        self.actions = _memmap(os.path.join(path, ACTIONS_FILE), np.int8)
+        self.rewards = _memmap(os.path.join(path, REWARDS_FILE), np.float32)
+        self.terminals = _memmap(os.path.join(path, TERMINALS_FILE), np.bool_)
+
+    def __len__(self):
+        return len(self.index)
+
+    def episode(self, i: int):
+        '''
+        Description:
+            Returns episode i as a dict with its 'seed', 'actions', 'done' flag and, if recorded,
+            'rewards' and 'terminals' (views of the memory-mapped files).
+        '''
+        seed, start, length, done = self.index[i].tolist()
+        episode = {'seed': seed, 'actions': self.actions[start:start + length], 'done': bool(done)}
+        if len(self.rewards):
+            episode['rewards'] = self.rewards[start:start + length]
+        if len(self.terminals):
+            episode['terminals'] = self.terminals[start:start + length]
+
+        return episode
+
+    def replay(self, env, i: int, check: bool = True):
+        '''
+        Description:
+            Replays episode i on `env` (which must be built like the recorded one) through
+            reset(seed=...) and step(). Yields the reset output first, then the output of every step.
+
+        Inputs:
+            env: gym.Env
+                A fresh environment, built with the same arguments as the recorded one.
+
+            i: int
+                Index of the episode.
+
+            check: bool
+                If True, raises a RuntimeError as soon as a reward or terminated flag differs from the
+                recording (when they were recorded).
+        '''
+        episode = self.episode(i)
+        yield env.reset(seed=episode['seed'])
+
+        rewards, terminals = episode.get('rewards'), episode.get('terminals')
+        for t, action in enumerate(episode['actions'].tolist()):
+            result = env.step(action)
+            if check and rewards is not None and np.float32(result[1]) != rewards[t]:
+                raise RuntimeError(f'Episode {i} diverged at step {t}: reward {result[1]} != recorded {rewards[t]}')
+            if check and terminals is not None and bool(result[2]) != terminals[t]:
+                raise RuntimeError(f'Episode {i} diverged at step {t}: terminated {result[2]} != recorded {terminals[t]}')
+            yield result
@@ -0,0 +1,384 @@
+import numbers
+
+import numpy as np
+import gymnasium as gym
+from gymnasium.utils import seeding
+
+from simple_env import Simple_Haunted_Mansion
+from intermediate_env import Intm_Haunted_Mansion
+from final_env import Final_Haunted_Mansion
+from occupancy import build_occupancy_grid, sample_free_cells
+from action_mask import batched_action_masks
+from state_encoding import StateEncoder
+
+class VectorHauntedMansion(gym.vector.VectorEnv):
+
+    # Defining metadata (no rendering for the batched engine, sub-environments autoreset)
+    metadata = {'render_modes' : [], 'autoreset': True}
+
+    # Scalar environment class each variant mirrors (rules, rewards and layout are read from it)
+    variants = {
+        'simple': Simple_Haunted_Mansion,
+        'intermediate': Intm_Haunted_Mansion,
+        'final': Final_Haunted_Mansion,
+    }
+
+    ##########################################################################
+    # Init
+    ##########################################################################
+
+    def __init__(self, num_envs: int = 64, variant: str = 'final', copy: bool = True, **env_kwargs):
+        '''
+        Description:
+            Initialises a batch of `num_envs` Haunted Mansions that are all stepped with one vectorised
+            NumPy update. State is kept as structure-of-arrays buffers (one array per entity type with
+            a leading `num_envs` axis) instead of one Python object per environment.
+
+            Transitions are identical to the scalar classes: sub-environment i reset with seed s gives
+            the same observations, rewards and terminations as `env_class().reset(seed=s)`.
+
+        Inputs:
+            num_envs: int
+                Number of environments stepped in parallel, 64 for default.
+
+            variant: str
+                Which scalar environment to mirror: 'simple', 'intermediate' or 'final' (default).
+
+            copy: bool
+                If True (default) observations are returned as copies of the internal buffers,
+                otherwise the buffers themselves are returned and change on the next step.
+
+            env_kwargs: dict
+                Passed to the scalar environment class (e.g. size, step_penalty).
+
+        Outputs:
+            agent_location: array
+                Agent locations, shape (num_envs, 2).
+
+            target_location: array
+                Door locations, shape (num_envs, 2).
+
+            ghosts_location: array
+                Ghost locations, shape (num_envs, no ghosts, 2).
+
+            candies_location: array
+                Candy locations, shape (num_envs, no candies, 2), collected candies are set to [-1, -1].
+        '''
+        if variant not in self.variants:
+            raise ValueError(f'Unknown variant {variant!r}, expected one of {list(self.variants)}')
+
+        if variant == 'simple' and env_kwargs.get('obs_mode', 'dict') != 'dict':
+            raise ValueError(f"The simple variant only has 'dict' observations, got obs_mode={env_kwargs['obs_mode']!r}")
+
+        # Template scalar env, never stepped, only used to read the layout, rules and spaces
+        env_kwargs['render_mode'] = None
+        template = self.variants[variant](**env_kwargs)
+
+        if getattr(template, 'ghost_policy', None) is not None:
+            raise ValueError('Moving ghosts (ghost_policy) are not supported, use SharedMemoryVectorEnv to batch them')
+
+        super().__init__(num_envs, template.observation_space, template.action_space)
+
+        self.variant = variant
+        self.copy = copy
+        self.size = template.size
+
+        # Rewards and penalties (the simple env only rewards reaching the door)
+        self.door_reward = template.door_reward
+        self.ghost_penalty = getattr(template, 'ghost_penalty', 0)
+        self.candy_reward = getattr(template, 'candy_reward', 0)
+        self.step_penalty = getattr(template, 'step_penalty', 0)
+
+        # BFS distance field to the door (shared with the scalar envs of the same layout) and the shaping reward
+        self.door_distance = template.door_distance
+        self.shaping_scale = template.shaping_scale
+        self.shaping_gamma = template.shaping_gamma
+
+        # Observation format of the scalar env ('dict', 'discrete' state indices or 'flat'), with its state encoder
+        self.obs_mode = getattr(template, 'obs_mode', 'dict')
+        self.state_encoder = getattr(template, 'state_encoder', None)
+
+        # The simple env's state is only the agent cell (the door never moves), encoded the same way
+        if self.state_encoder is None:
+            self.state_encoder = StateEncoder(self.size, 0, 0, fixed_ghosts=True)
+
+        # Only the final env randomises the ghosts in reset(), the intermediate ghosts are fixed
+        self.random_ghosts = variant == 'final'
+
+        # Actions as an index into a (4, 2) direction table so a batch of actions is one fancy index
+        self.directions = np.array([template.action_to_direction[a] for a in range(4)], dtype=np.int64)
+
+        # Valid-action table of the scalar env and which mask goes into info (see action_mask.py)
+        self.boundary_masks = template.boundary_masks
+        self.action_mask = template.action_mask
+
+        # Layout the scalar env starts from (ghosts/candies are empty for the simple env)
+        self.initial_target = template.target_location.copy()
+        self.initial_ghosts = np.asarray(getattr(template, 'ghosts_location', np.zeros((0, 2))), dtype=np.int64)
+        self.initial_candies = np.asarray(getattr(template, 'initial_candies', np.zeros((0, 2))), dtype=np.int64)
+
+        # Cells ghosts can never be placed on in reset() (door and candies), the agent is added per reset
+        self.ghost_blocked = build_occupancy_grid(
+            self.size, self.initial_target, np.empty((0, 2), dtype=np.int64), self.initial_candies
+        )[0] != 0
+
+        # Structure-of-arrays state buffers for all sub-environments
+        self.agent_location = np.full((num_envs, 2), -1, dtype=np.int64)
+        self.target_location = np.tile(self.initial_target, (num_envs, 1))
+        self.ghosts_location = np.tile(self.initial_ghosts, (num_envs, 1, 1))
+        self.candies_location = np.tile(self.initial_candies, (num_envs, 1, 1))
+
+        # Preallocated (num_envs, obs size) buffer for 'flat' observations, same layout as the scalar env
+        if self.obs_mode == 'flat':
+            self.flat_obs = np.zeros((num_envs,) + template.observation_space.shape, dtype=np.int64)
+
+        # One random generator per sub-environment so each reset draws exactly what the scalar env draws
+        self.np_randoms = [None] * num_envs
+
+        template.close()
+
+    ##########################################################################
+    # Returning Observations and Info
+    ##########################################################################
+
+    def _get_obs(self):
+        '''
+        Description:
+            Returns the batched observations for every sub-environment.
+
+        Outputs:
+            observations: dict
+                Location of the agents, targets (and ghosts/candies) with a leading `num_envs` axis,
+                an array of state indices if obs_mode is 'discrete', or a (num_envs, obs size) array
+                if obs_mode is 'flat'.
+        '''
+        if self.obs_mode == 'discrete':
+            return self.state_index()
+
+        if self.obs_mode == 'flat':
+            num_ghosts = self.ghosts_location.shape[1]
+            self.flat_obs[:, 0:2] = self.agent_location
+            self.flat_obs[:, 2:4] = self.target_location
+            self.flat_obs[:, 4:4 + 2 * num_ghosts] = self.ghosts_location.reshape(self.num_envs, -1)
+            self.flat_obs[:, 4 + 2 * num_ghosts:] = self.candies_location.reshape(self.num_envs, -1)
+            return self.flat_obs.copy() if self.copy else self.flat_obs
+
+        observation = {'agent': self.agent_location, 'target': self.target_location}
+        if self.variant != 'simple':
+            observation['ghosts'] = self.ghosts_location
+            observation['candies'] = self.candies_location
+
+        if self.copy:
+            observation = {key: value.copy() for key, value in observation.items()}
+
+        return observation
+
+    def _get_info(self):
+        '''
+        Description:
+            Returns the batched info, using the vector env convention of a `_key` mask per key.
+
+        Outputs:
+            information: dict
+                Distance between each agent and its door, looked up in the BFS distance field, and the
+                valid actions of every sub-environment if action_mask is set.
+        '''
+        distance = self.door_distance[self.agent_location[:, 0], self.agent_location[:, 1]].astype(np.float64)
+        info = {'distance': distance, '_distance': np.ones(self.num_envs, dtype=bool)}
+
+        if self.action_mask is not None:
+            info['action_mask'] = self.action_masks()
+            info['_action_mask'] = info['_distance']
+
+        return info
+
+    def action_masks(self):
+        '''
+        Description:
+            Returns the valid actions of every sub-environment with one batched lookup (see
+            Final_Haunted_Mansion.action_masks()).
+
+        Outputs:
+            masks: array
+                Boolean array of shape (num_envs, 4).
+        '''
+        ghosts = self.ghosts_location if self.action_mask == 'hazard' else None
+        return batched_action_masks(self.boundary_masks, self.agent_location, self.directions, ghosts)
+
+    def _get_single_obs(self, observation, i):
+        '''
+        Description:
+            Returns the observation of sub-environment i from a batched observation, in the format of
+            the scalar env.
+        '''
+        if self.obs_mode == 'discrete':
+            return int(observation[i])
+
+        if self.obs_mode == 'flat':
+            return observation[i].copy()
+
+        return {key: value[i].copy() for key, value in observation.items()}
+
+    def state_index(self):
+        '''
+        Description:
+            Returns the state index (see StateEncoder) of every sub-environment, in one vectorised call.
+
+            For the simple variant the index is the agent cell, x * size + y.
+
+        Outputs:
+            index: array
+                int64 array of shape (num_envs,).
+        '''
+        return self.state_encoder.encode(self.agent_location, self.ghosts_location, self.candies_location)
+
+    ##########################################################################
+    # Resetting the Environments
+    ##########################################################################
+
+    def _reset_env(self, i, seed: int = None):
+        '''
+        Description:
+            Resets sub-environment i, drawing from its random generator in the same order as the
+            scalar env's reset() so that both give the same layout for the same seed.
+
+        Inputs:
+            i: int
+                Index of the sub-environment.
+
+            seed: int
+                Seed for the sub-environment, None keeps using its current generator.
+        '''
+        if seed is not None or self.np_randoms[i] is None:
+            self.np_randoms[i], _ = seeding.np_random(seed)
+        rng = self.np_randoms[i]
+
+        # Agent is randomly placed on the grid
+        agent = rng.integers(0, self.size, size=2, dtype=np.int64)
+        self.agent_location[i] = agent
+
+        # Candies are put back on the grid
+        self.candies_location[i] = self.initial_candies
+
+        if self.random_ghosts:
+            # Same draw as Final_Haunted_Mansion.reset: all ghosts at once from the free cells
+            # The agent's cell is blocked while sampling (no copy of the grid, reset cost stays flat on big grids)
+            blocked = self.ghost_blocked[agent[0], agent[1]]
+            self.ghost_blocked[agent[0], agent[1]] = True
+            self.ghosts_location[i] = sample_free_cells(rng, self.ghost_blocked, self.ghosts_location.shape[1])
+            self.ghost_blocked[agent[0], agent[1]] = blocked
+
+    def reset_wait(self, seed=None, options: dict = None):
+        '''
+        Description:
+            Resets all sub-environments.
+
+        Inputs:
+            seed: int or list
+                An int seeds sub-environment i with `seed + i`, a list gives one seed per sub-environment.
+
+        Outputs:
+            information:
+                Batched initial observations and info.
+        '''
+        # NumPy integers count as ints, and every seed is passed on as a Python int (see seeding.np_random)
+        if seed is None or isinstance(seed, numbers.Integral):
+            seeds = [None if seed is None else int(seed) + i for i in range(self.num_envs)]
+        else:
+            seeds = [None if env_seed is None else int(env_seed) for env_seed in seed]
+            if len(seeds) != self.num_envs:
+                raise ValueError(f'Expected {self.num_envs} seeds, got {len(seeds)}')
+
+        for i, env_seed in enumerate(seeds):
+            self._reset_env(i, env_seed)
+
+        return self._get_obs(), self._get_info()
+
+    ##########################################################################
+    # Step
+    ##########################################################################
+
+    def step_async(self, actions):
+        '''
+        Description:
+            Stores the batch of actions for step_wait().
+        '''
+        self._actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+
+    def step_wait(self):
+        '''
+        Description:
+            Advances every sub-environment by one step with vectorised NumPy operations, then resets
+            the sub-environments that finished.
+
+        Outputs:
+            observation:
+                Batched observations (of the new episode for sub-environments that were reset).
+
+            reward:
+                Array of rewards, shape (num_envs,).
+
+            terminated:
+                Array of flags, True where the agent reached the door.
+
+            truncated:
+                Array of flags, always False (no time limit in the scalar envs).
+
+            info:
+                Batched info, with `final_observation`/`final_info` for finished sub-environments.
+        '''
+        # Distances before the move, for the shaping reward
+        if self.shaping_scale:
+            previous = self.door_distance[self.agent_location[:, 0], self.agent_location[:, 1]]
+
+        # Moving all agents at once, clipping to stay within the grid bounds
+        np.clip(self.agent_location + self.directions[self._actions], 0, self.size - 1, out=self.agent_location)
+
+        truncated = np.zeros(self.num_envs, dtype=bool)
+
+        # Terminated only when the agent is on the door
+        terminated = (self.agent_location == self.target_location).all(axis=1)
+        alive = ~terminated
+
+        reward = np.where(terminated, float(self.door_reward), 0.0)
+
+        if self.ghosts_location.shape[1]:
+            # An agent on any ghost is penalised once
+            hit = (self.ghosts_location == self.agent_location[:, None, :]).all(axis=2).any(axis=1) & alive
+            reward -= self.ghost_penalty * hit
+
+        if self.candies_location.shape[1]:
+            # Collected candies sit at [-1, -1] so they can never match an agent again
+            collected = (self.candies_location == self.agent_location[:, None, :]).all(axis=2) & alive[:, None]
+            reward += self.candy_reward * collected.sum(axis=1)
+            self.candies_location[collected] = -1
+
+        reward -= self.step_penalty
+
+        infos = self._get_info()
+
+        # Potential-based shaping with potential -distance to the door (the same as the scalar envs)
+        if self.shaping_scale:
+            reward += self.shaping_scale * (previous - self.shaping_gamma * infos['distance'])
+
+        # Autoreset finished sub-environments, keeping their last observation/info in infos
+        done = np.flatnonzero(terminated | truncated)
+        if len(done):
+            observation = self._get_obs()
+            final_observation = np.full(self.num_envs, None, dtype=object)
+            final_info = np.full(self.num_envs, None, dtype=object)
+            for i in done:
+                final_observation[i] = self._get_single_obs(observation, i)
+                final_info[i] = {'distance': infos['distance'][i]}
+                if self.action_mask is not None:
+                    final_info[i]['action_mask'] = infos['action_mask'][i]
+                self._reset_env(i)
+            mask = np.zeros(self.num_envs, dtype=bool)
+            mask[done] = True
+            infos.update({
+                'final_observation': final_observation, '_final_observation': mask,
+                'final_info': final_info, '_final_info': mask,
+            })
+            infos.update(self._get_info())
+
+        return self._get_obs(), reward, terminated, truncated, infos